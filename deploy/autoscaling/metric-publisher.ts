@@ -7,6 +7,9 @@
  *   REDIS_PORT     - Redis port (default 6379)
  *   REDIS_PASSWORD - Redis password
  *   AWS_REGION     - AWS region (injected automatically by Lambda)
+ *
+ * Per-host smart-crop throughput (SmartCrop* metrics, same namespace) is
+ * pushed by the workers themselves - see smartcrop-metrics.sh.
  */
 
 import { CloudWatchClient, PutMetricDataCommand } from "@aws-sdk/client-cloudwatch";
@@ -0,0 +1,29 @@
+#!/bin/bash
+# Publishes this host's smart-crop throughput/latency to CloudWatch.
+# The Lambda metric publisher only sees Redis, not worker disks, so each
+# worker pushes its own rolling aggregate of the sidecar's per-run metrics
+# file (src/scripts/smartcrop/metrics.py). Installed as a 1-minute cron job
+# by user-data.sh; the instance role's CloudWatchAgentServerPolicy allows
+# cloudwatch:PutMetricData.
+#
+# Usage:
+#   ./smartcrop-metrics.sh            # publish the last 5 minutes
+#   WINDOW=900 ./smartcrop-metrics.sh
+
+set -e
+
+DEPLOY_PATH="${DEPLOY_PATH:-/opt/scalereach}"
+WINDOW="${WINDOW:-300}"
+NAMESPACE="ScaleReach/Worker"
+
+cd "$DEPLOY_PATH/src/scripts"
+METRIC_DATA=$(python3 -m smartcrop.metrics cloudwatch --window "$WINDOW")
+
+if [ "$METRIC_DATA" = "[]" ]; then
+  exit 0
+fi
+
+aws cloudwatch put-metric-data \
+  --namespace "$NAMESPACE" \
+  --metric-data "$METRIC_DATA" \
+  --region "${AWS_REGION:-us-east-1}"
@@ -67,6 +67,12 @@ echo "[INIT] Env and cookies fetched."
 mkdir -p "$DEPLOY_PATH/logs"
 chown -R "$APP_USER:$APP_USER" "$DEPLOY_PATH"
 
+# ── Smart-crop metrics → CloudWatch (every minute) ───────────────────────────
+echo "[INIT] Installing smart-crop metrics cron..."
+cat > /etc/cron.d/scalereach-smartcrop-metrics <<CRON
+* * * * * $APP_USER AWS_REGION=${AWS_REGION:-us-east-1} $DEPLOY_PATH/deploy/autoscaling/smartcrop-metrics.sh >> $DEPLOY_PATH/logs/smartcrop-metrics.log 2>&1
+CRON
+
 # ── Start worker via PM2 ──────────────────────────────────────────────────────
 echo "[INIT] Starting worker via PM2..."
 sudo -u "$APP_USER" bash -c "
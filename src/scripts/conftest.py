@@ -0,0 +1,3 @@
+# test_smart_crop.py is the manual end-to-end script (python3 test_smart_crop.py
+# VIDEO) - it runs on import, so pytest only collects the unit tests beside it.
+collect_ignore = ["test_smart_crop.py"]
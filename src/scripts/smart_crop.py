@@ -3,22 +3,166 @@
 Smart Crop Sidecar - Production Script (Improved)
 Called by Node.js worker via child_process.spawn
 
-Usage: python3 smart_crop.py <videoUrl> <clipId> <tmpDir>
+Usage: python3 smart_crop.py <videoUrl> <clipId> <tmpDir> [--active-speaker] [--roi-detect] [--no-adaptive-res]
+                       [--long-form] [--checkpoint-dir DIR] [--no-cache]
+                       [--dump-detections PATH] [--source-id ID --source-offset SEC] [--frame-cache]
+                       [--preset fast|balanced|quality] [--deadline SEC] [--no-static-shot]
+                       [--analyze-range START END] [--path-engine chain|global] [--aspects W:H,...]
+                       [--stream] [--stream-idle SEC] [--keyframe-type] [--progressive]
+                       [--keyframe-snap SEC] [--live] [--lookahead SEC]
 
 Output: {tmpDir}/{clipId}_coords.json
   [{ "t": 0.0, "x": 0, "y": 0, "w": 607, "h": 1080 }, ...]
   OR for split-screen mode:
   { "mode": "split", "top": {...}, "bottom": {...} }
+  OR for a locked-off camera:
+  { "mode": "static_crop", "x": 656, "y": 0, "w": 607, "h": 1080, ... }
+  With --aspects, the first aspect's payload plus "aspect" and
+  "aspects": { "1:1": {...}, "4:5": {...} } (smartcrop/aspects.py)
+  With --progressive, first a coarse payload with "status": "coarse", then
+  the full result with "status": "final" (the file is replaced atomically)
+  With --keyframe-snap, mixed segments also carry
+  "render": { "keyframe_start": true, "static": false }
+  With --live, per-frame crops as JSON lines in {tmpDir}/{clipId}_live.jsonl
+  while the source plays, then
+  { "mode": "live", "commands": "{tmpDir}/{clipId}_live.jsonl", "frames": 1800, ... }
 
 Exit 0 on success, non-zero on failure.
 
 Environment:
   HF_TOKEN   - HuggingFace token for pyannote.audio (optional)
   MODEL_PATH - Path to blaze_face_short_range.tflite (default: /tmp/blaze_face_short_range.tflite)
+  SMART_CROP_ACTIVE_SPEAKER=1 - same as --active-speaker
+  SMART_CROP_ROI_DETECT=1     - same as --roi-detect
+  SMART_CROP_ADAPTIVE_RES=0   - same as --no-adaptive-res
+  SMART_CROP_LONG_FORM=1      - same as --long-form
+  SMART_CROP_CHECKPOINT_DIR   - same as --checkpoint-dir
+  SMART_CROP_CACHE=0          - same as --no-cache
+  SMART_CROP_STORE_DIR        - artifact store root for proxies and caches, e.g. /dev/shm/smart_crop
+                                (default: SMART_CROP_CACHE_DIR, else {tmp}/smart_crop_cache;
+                                see smartcrop/store.py, python3 -m smartcrop.store stats)
+  SMART_CROP_STORE_MAX_MB     - artifact store size cap, LRU-evicted (default 4096)
+  SMART_CROP_CACHE_DIR        - artifact store root when SMART_CROP_STORE_DIR is unset
+  SMART_CROP_CACHE_MAX_MB     - result cache size cap, LRU-evicted (default 512, 0 = off)
+  SMART_CROP_FRAME_CACHE=1    - same as --frame-cache
+  SMART_CROP_PRESET           - same as --preset
+  SMART_CROP_DEADLINE         - same as --deadline
+  SMART_CROP_STATIC_SHOT=0    - same as --no-static-shot
+  SMART_CROP_PATH_ENGINE      - same as --path-engine
+  SMART_CROP_ASPECTS          - same as --aspects
+  SMART_CROP_STREAM=1         - same as --stream
+  SMART_CROP_STREAM_IDLE      - same as --stream-idle
+  SMART_CROP_KEYFRAME_TYPE=1  - same as --keyframe-type
+  SMART_CROP_PROGRESSIVE=1    - same as --progressive
+  SMART_CROP_KEYFRAME_SNAP    - same as --keyframe-snap
+  SMART_CROP_LIVE=1           - same as --live
+  SMART_CROP_LOOKAHEAD        - same as --lookahead
+  SMART_CROP_FRAME_CACHE_MAX_MB - shared frame cache size cap (default 2048)
+  SMART_CROP_METRICS_FILE     - per-run metrics JSON lines (default: {tmp}/smart_crop_metrics.jsonl,
+                                SMART_CROP_METRICS=0 disables; see smartcrop/metrics.py)
+
+Options:
+  --active-speaker  Estimate who is talking from mouth-keypoint motion (plus
+                    audio energy when there is an audio track) instead of
+                    running pyannote diarization. No torch needed.
+  --roi-detect      Face tracking detects only in padded boxes around the
+                    previous faces, with a full-frame scan every few samples
+                    or when a face is lost.
+  --no-adaptive-res Track at the fixed DETECT_MAX_H instead of a detection
+                    resolution picked from the face sizes seen in type detection.
+  --long-form       Bounded-memory mode for full episodes: track in chunks,
+                    spool per-frame coords to disk and checkpoint after every
+                    chunk so a crashed run resumes where it stopped. Automatic
+                    for sources longer than 15 minutes.
+  --checkpoint-dir  Where long-form checkpoints live (default: tmpDir). Use a
+                    directory that survives the worker for spot instances.
+  --no-cache        Always analyse; don't read or write the result cache
+                    (see smartcrop/cache.py - keyed by source content, range,
+                    engine version and the options above).
+  --dump-detections Also write the raw per-sample detections and speaker
+                    turns to PATH. Replay them through classification and
+                    smoothing without video or detector:
+                      python3 -m smartcrop.replay PATH [out.json]
+  --source-id       Identifies the source video the clip was cut from, and
+  --source-offset   where the clip starts in it (seconds). Detections are then
+                    kept per source and absolute time (smartcrop/detections.py),
+                    so re-cutting a trimmed/extended clip only detects the new
+                    ranges.
+  --frame-cache     Share decoded, detection-resolution frames with other
+                    jobs on the same --source-id through a memory-mapped
+                    per-source cache (smartcrop/frames.py), so concurrent
+                    clips of one video decode each region once.
+  --preset          fast | balanced (default) | quality - sampling density,
+                    detection resolution, post-smoothing passes and whether
+                    to diarize (smartcrop/budget.py).
+  --deadline        Latency budget in seconds: sampling, detection resolution
+                    and diarization are planned from the remaining work and
+                    degraded step by step instead of overrunning. The steps
+                    taken are listed under "degraded" in the coords JSON.
+  --no-static-shot  Always track podcasts. By default a clip of locked-off
+                    single-face shots (still thumbnails and face positions in
+                    type detection, smartcrop/shots.py) gets one crop window
+                    per shot without tracking.
+  --analyze-range   Shard mode for sources too long for one machine: analyse
+                    only START..END seconds and write {tmpDir}/{clipId}_shard.json
+                    (or the --dump-detections path) instead of coords. Merge
+                    the shards of a source into one coords JSON with
+                      python3 -m smartcrop.shards merge OUT SHARD...
+                    (see smartcrop/shards.py).
+  --path-engine     chain (default) | global - how tracked samples become the
+                    per-frame crop path. global solves each axis over the whole
+                    clip at once (L1 trend filtering, smartcrop/trend.py):
+                    holds and constant-speed pans, no post-smoothing. Needs
+                    scipy; long-form runs always use the chain.
+  --aspects         Output aspect ratios, e.g. 9:16,1:1,4:5 (default 9:16).
+                    Detection, classification and speaker turns run once;
+                    each extra aspect only repeats the layout and crop path
+                    stages and is nested under "aspects" in the coords JSON.
+                    Long-form runs write the first aspect only.
+  --stream          Start while the source is still arriving: videoUrl may be
+                    a file still being written, an HTTP URL or - (stdin).
+                    Detection runs on frames as they arrive while the source
+                    is copied to a local spool; the remaining stages read the
+                    spool (smartcrop/decode.py). The container must be
+                    streamable (fragmented MP4, MPEG-TS, Matroska). Not with
+                    --analyze-range; --source-id and the result cache are
+                    ignored.
+  --stream-idle     Seconds without new data that end the stream (default 10).
+  --keyframe-type   Type detection decodes only the source's keyframes
+                    (-skip_frame nokey, smartcrop/decode.py) and uses them as
+                    the type samples (at most one per type interval);
+                    only sample times no keyframe comes close to are seeked
+                    exactly. Several times cheaper on 2s-GOP sources.
+  --progressive     For the editor preview: within about a second write a
+                    coarse result ("status": "coarse") from a handful of
+                    keyframes - type decision, static layout or a simple crop
+                    path - then run the full analysis and replace it
+                    atomically with the final one ("status": "final"). Not
+                    with --analyze-range or --stream.
+  --keyframe-snap   Tolerance in seconds (default 0 = off): mixed segment
+                    boundaries move onto the nearest source keyframe within
+                    it, as long as no segment gets shorter than 0.5s, and
+                    each segment gets a "render" hint - keyframe_start (a
+                    fast input seek lands exactly on the start, no decoding
+                    up to the cut) and static (one crop or layout for the
+                    whole segment, no per-frame crop commands). Keyframes
+                    come from ffprobe packet flags (smartcrop/segments.py).
+  --live            Causal reframing of a live source (growing file, pipe or
+                    URL, as with --stream; a local file is read at its frame
+                    rate, standing in for a feed): crops are emitted as the
+                    frames arrive, a fixed --lookahead behind the source,
+                    with constant memory (smartcrop/live.py). Face tracking
+                    only - no speaker turns, layouts or segments. Detection
+                    is skipped on samples that arrive while the run is more
+                    than the lookahead behind real time.
+  --lookahead       Live output delay in seconds (default 0.5): one sample
+                    interval for interpolation, the rest for post-smoothing.
 
 Video type detection (auto):
   - podcast/talking-head  → face tracking crop (9:16)
-  - screen + PiP face cam → split screen (screen top 60%, face bottom 40%)
+  - screen + PiP face cam → split screen (screen top 60%, face bottom 40%);
+    the webcam box is measured per shot from frame-to-frame change
+    (smartcrop/pip.py) and tracking skips detection inside those shots
   - no face detected      → center crop fallback
 
 Improvements over v1:
@@ -27,47 +171,222 @@ Improvements over v1:
   - Face identity matching across frames (no more ID swaps in two-person scenes)
   - Head room / vertical crop positioning (face placed at 20% from top)
   - fd_map for fast timestamp → face lookup
+  - Audio extraction + diarization run in a background process during face
+    tracking (smartcrop/diarize.py), joined at speaker mapping
 """
 
 import sys
 import os
-import json
+import argparse
 import subprocess
+import time
 
-def log(msg):
-    print(f"[SMART CROP PY] {msg}", flush=True)
+from smartcrop import log
+from smartcrop import aspects
+from smartcrop import decode
+from smartcrop import live
 
 # ── Args ──────────────────────────────────────────────────────────────────────
 
-if len(sys.argv) < 4:
-    print("Usage: python3 smart_crop.py <videoUrl> <clipId> <tmpDir>")
-    sys.exit(1)
-
-video_url = sys.argv[1]
-clip_id   = sys.argv[2]
-tmp_dir   = sys.argv[3]
+arg_parser = argparse.ArgumentParser(
+    usage="python3 smart_crop.py <videoUrl> <clipId> <tmpDir> [--active-speaker] [--roi-detect] [--no-adaptive-res] "
+          "[--long-form] [--checkpoint-dir DIR] [--no-cache] [--dump-detections PATH] "
+          "[--source-id ID --source-offset SEC] [--frame-cache] [--preset NAME] [--deadline SEC] "
+          "[--no-static-shot] [--analyze-range START END] [--path-engine chain|global] [--aspects W:H,...] "
+          "[--stream] [--stream-idle SEC] [--keyframe-type] [--progressive] [--keyframe-snap SEC] [--live] [--lookahead SEC]")
+arg_parser.add_argument("video_url")
+arg_parser.add_argument("clip_id")
+arg_parser.add_argument("tmp_dir")
+arg_parser.add_argument("--active-speaker", action="store_true",
+                        default=os.environ.get("SMART_CROP_ACTIVE_SPEAKER") == "1")
+arg_parser.add_argument("--roi-detect", action="store_true",
+                        default=os.environ.get("SMART_CROP_ROI_DETECT") == "1")
+arg_parser.add_argument("--no-adaptive-res", dest="adaptive_res", action="store_false",
+                        default=os.environ.get("SMART_CROP_ADAPTIVE_RES") != "0")
+arg_parser.add_argument("--long-form", action="store_true",
+                        default=os.environ.get("SMART_CROP_LONG_FORM") == "1")
+arg_parser.add_argument("--checkpoint-dir", default=os.environ.get("SMART_CROP_CHECKPOINT_DIR"))
+arg_parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        default=os.environ.get("SMART_CROP_CACHE") != "0")
+arg_parser.add_argument("--dump-detections", metavar="PATH")
+arg_parser.add_argument("--source-id")
+arg_parser.add_argument("--source-offset", type=float, default=0.0)
+arg_parser.add_argument("--frame-cache", action="store_true",
+                        default=os.environ.get("SMART_CROP_FRAME_CACHE") == "1")
+arg_parser.add_argument("--preset", choices=("fast", "balanced", "quality"),
+                        default=os.environ.get("SMART_CROP_PRESET") or "balanced")
+arg_parser.add_argument("--deadline", type=float, metavar="SEC",
+                        default=float(os.environ["SMART_CROP_DEADLINE"]) if os.environ.get("SMART_CROP_DEADLINE") else None)
+arg_parser.add_argument("--no-static-shot", dest="static_shot", action="store_false",
+                        default=os.environ.get("SMART_CROP_STATIC_SHOT") != "0")
+arg_parser.add_argument("--analyze-range", nargs=2, type=float, metavar=("START", "END"))
+arg_parser.add_argument("--path-engine", choices=("chain", "global"),
+                        default=os.environ.get("SMART_CROP_PATH_ENGINE") or "chain")
+arg_parser.add_argument("--aspects", type=aspects.parse, metavar="W:H,...",
+                        default=os.environ.get("SMART_CROP_ASPECTS") or "9:16")
+arg_parser.add_argument("--stream", action="store_true",
+                        default=os.environ.get("SMART_CROP_STREAM") == "1")
+arg_parser.add_argument("--stream-idle", type=float, metavar="SEC",
+                        default=float(os.environ.get("SMART_CROP_STREAM_IDLE") or decode.DEFAULT_IDLE_SEC))
+arg_parser.add_argument("--keyframe-type", action="store_true",
+                        default=os.environ.get("SMART_CROP_KEYFRAME_TYPE") == "1")
+arg_parser.add_argument("--progressive", action="store_true",
+                        default=os.environ.get("SMART_CROP_PROGRESSIVE") == "1")
+arg_parser.add_argument("--keyframe-snap", type=float, metavar="SEC",
+                        default=float(os.environ.get("SMART_CROP_KEYFRAME_SNAP") or 0.0))
+arg_parser.add_argument("--live", action="store_true",
+                        default=os.environ.get("SMART_CROP_LIVE") == "1")
+arg_parser.add_argument("--lookahead", type=float, metavar="SEC",
+                        default=float(os.environ.get("SMART_CROP_LOOKAHEAD") or live.DEFAULT_LOOKAHEAD_SEC))
+args = arg_parser.parse_args()
+if args.stream and args.analyze_range:
+    arg_parser.error("--stream can't be combined with --analyze-range")
+if args.progressive and args.analyze_range:
+    arg_parser.error("--progressive can't be combined with --analyze-range")
+if args.live and (args.stream or args.analyze_range):
+    arg_parser.error("--live can't be combined with --stream or --analyze-range")
+
+video_url = args.video_url
+clip_id   = args.clip_id
+tmp_dir   = args.tmp_dir
 
 audio_path  = os.path.join(tmp_dir, f"{clip_id}.wav")
 coords_path = os.path.join(tmp_dir, f"{clip_id}_coords.json")
 
 log(f"clip_id={clip_id} tmp_dir={tmp_dir}")
 
+# A partial source has no stable offset or content yet
+if (args.stream or args.live) and args.source_id:
+    log(f"WARNING: --source-id is ignored with {'--live' if args.live else '--stream'}")
+    args.source_id = None
+# Streamed detections already cover the clip by the time a preview could be made
+if (args.stream or args.live) and args.progressive:
+    log(f"WARNING: --progressive is ignored with {'--live' if args.live else '--stream'}")
+    args.progressive = False
+
+# Shard mode writes its detections (a dump) instead of coords
+if args.analyze_range and not args.dump_detections:
+    args.dump_detections = os.path.join(tmp_dir, f"{clip_id}_shard.json")
+
+# ── Run metrics ───────────────────────────────────────────────────────────────
+# One JSON line per run (type, timings, detector calls, peak RSS, fallback) is
+# appended to a host-local file at exit; python3 -m smartcrop.metrics
+# aggregates it for the autoscaler (deploy/autoscaling/smartcrop-metrics.sh).
+
+from smartcrop.metrics import RunStats
+
+run_stats = RunStats(clip_id)
+
+# ── Preset + latency budget (smartcrop/budget.py) ─────────────────────────────
+
+from smartcrop import budget as latency
+
+preset = latency.PRESETS[args.preset]
+budget = latency.Budget(args.deadline)
+run_stats.preset   = args.preset
+run_stats.degraded = budget.degraded
+if args.preset != "balanced" or args.deadline is not None:
+    log(f"Preset: {args.preset}" + (f", deadline {args.deadline:.1f}s" if args.deadline is not None else ""))
+
 # ── Safe fallback helper ──────────────────────────────────────────────────────
 # If ANYTHING goes wrong, write a skip file so the Node.js worker can still
 # produce a center-cropped clip instead of failing entirely.
 
+from smartcrop import shards
+from smartcrop.segments import write_json
+
+def write_coords(payload, status="final"):
+    """Write the coords file atomically - with --progressive the editor may
+    be reading the coarse result while the final one replaces it. There
+    every payload carries its status ("coarse" / "final")."""
+    if args.progressive:
+        payload = {**payload, "status": status}
+    tmp = coords_path + ".tmp"
+    with open(tmp, "w") as f:
+        write_json(f, payload)
+    os.replace(tmp, coords_path)
+
 def write_fallback_and_exit(reason, exit_code=0):
     """Write a safe skip coords file and exit. The clip won't be smart-cropped
     but it won't fail either — Node.js will fall back to center crop."""
     log(f"FALLBACK: {reason} — writing skip coords so clip generation continues")
+    run_stats.fell_back(reason)
     try:
-        with open(coords_path, "w") as f:
-            json.dump({"mode": "skip", "fallback_reason": reason}, f)
+        write_coords({"mode": "skip", "fallback_reason": reason})
     except Exception as e:
         # Last resort: even if we can't write the file, exit cleanly
         log(f"FALLBACK: Could not write coords file: {e}")
+    if args.analyze_range:
+        write_shard_payload({"mode": "skip", "fallback_reason": reason})
     sys.exit(exit_code)
 
+def write_shard_payload(payload):
+    """Shard mode: a whole-source answer stands in for the shard's detections."""
+    try:
+        shards.write_payload(args.dump_detections, args.analyze_range, payload)
+    except OSError as e:
+        log(f"WARNING: Could not write shard {args.dump_detections}: {e}")
+
+# ── Result cache ──────────────────────────────────────────────────────────────
+# Re-exports, caption edits and retries reframe the same clip again. Serve the
+# previous result before paying for cv2/mediapipe imports, decoding or detection.
+
+from smartcrop import cache
+
+result_cache     = None
+result_key       = None
+result_cacheable = True   # cleared when a run only got partway (tracking errors etc.)
+
+def cache_params():
+    """Options the result depends on (besides source content and range)."""
+    return {
+        "active_speaker": args.active_speaker,
+        "roi_detect":     args.roi_detect,
+        "adaptive_res":   args.adaptive_res,
+        "long_form":      args.long_form,
+        "diarization":    bool(os.environ.get("HF_TOKEN")) and not args.active_speaker and preset["diarize"],
+        "preset":         args.preset,
+        "static_shot":    args.static_shot,
+        "path_engine":    args.path_engine,
+        "aspects":        [aspects.name(a) for a in args.aspects],
+        "keyframe_type":  args.keyframe_type,
+        "progressive":    args.progressive,
+        "keyframe_snap":  args.keyframe_snap,
+        "live":           args.live,
+        # Samples sit on the absolute-time grid when a source id is given
+        "source_offset":  args.source_offset if args.source_id else None,
+    }
+
+# A detection dump needs the detectors to actually run, so it skips the lookup;
+# a source still arriving can't be fingerprinted.
+if args.cache and not args.dump_detections and not args.stream and not args.live and os.path.exists(video_url):
+    try:
+        result_cache = cache.ResultCache()
+        if result_cache.max_bytes <= 0:
+            result_cache = None
+        else:
+            result_key = cache.cache_key(cache.fingerprint(video_url), 0.0, None, cache_params())
+            cached = result_cache.get(result_key)
+            if cached is not None:
+                with open(coords_path + ".tmp", "w") as f:
+                    f.write(cached)
+                os.replace(coords_path + ".tmp", coords_path)
+                log(f"Cache hit ({result_key[:12]}) - reusing previous result")
+                run_stats.cache_hit = True
+                sys.exit(0)
+    except OSError as e:
+        log(f"WARNING: Result cache unavailable ({e}) - running full analysis")
+        result_cache = None
+
+def store_result():
+    """Save the coords file just written for future runs of the same clip."""
+    if result_cache is None or not result_cacheable or budget.degraded:
+        return
+    try:
+        result_cache.put(result_key, coords_path)
+    except OSError as e:
+        log(f"WARNING: Could not store result in cache: {e}")
+
 # ── Imports ───────────────────────────────────────────────────────────────────
 
 try:
@@ -80,81 +399,203 @@ except ImportError as e:
     log(f"ERROR: Missing dependency: {e}")
     write_fallback_and_exit(f"missing dependency: {e}", exit_code=0)
 
+from smartcrop.active_speaker import mouth_ratio
+from smartcrop.layout import (classify_frame, classify_video, detect_pip_region, default_pip_region,
+                              match_faces_across_frames)
+from smartcrop.path import crop_size
+from smartcrop.pipeline import CropPipeline
+from smartcrop.segments import MemorySink, SpoolSink, all_coords, snap_to_keyframes
+from smartcrop import replay
+from smartcrop.detections import DetectionStore, MemoryDetectionStore, grid_times, next_grid_time
+from smartcrop import longform
+from smartcrop import pip
+from smartcrop import shots
+from smartcrop.diarize import DiarizationJob
+from smartcrop.frames import FrameCache
+from smartcrop.store import ArtifactStore
+
 # ── Step 1: Use source video directly (already downloaded by Node.js worker) ──
 # The input file is a local temp file passed by the clip generator - no copy needed.
 
-local_video = video_url  # video_url is actually a local file path from Node.js
+local_video  = video_url  # video_url is actually a local file path from Node.js
+stream       = None       # --stream / --live: decode.StreamReader on the arriving source
+stream_spool = None
 
-if not os.path.exists(local_video):
+if args.stream:
+    stream_spool = os.path.join(tmp_dir, f"{clip_id}_stream.mkv")
+    log(f"Streaming source: {local_video} → spool {stream_spool}")
+elif args.live:
+    log(f"Live source: {local_video}")
+elif not os.path.exists(local_video):
     log(f"ERROR: Source file not found: {local_video}")
     write_fallback_and_exit("source file not found")
-
-log(f"Using source file directly: {local_video}")
+else:
+    log(f"Using source file directly: {local_video}")
 
 # ── Step 2: Video dimensions ──────────────────────────────────────────────────
+# A stream reports them in its header; its duration is only a hint until the
+# streaming pass has spooled the whole source (see below).
 
-try:
-    cap      = cv2.VideoCapture(local_video)
+def probe_video(path):
+    """(width, height, fps, duration) as OpenCV reads path, or None when it
+    can't open it."""
+    cap = cv2.VideoCapture(path)
     if not cap.isOpened():
-        write_fallback_and_exit("cv2.VideoCapture failed to open source file")
-    src_w    = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    src_h    = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps      = cap.get(cv2.CAP_PROP_FPS)
-    total_f  = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_f / fps if fps > 0 else 0
+        return None
+    width   = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height  = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    rate    = cap.get(cv2.CAP_PROP_FPS)
+    total_f = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     cap.release()
-except Exception as e:
-    write_fallback_and_exit(f"failed to read video dimensions: {e}")
+    return width, height, rate, (total_f / rate if rate > 0 else 0)
 
-if src_w == 0 or src_h == 0 or fps <= 0 or duration <= 0:
-    write_fallback_and_exit(f"invalid video dimensions ({src_w}x{src_h}, fps={fps}, dur={duration})")
-
-log(f"Video: {src_w}x{src_h} @ {fps:.1f}fps, {duration:.1f}s")
+if args.stream or args.live:
+    try:
+        # Frames on the finer tracking grid - the coarser grids are subsets of it
+        realtime = args.live and os.path.isfile(local_video)
+        stream = decode.StreamReader(local_video, stream_spool, preset["interval_short"],
+                                     preset["detect_max_h"], args.stream_idle, realtime=realtime)
+        src_w, src_h, fps, duration = stream.header()
+    except (OSError, RuntimeError) as e:
+        write_fallback_and_exit(f"could not read the stream: {e}")
+    duration = duration or 0.0
+    log(f"Stream: {src_w}x{src_h} @ {fps:.1f}fps" + (f", ~{duration:.1f}s" if duration else ", length unknown"))
+else:
+    try:
+        probed = probe_video(local_video)
+        if probed is None:
+            write_fallback_and_exit("cv2.VideoCapture failed to open source file")
+        src_w, src_h, fps, duration = probed
+    except Exception as e:
+        write_fallback_and_exit(f"failed to read video dimensions: {e}")
+
+    if src_w == 0 or src_h == 0 or fps <= 0 or duration <= 0:
+        write_fallback_and_exit(f"invalid video dimensions ({src_w}x{src_h}, fps={fps}, dur={duration})")
+
+    log(f"Video: {src_w}x{src_h} @ {fps:.1f}fps, {duration:.1f}s")
+    run_stats.duration = duration
+
+# ── Shard range (--analyze-range) ─────────────────────────────────────────────
+# A shard samples only its range, on the grid a run over the whole source
+# would use, so the merged shards replay like that single run.
+
+analyze_range = None
+if args.analyze_range:
+    range_start, range_end = max(0.0, args.analyze_range[0]), min(duration, args.analyze_range[1])
+    if range_end <= range_start:
+        write_fallback_and_exit(f"--analyze-range {args.analyze_range[0]:g} {args.analyze_range[1]:g} "
+                                f"is outside the video ({duration:.1f}s)")
+    analyze_range = (range_start, range_end)
+    log(f"Shard: analysing {range_start:.1f}s-{range_end:.1f}s of {duration:.1f}s → {args.dump_detections}")
+span = analyze_range or (0.0, duration)
+
+long_form = args.long_form or duration > longform.AUTO_SEC
+if long_form and stream is None:   # a stream decides once it has arrived
+    log("Long-form mode (bounded memory, checkpoint/resume)")
+
+# Adaptive sample interval: 0.1s for short clips, 0.2s for longer ones (balanced)
+sample_interval = preset["interval_long"] if duration > 30 else preset["interval_short"]
+
+# ── Incremental re-analysis: detections from earlier cuts of this source ──────
+# With --source-id/--source-offset, samples sit on a grid aligned to absolute
+# source time and their detections are kept per source, so a trimmed or
+# extended clip only detects the newly uncovered ranges.
+
+det_store     = None
+source_offset = args.source_offset
+if args.source_id:
+    try:
+        det_store = DetectionStore(args.source_id, src_w, src_h,
+                                   os.path.basename(os.environ.get("MODEL_PATH", "blaze_face_short_range.tflite")))
+        # Estimated at the preset's resolution - the tracking rung is chosen later
+        track_cover = det_store.coverage("track", [source_offset + t for t in
+                                                   grid_times(0.0, duration, sample_interval, source_offset)],
+                                         preset["detect_max_h"], args.roi_detect)
+        log(f"Detection store: {track_cover:.0%} of tracking samples already detected for source {args.source_id}")
+    except OSError as e:
+        log(f"WARNING: Detection store unavailable ({e}) - analysing the whole clip")
+        det_store = None
+
+def save_detections():
+    if det_store is None:
+        return
+    try:
+        det_store.save()
+    except OSError as e:
+        log(f"WARNING: Could not save detections: {e}")
+
+def release_detections(kind, before=None):
+    """Long-form: save and drop the store buckets the run is past (before
+    this absolute time, or all of the kind), so memory stays constant."""
+    if det_store is None or not long_form:
+        return
+    try:
+        det_store.release(kind, before)
+    except OSError as e:
+        log(f"WARNING: Could not save detections: {e}")
 
 # ── Speed optimization: pre-downscale large videos for face detection ─────────
 # OpenCV decodes full-res frames even if we resize after. For 4K+ videos,
 # create a 720p proxy for face detection (FFmpeg decode is much faster).
 # Proxy is keyed by source file path so multiple clips from the same video reuse it.
+# Proxies live in the artifact store (smartcrop/store.py): written under a
+# temp name and renamed, so a concurrent job never decodes a half-written
+# one, and evicted LRU under the store's size cap.
+# Skipped when the detection store already covers most samples: decoding the
+# few missing ones from the original beats encoding a proxy of the whole clip.
 PROXY_MAX_H = 720
+PROXY_MIN_UNCOVERED = 0.25
 proxy_video = local_video
 proxy_scale = 1.0
-if src_h > PROXY_MAX_H:
+if det_store is not None and track_cover >= 1 - PROXY_MIN_UNCOVERED:
+    log("Most samples are reused - skipping the proxy")
+elif stream is not None:
+    log("Stream: detecting on the streamed frames - no proxy")
+elif analyze_range:
+    log("Shard: decoding the original - a proxy of the whole source costs more than the range")
+elif src_h > PROXY_MAX_H:
     # Use source file basename (without clip-specific prefix) to share proxy across clips
     import hashlib
     source_hash = hashlib.md5(os.path.realpath(local_video).encode()).hexdigest()[:12]
-    proxy_video = os.path.join(tmp_dir, f"proxy_{source_hash}_{PROXY_MAX_H}p.mp4")
-    proxy_scale = PROXY_MAX_H / src_h
-
-    if os.path.exists(proxy_video):
-        log(f"Reusing existing proxy: {proxy_video}")
-    else:
-        log(f"Pre-downscaling {src_w}x{src_h} → {int(src_w * proxy_scale)}x{PROXY_MAX_H} for face detection...")
-        proxy_result = subprocess.run(
-            ["ffmpeg", "-y", "-i", local_video,
-             "-vf", f"scale=-2:{PROXY_MAX_H}", "-c:v", "libx264", "-preset", "ultrafast",
-             "-crf", "28", "-an", proxy_video],
-            capture_output=True
-        )
-        if proxy_result.returncode != 0:
-            log("WARNING: Proxy downscale failed, using original")
-            proxy_video = local_video
-            proxy_scale = 1.0
+    proxy_name  = f"proxy_{source_hash}_{PROXY_MAX_H}p.mp4"
+    try:
+        proxy_store = ArtifactStore("proxies")
+        proxy_video = proxy_store.get(proxy_name)
+        if proxy_video is not None:
+            log(f"Reusing existing proxy: {proxy_video}")
         else:
+            log(f"Pre-downscaling {src_w}x{src_h} → {int(src_w * PROXY_MAX_H / src_h)}x{PROXY_MAX_H} for face detection...")
+            with proxy_store.write(proxy_name) as proxy_tmp:
+                proxy_result = subprocess.run(
+                    ["ffmpeg", "-y", "-i", local_video,
+                     "-vf", f"scale=-2:{PROXY_MAX_H}", "-c:v", "libx264", "-preset", "ultrafast",
+                     "-crf", "28", "-an", proxy_tmp],
+                    capture_output=True
+                )
+                if proxy_result.returncode != 0:
+                    raise RuntimeError(f"ffmpeg exit {proxy_result.returncode}")
+            proxy_video = proxy_store.path(proxy_name)
             log("Proxy ready.")
+        proxy_scale = PROXY_MAX_H / src_h
+    except (OSError, RuntimeError) as e:
+        log(f"WARNING: Proxy downscale failed ({e}), using original")
+        proxy_video = local_video
+        proxy_scale = 1.0
 
-crop_w = int(src_h * 9 / 16)
-if crop_w > src_w:
-    crop_w = src_w
-crop_w = crop_w - (crop_w % 2)  # ensure even for libx264
-crop_h = src_h - (src_h % 2)    # ensure even for libx264
+crop_w, crop_h = crop_size(src_w, src_h, args.aspects[0])
 
 # ── Early exit: already portrait or nearly square ─────────────────────────────
 
 aspect_ratio = src_w / src_h if src_h > 0 else 1.0
 if aspect_ratio <= 0.65:
     log(f"Video is already portrait ({src_w}x{src_h}, ratio={aspect_ratio:.2f}) - skipping reframe")
-    with open(coords_path, "w") as f:
-        json.dump({"mode": "skip"}, f)
+    write_coords({"mode": "skip"})
+    if analyze_range:
+        write_shard_payload({"mode": "skip"})
+    if stream is not None:
+        stream.close()
+    run_stats.mode = "skip"
+    store_result()
     sys.exit(0)
 
 # ── Step 3: Face detection setup ──────────────────────────────────────────────
@@ -181,20 +622,31 @@ except Exception as e:
 # ── Speed optimization: downscale large frames for face detection ─────────────
 # MediaPipe doesn't need full resolution - 480p is plenty for face detection.
 # This gives ~4-6x speedup on 1080p and ~16x on 4K.
-DETECT_MAX_H = 480
+DETECT_MAX_H = preset["detect_max_h"]   # 480 unless the preset says otherwise
 
-def detect_faces_in_frame(frame, proxy_scale=1.0):
+def detect_faces_in_frame(frame, proxy_scale=1.0, region=None, detect_h=None):
     """Detect faces in a single frame. Returns empty list on any error
-    so one bad frame never crashes the entire pipeline."""
+    so one bad frame never crashes the pipeline.
+
+    region: optional (x0, y0, x1, y1) in frame pixels - detect only inside it.
+    Coordinates are mapped back to original resolution including the offset.
+    detect_h: detection height cap (default DETECT_MAX_H)."""
+    max_h = detect_h or DETECT_MAX_H
+    run_stats.detector_calls += 1
     try:
+        if region is not None:
+            off_x, off_y = region[0], region[1]
+            frame = frame[region[1]:region[3], region[0]:region[2]]
+        else:
+            off_x, off_y = 0, 0
         orig_h, orig_w = frame.shape[:2]
         if orig_h == 0 or orig_w == 0:
             return []
         # If we're already using a proxy video, coordinates need to be scaled back
         # to original resolution. Also downscale further for detection if still large.
-        if orig_h > DETECT_MAX_H:
-            det_scale = DETECT_MAX_H / orig_h
-            small = cv2.resize(frame, (int(orig_w * det_scale), DETECT_MAX_H), interpolation=cv2.INTER_AREA)
+        if orig_h > max_h:
+            det_scale = max_h / orig_h
+            small = cv2.resize(frame, (int(orig_w * det_scale), max_h), interpolation=cv2.INTER_AREA)
         else:
             small = frame
             det_scale = 1.0
@@ -203,69 +655,291 @@ def detect_faces_in_frame(frame, proxy_scale=1.0):
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
         results  = face_detector.detect(mp_image)
         faces = []
-        # Total scale from detection pixels back to original video resolution
-        total_scale = 1.0 / (det_scale * proxy_scale) if proxy_scale != 1.0 else 1.0 / det_scale
+        # Scale from frame pixels back to original video resolution
+        to_src = 1.0 / proxy_scale
         if results.detections:
             for det in results.detections:
                 bb = det.bounding_box
                 # Scale coordinates back to original resolution
-                x = int(bb.origin_x * total_scale)
-                y = int(bb.origin_y * total_scale)
-                w = int(bb.width * total_scale)
-                h = int(bb.height * total_scale)
+                x = int((off_x + bb.origin_x / det_scale) * to_src)
+                y = int((off_y + bb.origin_y / det_scale) * to_src)
+                w = int(bb.width / det_scale * to_src)
+                h = int(bb.height / det_scale * to_src)
                 if w <= 0 or h <= 0:
                     continue  # skip degenerate detections
-                orig_full_w = int(orig_w / proxy_scale) if proxy_scale != 1.0 else orig_w
+                # Keypoints are normalized to the detection image (= the region)
+                def kp_x(k):
+                    return int((off_x + k.x * orig_w) * to_src)
                 # Use nose+eye blend as face center - more accurate than bbox center
                 kps = det.keypoints
+                # Mouth opening proxy for visual active-speaker detection
+                mouth = mouth_ratio([(k.x, k.y) for k in kps])
                 if len(kps) >= 3:
-                    eye_cx  = int((kps[0].x + kps[1].x) / 2 * orig_full_w)
-                    nose_cx = int(kps[2].x * orig_full_w)
+                    eye_cx  = (kp_x(kps[0]) + kp_x(kps[1])) // 2
+                    nose_cx = kp_x(kps[2])
                     face_cx = int(eye_cx * 0.4 + nose_cx * 0.6)
                 elif len(kps) >= 2:
-                    face_cx = int((kps[0].x + kps[1].x) / 2 * orig_full_w)
+                    face_cx = (kp_x(kps[0]) + kp_x(kps[1])) // 2
                 else:
                     face_cx = x + w // 2
                 # Clamp face center to valid range
                 face_cx = max(0, min(face_cx, src_w))
-                faces.append({"x": x, "y": y, "w": w, "h": h, "cx": face_cx, "cy": y + h//2, "area": w * h})
+                faces.append({"x": x, "y": y, "w": w, "h": h, "cx": face_cx, "cy": y + h//2, "area": w * h, "mouth": mouth})
         return faces
     except Exception as e:
         # Log but don't crash — this frame just has no faces
         log(f"WARNING: Face detection failed on frame: {e}")
         return []
 
-# ── IMPROVEMENT 1: Face identity matching across frames ───────────────────────
+# ── ROI-restricted detection ──────────────────────────────────────────────────
+# Once faces are known, detect only in padded boxes around them. The ROI is cut
+# from the proxy frame before any downscale, so small faces get more pixels than
+# in the 480p full-frame pass while far fewer pixels are processed overall.
+# A full-frame scan still runs every ROI_FULL_SCAN_EVERY samples (to pick up
+# people entering the shot) and whenever an ROI loses its face.
+ROI_PAD             = 1.0   # pad each face box by 1x its size on every side
+ROI_MIN_SIZE        = 96    # px in frame space - tiny ROIs detect poorly
+ROI_FULL_SCAN_EVERY = 10    # samples (1-2s at the tracking interval)
+
+def build_rois(prev_faces, frame_w, frame_h, proxy_scale=1.0):
+    """Padded (x0, y0, x1, y1) boxes in frame pixels around the previous faces.
+    Overlapping boxes are merged so no face is detected twice."""
+    rois = []
+    for f in prev_faces:
+        fx, fy = f["x"] * proxy_scale, f["y"] * proxy_scale
+        fw, fh = f["w"] * proxy_scale, f["h"] * proxy_scale
+        pad_x = max(fw * ROI_PAD, (ROI_MIN_SIZE - fw) / 2)
+        pad_y = max(fh * ROI_PAD, (ROI_MIN_SIZE - fh) / 2)
+        rois.append([max(0, int(fx - pad_x)), max(0, int(fy - pad_y)),
+                     min(frame_w, int(fx + fw + pad_x)), min(frame_h, int(fy + fh + pad_y))])
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                a, b = rois[i], rois[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rois[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rois[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(r) for r in rois if r[2] > r[0] and r[3] > r[1]]
+
+def detect_faces_roi(frame, prev_faces, proxy_scale=1.0):
+    """Detect faces only around prev_faces. Returns None when any ROI comes
+    back empty, so the caller falls back to a full-frame scan."""
+    frame_h, frame_w = frame.shape[:2]
+    faces = []
+    for roi in build_rois(prev_faces, frame_w, frame_h, proxy_scale):
+        roi_faces = detect_faces_in_frame(frame, proxy_scale, region=roi)
+        if not roi_faces:
+            return None
+        faces.extend(roi_faces)
+    return faces
 
-def match_faces_across_frames(prev_faces, curr_faces):
-    if not prev_faces or not curr_faces:
-        return curr_faces
-    matched = []
-    used = set()
-    for pf in prev_faces:
-        candidates = [(i, cf) for i, cf in enumerate(curr_faces) if i not in used]
-        if not candidates:
-            break
-        best_i, best_face = min(
-            candidates,
-            key=lambda ic: abs(ic[1]["cx"] - pf["cx"]) + abs(ic[1]["cy"] - pf["cy"])
-        )
-        used.add(best_i)
-        matched.append(best_face)
-    for i, cf in enumerate(curr_faces):
-        if i not in used:
-            matched.append(cf)
-    return matched
-
-# ── IMPROVEMENT 2: Head room - vertical crop positioning ──────────────────────
-
-def get_crop_y(faces, src_h, crop_h):
-    if not faces:
-        # No face - center crop vertically (better for B-roll / text screens)
-        return max(0, (src_h - crop_h) // 2)
-    top_face_y = min(f["y"] for f in faces)
-    target_y = top_face_y - int(crop_h * 0.20)
-    return max(0, min(target_y, src_h - crop_h))
+# ── Shared frame cache ────────────────────────────────────────────────────────
+# With --frame-cache, full-frame detections read the downscaled frame from a
+# per-source memory-mapped cache when a concurrent job on the same source
+# already decoded it, and add the frames they decode themselves. ROI detection
+# and resolution rescues need more pixels than the cache holds and decode.
+
+frame_caches = {}   # (decode height, detection height) → FrameCache or None
+
+if args.frame_cache and not args.source_id:
+    log("WARNING: --frame-cache needs --source-id - frame cache disabled")
+
+def frame_cache_for(frame_scale, detect_h):
+    if not (args.frame_cache and args.source_id):
+        return None
+    decode_h = int(round(src_h * frame_scale))
+    key = (decode_h, min(detect_h, decode_h))
+    if key not in frame_caches:
+        try:
+            frame_caches[key] = FrameCache(args.source_id, src_w, src_h, *key)
+        except OSError as e:
+            log(f"WARNING: Frame cache unavailable ({e}) - decoding every frame")
+            frame_caches[key] = None
+    return frame_caches[key]
+
+def detect_cached(t, decode, frame_scale, detect_h):
+    """Full-frame face detection at relative time t. decode() returns
+    (frame, scale) - frame None at the end of the video - and is only called
+    when the frame cache doesn't have t; frame_scale is the scale it is
+    expected to decode at. Returns (faces, frame) - frame is None when the
+    cache answered - or (None, None) when the video ends."""
+    fc = frame_cache_for(frame_scale, detect_h)
+    if fc is not None:
+        small = fc.get(source_offset + t)
+        if small is not None:
+            return detect_faces_in_frame(small, small.shape[0] / src_h, detect_h=detect_h), None
+    frame, scale = decode()
+    if frame is None:
+        return None, None
+    if fc is None or scale != frame_scale:
+        return detect_faces_in_frame(frame, scale, detect_h=detect_h), frame
+    # Detect on exactly the pixels that are cached, so every job gets the same faces
+    small = frame
+    if frame.shape[0] > detect_h:
+        small = cv2.resize(frame, (int(frame.shape[1] * detect_h / frame.shape[0]), detect_h),
+                           interpolation=cv2.INTER_AREA)
+    try:
+        fc.put(source_offset + t, small)
+    except OSError as e:
+        log(f"WARNING: Could not write frame cache ({e}) - disabling it")
+        frame_caches[next(k for k, v in frame_caches.items() if v is fc)] = None
+    return detect_faces_in_frame(small, small.shape[0] / src_h, detect_h=detect_h), frame
+
+def log_frame_cache():
+    for fc in frame_caches.values():
+        if fc is not None and (fc.hits or fc.puts):
+            log(f"Frame cache: {fc.hits} frames read from other jobs, {fc.puts} added")
+
+# ── Live reframing (--live) ───────────────────────────────────────────────────
+# Crops leave a fixed lookahead behind the newest sample, through the same
+# raw crop / EMA / interpolation / post-smoothing stages as tracked clips
+# (smartcrop/live.py). When detection falls behind real time, samples reuse
+# the last faces until it has caught up, so the delay stays bounded.
+
+if args.live:
+    live_path = os.path.join(tmp_dir, f"{clip_id}_live.jsonl")
+    geom = aspects.geometry(src_w, src_h, fps, args.aspects[0], preset["post_passes"])
+    try:
+        reframer = live.LiveReframer(geom, stream.interval, args.lookahead)
+    except ValueError as e:
+        stream.close()
+        write_fallback_and_exit(f"--lookahead: {e}")
+    live_started = None   # wall clock at source time 0
+    last_faces   = []
+    n_detected   = n_reused = 0
+    busy         = 0.0        # seconds spent detecting and reframing
+    max_lag      = 0.0        # wall clock behind the input when a crop came out
+    t            = 0.0
+
+    def emit(frames):
+        global max_lag
+        live.write_frames(live_out, frames)
+        if frames:
+            max_lag = max(max_lag, time.time() - live_started - frames[-1]["t"])
+
+    try:
+        with open(live_path, "w") as live_out:
+            for t, frame in stream.frames():
+                began = time.time()
+                if live_started is None:
+                    live_started = began - t
+                if began - live_started - t > args.lookahead:
+                    n_reused += 1
+                else:
+                    last_faces = detect_faces_in_frame(frame, frame.shape[0] / src_h)
+                    n_detected += 1
+                emit(reframer.push(t, last_faces))
+                busy += time.time() - began
+            emit(reframer.flush())
+    except Exception as e:
+        stream.close()
+        write_fallback_and_exit(f"live reframing crashed: {e}")
+    stream.finish()
+    log(f"Live: {t:.1f}s of source, {reframer.frames} frames emitted, {n_detected} samples detected"
+        + (f", {n_reused} reused to keep up" if n_reused else "")
+        + f", max lag {max_lag:.2f}s behind the input (delay {reframer.delay:.2f}s)"
+        + (f", compute throughput {t / busy:.1f}x real time" if busy > 0 else ""))
+    run_stats.duration = t
+    run_stats.samples  = n_detected + n_reused
+    run_stats.mode     = "live"
+    write_coords({"mode": "live", "commands": live_path, "frames": reframer.frames, "delay": round(reframer.delay, 3),
+                  "max_lag": round(max_lag, 3),
+                  "crop_w": geom.crop_w, "crop_h": geom.crop_h, "src_w": src_w, "src_h": src_h})
+    log("Done.")
+    sys.exit(0)
+
+# ── Streaming pass (--stream) ─────────────────────────────────────────────────
+# Detect on every tracking-grid frame as the source arrives, into an in-memory
+# detection store: type detection and tracking below then reuse those samples
+# as they reuse an earlier cut's, and only decode what isn't on the grid
+# (webcam box, static-shot thumbnails, rescues) - from the finished spool,
+# which also feeds audio extraction.
+
+if stream is not None:
+    stream_started = time.time()
+    det_store      = MemoryDetectionStore()
+    source_offset  = 0.0
+    n_streamed     = 0
+    try:
+        for t, frame in stream.frames():
+            faces = detect_faces_in_frame(frame, frame.shape[0] / src_h)
+            det_store.put("type", t, faces, DETECT_MAX_H)
+            det_store.put("track", t, faces, DETECT_MAX_H)
+            n_streamed += 1
+    except Exception as e:
+        stream.close()
+        write_fallback_and_exit(f"stream detection crashed: {e}")
+    complete = stream.finish()
+    probed   = probe_video(stream_spool)
+    if probed is None or probed[3] <= 0 or n_streamed == 0:
+        stream.close()
+        write_fallback_and_exit(f"stream ended without a readable video ({n_streamed} frames)")
+    if not complete:
+        log("WARNING: Stream ended early - analysing what arrived")
+    local_video = proxy_video = stream_spool
+    # Frame count from the spool over the header's nominal rate (Matroska
+    # reports a measured average)
+    duration = probed[3] * probed[2] / fps
+    log(f"Stream: {duration:.1f}s arrived and {n_streamed} frames detected in {time.time() - stream_started:.1f}s")
+    run_stats.duration = duration
+    span      = (0.0, duration)
+    long_form = args.long_form or duration > longform.AUTO_SEC
+    if long_form:
+        log("Long-form mode (bounded memory, checkpoint/resume)")
+    sample_interval = preset["interval_long"] if duration > 30 else preset["interval_short"]
+
+# ── Coarse preview (--progressive) ────────────────────────────────────────────
+# A handful of keyframes (decoded in parallel, one ffmpeg seek each) give a
+# type decision and either the static layout or a crop path through their
+# faces. It is written as "status": "coarse" and replaced by the final result.
+COARSE_SAMPLES = 8
+COARSE_WORKERS = 4
+
+def coarse_payload():
+    """Primary-aspect payload from COARSE_SAMPLES keyframes, or None when
+    none decodes."""
+    import concurrent.futures
+    out_h = min(DETECT_MAX_H, src_h) // 2 * 2
+    out_w = max(2, int(round(src_w * out_h / src_h / 2)) * 2)
+    times = [span[0] + (span[1] - span[0]) * (i + 0.5) / COARSE_SAMPLES for i in range(COARSE_SAMPLES)]
+    with concurrent.futures.ThreadPoolExecutor(COARSE_WORKERS) as pool:
+        frames = list(pool.map(lambda t: decode.keyframe_at(local_video, t, out_w, out_h), times))
+    coarse_t     = [t for t, frame in zip(times, frames) if frame is not None]
+    coarse_faces = [detect_faces_in_frame(frame, out_h / src_h) for frame in frames if frame is not None]
+    if not coarse_t:
+        return None
+    coarse_type = classify_video(coarse_faces, len(times), src_w, src_h)
+    geom = aspects.geometry(src_w, src_h, fps, args.aspects[0], preset["post_passes"])
+    payload, _ = aspects.static_payload(coarse_type, coarse_faces, len(times), coarse_t, None, None, geom)
+    if payload is not None:
+        return payload
+    samples, prev_faces = [], []
+    for t, faces in zip(coarse_t, coarse_faces):
+        faces = match_faces_across_frames(prev_faces, faces)
+        frame_type = classify_frame(faces, src_w, src_h)
+        frame_pip  = detect_pip_region([faces], src_w, src_h) if frame_type == "split" else None
+        samples.append({"t": round(t, 2), "faces": faces, "frame_type": frame_type, "pip": frame_pip})
+        prev_faces = faces
+    pip_region = detect_pip_region(coarse_faces, src_w, src_h) or default_pip_region(src_w, src_h)
+    return aspects.tracked_payload(geom, samples, [], None, duration, pip_region)
+
+if args.progressive:
+    coarse_started = time.time()
+    try:
+        preview = coarse_payload()
+        if preview is not None:
+            write_coords(preview, status="coarse")
+            log(f"Coarse result ({preview['mode']}) written in {time.time() - coarse_started:.1f}s - refining")
+        else:
+            log("WARNING: No keyframe decoded for the coarse result - skipping it")
+    except Exception as e:
+        log(f"WARNING: Coarse result failed ({e}) - continuing with the full analysis")
 
 # ── Step 4: Video type detection ─────────────────────────────────────────────
 
@@ -273,64 +947,121 @@ log("Detecting video type...")
 
 # Sample every 1 second for accurate type detection without excessive overhead
 # 30s clip → 30 samples (~0.5s), 90s clip → 90 samples (~1.5s)
-SAMPLE_INTERVAL_SEC = 1.0
+SAMPLE_INTERVAL_SEC = preset["type_interval"]   # 1.0s (balanced)
 sample_times = [SAMPLE_INTERVAL_SEC * i for i in range(1, int(duration / SAMPLE_INTERVAL_SEC) + 1) if SAMPLE_INTERVAL_SEC * i < duration]
+if det_store is not None:
+    # Whole source seconds, so trimmed/extended cuts share sample points
+    sample_times = grid_times(SAMPLE_INTERVAL_SEC, duration, SAMPLE_INTERVAL_SEC, source_offset)
 if len(sample_times) < 5:
     sample_times = [duration * i / 6 for i in range(1, 6)]
+if long_form and len(sample_times) > longform.TYPE_SAMPLES:
+    # Type detection only needs a representative spread, not 1/s over an hour
+    n = longform.TYPE_SAMPLES
+    sample_times = [duration * (i + 0.5) / n for i in range(n)]
+    SAMPLE_INTERVAL_SEC = duration / n
+boundary_t = None   # the previous shard's last type sample
+if analyze_range:
+    boundary_t   = max((t for t in sample_times if t < range_start), default=None)
+    sample_times = [t for t in sample_times if range_start <= t < range_end]
 log(f"Type detection: {len(sample_times)} samples (every {SAMPLE_INTERVAL_SEC}s for {duration:.1f}s clip)")
 sample_faces = []
-pip_detections = 0
-full_detections = 0
-small_corner_count = 0  # Track consistent small corner faces
+type_sample_t = []  # time of each sample_faces entry (failed decodes leave gaps)
+type_thumbs  = []   # static-shot thumbnail of each entry (None when not decoded)
+type_reused  = 0
+type_detect  = [0, 0.0]   # decoded+detected samples, seconds spent - prices tracking for --deadline
+cap = None
+
+def decode_type_frame(t):
+    global cap, proxy_scale
+    if cap is None:
+        cap = cv2.VideoCapture(proxy_video)
+        if not cap.isOpened():
+            log("WARNING: Could not open proxy video for type detection, trying original")
+            cap = cv2.VideoCapture(local_video)
+            proxy_scale = 1.0
+            if not cap.isOpened():
+                write_fallback_and_exit("could not open video for type detection")
+    cap.set(cv2.CAP_PROP_POS_MSEC, t * 1000)
+    ret, frame = cap.read()
+    return (frame if ret else None), proxy_scale
+
+# ── Keyframe type samples (--keyframe-type) ──────────────────────────────────
+# One ffmpeg pass over the intra frames replaces a seek + decode per sample:
+# the keyframes (at most one per type interval) become the type samples.
+# Sample times with no keyframe within KEYFRAME_REACH intervals (sparse GOPs)
+# keep an exact-time sample, so no gap grows past ~2.5 intervals - the
+# density the static-shot check asks for.
+KEYFRAME_REACH = 1.25   # type intervals
+
+def keyframe_type_samples(start, end, interval):
+    """{keyframe time: (faces, thumbnail)} for keyframes in [start, end), at
+    most one per interval."""
+    found  = {}
+    last_t = None
+    for kt, frame in decode.KeyframeReader(local_video, DETECT_MAX_H, start, end).frames():
+        if kt >= end:
+            break
+        if kt < start or (last_t is not None and kt - last_t < interval - 1e-3):
+            continue
+        thumb = shots.thumbnail(frame) if args.static_shot else None
+        found[kt] = (detect_faces_in_frame(frame, frame.shape[0] / src_h), thumb)
+        last_t = kt
+    return found
+
+keyframe_samples = {}
+if args.keyframe_type and sample_times:
+    if long_form:
+        log("Keyframe type detection: skipped in long-form mode (few samples over the whole source)")
+    elif det_store is not None:
+        if stream is None:
+            log("Keyframe type detection: skipped - reused detections need the exact sample grid")
+    else:
+        keyframe_started = time.time()
+        reach = SAMPLE_INTERVAL_SEC * KEYFRAME_REACH
+        try:
+            keyframe_samples = keyframe_type_samples(max(span[0], sample_times[0] - SAMPLE_INTERVAL_SEC / 2),
+                                                     min(span[1], sample_times[-1] + reach), SAMPLE_INTERVAL_SEC)
+        except (OSError, RuntimeError) as e:
+            log(f"WARNING: Keyframe decode failed ({e}) - seeking every sample")
+        if keyframe_samples:
+            keyframe_times = sorted(keyframe_samples)
+            exact = [t for t in sample_times if min(abs(t - kt) for kt in keyframe_times) > reach]
+            sample_times = sorted(keyframe_times + exact)
+            log(f"Keyframe type detection: {len(keyframe_times)} keyframes in {time.time() - keyframe_started:.1f}s"
+                + (f", {len(exact)} exact samples where keyframes are sparse" if exact else ""))
 
 try:
-    cap = cv2.VideoCapture(proxy_video)
-    if not cap.isOpened():
-        log("WARNING: Could not open proxy video for type detection, trying original")
-        cap = cv2.VideoCapture(local_video)
-        proxy_scale = 1.0
-        if not cap.isOpened():
-            write_fallback_and_exit("could not open video for type detection")
-    for t in sample_times:
-        cap.set(cv2.CAP_PROP_POS_MSEC, t * 1000)
-        ret, frame = cap.read()
-        if not ret:
+    for i, t in enumerate(sample_times):
+        if len(sample_faces) >= 5 and budget.over(latency.TYPE_SHARE):
+            # Keep most of the deadline for tracking
+            budget.degrade(f"type_samples={i}")
+            sample_times = sample_times[:i]
+            break
+        release_detections("type", source_offset + t)
+        faces = det_store.get("type", source_offset + t, DETECT_MAX_H) if det_store is not None else None
+        if faces is not None:
+            sample_faces.append(faces)
+            type_sample_t.append(t)
+            type_thumbs.append(None)
+            type_reused += 1
+            continue
+        if t in keyframe_samples:
+            faces, thumb = keyframe_samples[t]
+            sample_faces.append(faces)
+            type_sample_t.append(t)
+            type_thumbs.append(thumb)
             continue
-        faces = detect_faces_in_frame(frame, proxy_scale)
+        detect_started = time.time()
+        faces, frame = detect_cached(t, lambda: decode_type_frame(t), proxy_scale, DETECT_MAX_H)
+        if faces is None:
+            continue
+        type_detect[0] += 1
+        type_detect[1] += time.time() - detect_started
         sample_faces.append(faces)
-
-        for face in faces:
-            w_ratio = face["w"] / src_w if src_w > 0 else 0
-            h_ratio = face["h"] / src_h if src_h > 0 else 0
-
-            log(f"  face: cx={face['cx']}, cy={face['cy']}, w={face['w']}, h={face['h']}, w_ratio={w_ratio:.3f}, area={face['area']}")
-
-            is_small_face = w_ratio < 0.10
-            in_corner = (face["cx"] < src_w * 0.30 or face["cx"] > src_w * 0.70) and \
-                        (face["cy"] < src_h * 0.30 or face["cy"] > src_h * 0.70)
-            on_side = face["cx"] < src_w * 0.25 or face["cx"] > src_w * 0.75
-            is_centered = src_w * 0.15 < face["cx"] < src_w * 0.85 and \
-                          src_h * 0.15 < face["cy"] < src_h * 0.85 and \
-                          w_ratio >= 0.08
-
-            if is_small_face and in_corner:
-                pip_detections += 2
-                small_corner_count += 1
-            elif is_small_face and on_side:
-                pip_detections += 1
-            elif is_small_face:
-                pip_detections += 1
-            elif is_centered:
-                full_detections += 1
-            else:
-                full_detections += 1
-
-        centered_faces = [f for f in faces if src_w * 0.25 < f["cx"] < src_w * 0.75
-                          and f["w"] / src_w >= 0.08]
-        if len(centered_faces) >= 2:
-            full_detections += 2
-
-    cap.release()
+        type_sample_t.append(t)
+        type_thumbs.append(shots.thumbnail(frame) if frame is not None and args.static_shot else None)
+        if det_store is not None:
+            det_store.put("type", source_offset + t, faces, DETECT_MAX_H)
 except Exception as e:
     log(f"WARNING: Video type detection failed: {e}")
     try: cap.release()
@@ -338,249 +1069,159 @@ except Exception as e:
     # If type detection fails entirely, fall back to skip (center crop)
     write_fallback_and_exit(f"video type detection crashed: {e}")
 
-total_face_frames = sum(1 for f in sample_faces if f)
-no_face_frames    = len(sample_times) - total_face_frames
-
-# Detect group shots: if 4+ faces appear consistently, it's a group/panel shot
-group_shot_frames = sum(1 for f in sample_faces if len(f) >= 4)
-is_group_shot = group_shot_frames >= len(sample_times) * 0.4  # 4+ faces in 40%+ of samples
-
-# Detect dual-face podcast: exactly 2 faces in 40%+ of sampled frames
-dual_face_frames = sum(1 for f in sample_faces if len(f) == 2)
-# Also check that the two faces are reasonably sized (not tiny PiP)
-# AND sufficiently far apart (real 2-person podcasts have speakers on opposite sides)
-dual_face_big_frames = 0
-dual_face_spread_frames = 0
-for faces in sample_faces:
-    if len(faces) == 2:
-        both_big = all(f["w"] / src_w >= 0.08 for f in faces)
-        if both_big:
-            dual_face_big_frames += 1
-            # Check if the two faces are far enough apart to be separate speakers
-            # Real dual podcasts: speakers are typically 30%+ of frame width apart
-            sorted_f = sorted(faces, key=lambda f: f["cx"])
-            gap_ratio = (sorted_f[1]["cx"] - sorted_f[0]["cx"]) / src_w
-            if gap_ratio >= 0.25:
-                dual_face_spread_frames += 1
-is_dual_face_podcast = dual_face_spread_frames >= len(sample_times) * 0.35
-
-# Screen PiP detection:
-# - If we see consistent small corner faces (even just 2+), it's screen_pip
-# - Or if pip score is high enough relative to full
-if total_face_frames == 0:
-    video_type = "no_face"
-elif is_group_shot:
-    video_type = "group"
-elif small_corner_count >= 2:
-    # Consistent small face in corner = definitely screen recording with webcam
-    video_type = "screen_pip"
-elif pip_detections >= 3 and pip_detections >= full_detections * 0.5:
-    video_type = "screen_pip"
-elif is_dual_face_podcast:
-    video_type = "podcast_dual"
-else:
-    video_type = "podcast"
-
-log(f"Video type: {video_type} (pip={pip_detections}, full={full_detections}, no_face={no_face_frames}, small_corner={small_corner_count}, group_frames={group_shot_frames}/{len(sample_times)}, dual_face={dual_face_spread_frames}/{len(sample_times)})")
-
-# ── Step 5: Handle each video type ───────────────────────────────────────────
-
-if video_type == "no_face":
-    log("No faces detected - applying 1.25x zoom (full frame, no center crop)")
-    with open(coords_path, "w") as f:
-        json.dump({"mode": "zoom_full", "zoom": 1.25, "src_w": src_w, "src_h": src_h}, f)
-    log("Done (zoom_full - no face).")
-    sys.exit(0)
-
-if video_type == "group":
-    log(f"Group shot detected (4+ faces) - letterboxing full frame into 9:16")
-    with open(coords_path, "w") as f:
-        json.dump({"mode": "letterbox", "src_w": src_w, "src_h": src_h}, f)
-    log("Done (letterbox - group shot).")
-    sys.exit(0)
-
-# ── Helper: detect PiP region from a set of faces ────────────────────────────
-
-def detect_pip_region(faces_list):
-    """Find the PiP webcam region from a list of face-lists (sampled frames).
-    Returns the pip_region dict or None if no PiP face found."""
-    pip_region = None
-    for faces in faces_list:
-        for face in faces:
-            face_w_ratio = face["w"] / src_w
-            in_corner = (face["cx"] < src_w * 0.35 or face["cx"] > src_w * 0.65) and \
-                        (face["cy"] < src_h * 0.35 or face["cy"] > src_h * 0.65)
-            is_small  = face_w_ratio < 0.25
-            if in_corner or is_small:
-                pad = int(face["w"] * 0.8)
-                pip_region = {
-                    "x": max(0, face["x"] - pad),
-                    "y": max(0, face["y"] - pad),
-                    "w": min(src_w - max(0, face["x"] - pad), face["w"] + pad * 2),
-                    "h": min(src_h - max(0, face["y"] - pad), face["h"] + pad * 2),
-                }
-                return pip_region
+release_detections("type")
+if type_reused:
+    log(f"Type detection: reused {type_reused}/{len(sample_times)} samples from earlier cuts")
+video_type = classify_video(sample_faces, len(sample_times), src_w, src_h)
+run_stats.video_type = video_type
+run_stats.samples    = len(sample_faces)
+
+# ── Webcam box (screen recordings with PiP) ───────────────────────────────────
+# The face-padding guess in detect_pip_region misses the overlay's real
+# edges. For each run of split-classified type samples (a shot), a few frame
+# pairs show the overlay directly as the rectangle of persistent change
+# (smartcrop/pip.py). Tracking then skips detection inside those runs - the
+# layout there is fixed - and split segments get the measured box.
+
+webcam_boxes = []   # [{"start", "end", "box"}] - box None when not found
+if video_type == "screen_pip":
+    pip_started = time.time()
+    try:
+        frame_types = [classify_frame(faces, src_w, src_h) for faces in sample_faces]
+        for start, end, indices in pip.split_runs(type_sample_t, frame_types):
+            pairs = []
+            for pt in pip.pair_times(start, end, duration):
+                pairs.append((decode_type_frame(pt)[0], decode_type_frame(pt + pip.PAIR_GAP)[0]))
+            box = pip.find_webcam_box(pairs, [sample_faces[i] for i in indices], src_w, src_h)
+            webcam_boxes.append({"start": round(start, 2), "end": round(end, 2), "box": box})
+            log(f"Webcam box {start:.1f}s-{end:.1f}s: {box or 'not found (face-padding fallback)'}")
+    except Exception as e:
+        log(f"WARNING: Webcam box detection failed, using face padding: {e}")
+        webcam_boxes = []
+    log(f"Webcam box detection: {len(webcam_boxes)} shot(s) in {time.time() - pip_started:.1f}s")
+
+def longest_webcam_box():
+    found = [b for b in webcam_boxes if b["box"]]
+    return max(found, key=lambda b: b["end"] - b["start"])["box"] if found else None
+
+def webcam_box_at(t):
+    for b in webcam_boxes:
+        if b["box"] and b["start"] <= t <= b["end"]:
+            return b["box"]
     return None
 
-def build_split_info(pip_region):
-    """Build the split-screen layout info from a PiP region."""
-    pip_cx = pip_region["x"] + pip_region["w"] // 2
-    if pip_cx > src_w * 0.5:
-        screen_x = 0
-        screen_w = pip_region["x"]
-    else:
-        screen_x = pip_region["x"] + pip_region["w"]
-        screen_w = src_w - screen_x
+# ── Static-camera fast path (smartcrop/shots.py) ──────────────────────────────
+# Thumbnail differences between type samples find the cuts and tell a
+# locked-off camera from a moving one; static_shot_layout decides in Step 5.
 
-    if screen_w < 100:
-        screen_w = src_w
-        screen_x = 0
+static_shot = None   # {"diffs", "cuts"} - recorded in dumps for replay
 
-    target_w = crop_w if crop_w > 0 else int(src_h * 9 / 16)
-    target_h = src_h
-    face_h = int(target_h * 0.50)
-    screen_h = target_h - face_h
+def decode_thumb(t):
+    frame = decode_type_frame(t)[0]
+    return shots.thumbnail(frame) if frame is not None else None
 
-    return {
-        "screen": {"x": screen_x, "y": 0, "w": screen_w, "h": src_h},
-        "pip": pip_region,
-        "src_w": src_w,
-        "src_h": src_h,
-        "target_w": target_w,
-        "face_h": face_h,
-        "screen_h": screen_h,
-        "screen_zoom": 1.25,
-    }
+# Shots are only judged from dense samples: long-form spreads them out and a
+# deadline may stop type detection before the end of the clip
+gaps = [b - a for a, b in zip([span[0]] + type_sample_t, type_sample_t + [span[1]])]
+# A shard doesn't know the source's type yet - the merge decides
+if (args.static_shot and (video_type == "podcast" or analyze_range) and not long_form and len(type_sample_t) >= 2
+        and max(gaps) <= SAMPLE_INTERVAL_SEC * 2.5):
+    try:
+        for i, thumb in enumerate(type_thumbs):
+            if thumb is None:   # answered by the detection store or frame cache
+                type_thumbs[i] = decode_thumb(type_sample_t[i])
+        diffs = [None] + [shots.thumb_diff(a, b) if a is not None and b is not None else None
+                          for a, b in zip(type_thumbs, type_thumbs[1:])]
+        cuts = [shots.refine_cut(type_sample_t[i - 1], type_sample_t[i], type_thumbs[i - 1], type_thumbs[i],
+                                 decode_thumb, 1.0 / fps)
+                for i in shots.cut_indices(diffs)]
+        # A shard compares its first sample with the previous shard's last, so
+        # a cut right at the boundary isn't lost between the two
+        prev_thumb = decode_thumb(boundary_t) if boundary_t is not None and type_thumbs[0] is not None else None
+        if prev_thumb is not None:
+            diffs[0] = shots.thumb_diff(prev_thumb, type_thumbs[0])
+            if diffs[0] > shots.CUT_LEVEL:
+                cuts.insert(0, shots.refine_cut(boundary_t, type_sample_t[0], prev_thumb, type_thumbs[0],
+                                                decode_thumb, 1.0 / fps))
+        static_shot = {"diffs": diffs, "cuts": cuts}
+    except Exception as e:
+        log(f"WARNING: Static-shot check failed, tracking instead: {e}")
+type_thumbs = None
+if cap is not None:
+    cap.release()
 
-# If the ENTIRE video is screen_pip, use the old fast path (no per-frame tracking needed)
-if video_type == "screen_pip":
-    # Check if ALL sampled frames look like PiP — if so, use static split for the whole clip
-    pip_frame_count = 0
-    for faces in sample_faces:
-        has_pip_face = any(
-            (f["w"] / src_w < 0.10 and
-             ((f["cx"] < src_w * 0.30 or f["cx"] > src_w * 0.70) and
-              (f["cy"] < src_h * 0.30 or f["cy"] > src_h * 0.70)))
-            or (f["w"] / src_w < 0.10)
-            for f in faces
-        )
-        if has_pip_face or not faces:
-            pip_frame_count += 1
-
-    # If 80%+ of frames are PiP-like, the whole clip is screen recording → static split
-    if pip_frame_count >= len(sample_times) * 0.80:
-        log("Screen recording with PiP face cam (consistent) - using static split screen mode")
-        pip_region = detect_pip_region(sample_faces)
-        if not pip_region:
-            pip_region = {"x": src_w - src_w // 4, "y": src_h - src_h // 4, "w": src_w // 4, "h": src_h // 4}
-        split_info = build_split_info(pip_region)
-        log(f"PiP region: {pip_region}")
-        with open(coords_path, "w") as f:
-            json.dump({"mode": "split", **split_info}, f)
-        log("Done (split screen mode - static).")
-        sys.exit(0)
-    else:
-        # Not all frames are PiP — fall through to per-frame tracking
-        # which will handle mixed split/face/letterbox segments
-        log(f"Screen PiP detected but only {pip_frame_count}/{len(sample_times)} frames are PiP-like — using per-frame tracking")
-
-# ── 5c-dual: Podcast with 2 speakers → stacked dual-face crop ────────────────
-
-if video_type == "podcast_dual":
-    log("Podcast dual-face detected - computing static dual crop positions...")
-
-    # ── Collect face positions from all 2-face sample frames ──────────────
-    left_faces_all = []
-    right_faces_all = []
-    for faces in sample_faces:
-        if len(faces) >= 2:
-            sorted_f = sorted(faces, key=lambda f: f["cx"])
-            left_faces_all.append(sorted_f[0])
-            right_faces_all.append(sorted_f[1])
-
-    if not left_faces_all:
-        log("WARNING: No dual-face frames found, falling back to single-face podcast")
-        video_type = "podcast"
-    else:
-        # Average face positions and sizes
-        avg_left_cx = int(sum(f["cx"] for f in left_faces_all) / len(left_faces_all))
-        avg_left_cy = int(sum(f["cy"] for f in left_faces_all) / len(left_faces_all))
-        avg_left_w  = int(sum(f["w"]  for f in left_faces_all) / len(left_faces_all))
-
-        avg_right_cx = int(sum(f["cx"] for f in right_faces_all) / len(right_faces_all))
-        avg_right_cy = int(sum(f["cy"] for f in right_faces_all) / len(right_faces_all))
-        avg_right_w  = int(sum(f["w"]  for f in right_faces_all) / len(right_faces_all))
-
-        log(f"Left speaker:  cx={avg_left_cx}, cy={avg_left_cy}, face_w={avg_left_w}")
-        log(f"Right speaker: cx={avg_right_cx}, cy={avg_right_cy}, face_w={avg_right_w}")
-
-        # ── Check if ALL sampled frames have 2 faces → use static dual for whole clip
-        # If not, fall through to per-frame tracking which handles mixed 1-face/2-face segments
-        dual_frame_ratio = len(left_faces_all) / len(sample_faces) if sample_faces else 0
-        log(f"Dual-face frame ratio: {dual_frame_ratio:.2f} ({len(left_faces_all)}/{len(sample_faces)})")
-
-        if dual_frame_ratio >= 0.80:
-            # 80%+ of frames have 2 faces → safe to use static dual crop for entire clip
-            log("Using static dual crop (2 faces in 80%+ of frames)")
-
-            panel_aspect = 9.0 / 8.0
-            mid_x = (avg_left_cx + avg_right_cx) // 2
-            left_max_w = mid_x
-            right_max_w = src_w - mid_x
-            max_crop_w = min(left_max_w, right_max_w)
-
-            face_crop_h = src_h
-            face_crop_w = int(face_crop_h * panel_aspect)
-
-            if face_crop_w > max_crop_w:
-                face_crop_w = max_crop_w
-                face_crop_h = int(face_crop_w / panel_aspect)
-
-            face_crop_w = face_crop_w - (face_crop_w % 2)
-            face_crop_h = face_crop_h - (face_crop_h % 2)
-
-            left_x = avg_left_cx - face_crop_w // 2
-            left_x = max(0, min(left_x, mid_x - face_crop_w))
-
-            right_x = avg_right_cx - face_crop_w // 2
-            right_x = max(mid_x, min(right_x, src_w - face_crop_w))
-
-            left_y = max(0, avg_left_cy - int(face_crop_h * 0.40))
-            left_y = max(0, min(left_y, src_h - face_crop_h))
-
-            right_y = max(0, avg_right_cy - int(face_crop_h * 0.40))
-            right_y = max(0, min(right_y, src_h - face_crop_h))
-
-            log(f"Crop size: {face_crop_w}x{face_crop_h} (panel 9:8)")
-            log(f"Left crop:  x={left_x}, y={left_y}")
-            log(f"Right crop: x={right_x}, y={right_y}")
-            log(f"Gap between crops: {right_x - (left_x + face_crop_w)}px")
-
-            with open(coords_path, "w") as f:
-                json.dump({
-                    "mode": "podcast_dual",
-                    "left_crop":  {"x": left_x,  "y": left_y,  "w": face_crop_w, "h": face_crop_h},
-                    "right_crop": {"x": right_x, "y": right_y, "w": face_crop_w, "h": face_crop_h},
-                    "src_w": src_w,
-                    "src_h": src_h,
-                }, f)
-
-            log("Done (podcast_dual - static crop).")
-            sys.exit(0)
-        else:
-            # Mixed: some frames have 2 faces, some have 1 or 0.
-            # Fall through to per-frame tracking which will produce mixed segments:
-            # - "podcast_dual" segments when 2 faces are visible
-            # - "face" segments when only 1 face is visible (single-face tracking)
-            # Store the dual crop info for use in per-frame segment building later.
-            log(f"Only {dual_frame_ratio:.0%} of frames have 2 faces — falling through to per-frame tracking for mixed dual/single segments")
-            video_type = "podcast"  # use per-frame tracking path
-            # Store dual crop info as globals for the segment builder to use
-            _dual_crop_info = {
-                "avg_left_cx": avg_left_cx, "avg_left_cy": avg_left_cy,
-                "avg_right_cx": avg_right_cx, "avg_right_cy": avg_right_cy,
-                "avg_left_w": avg_left_w, "avg_right_w": avg_right_w,
-            }
+# ── Detection dump (for replay) ───────────────────────────────────────────────
+# --dump-detections records what the detectors saw, so classification and
+# smoothing can be re-run from it without decoding (python3 -m smartcrop.replay).
+
+def dump_detections(frame_data=None, speaker_turns=None, speaker_seed=None):
+    """Returns False when the dump was asked for but couldn't be written."""
+    if not args.dump_detections:
+        return True
+    shard = {}
+    if analyze_range:
+        shard = {"range": list(analyze_range),
+                 "edges": {"start": shard_start,
+                           "end":   {"next_t": track["t"], "prev_faces": track["prev_faces"],
+                                     "detect_h": track["detect_h"], "interval": track["interval"]}}}
+    try:
+        replay.write_dump(args.dump_detections, {
+            **shard,
+            "src_w":           src_w,
+            "src_h":           src_h,
+            "fps":             fps,
+            "duration":        duration,
+            "n_type_samples":  len(sample_times),
+            "sample_faces":    sample_faces,
+            "sample_times":    type_sample_t,
+            "webcam_boxes":    webcam_boxes,
+            "static_shot":     static_shot,
+            "sample_interval": sample_interval if frame_data is not None else None,
+            "frame_data":      frame_data,
+            "diarization":     speaker_turns or [],
+            "speaker_seed":    speaker_seed or {},
+            "options":         cache_params(),
+        })
+        log(f"Detections dumped to {args.dump_detections}")
+        return True
+    except OSError as e:
+        log(f"WARNING: Could not dump detections: {e}")
+        return False
+
+# ── Step 5: Handle each video type ───────────────────────────────────────────
+# no_face → zoom_full, group → letterbox, consistent screen PiP → static split,
+# 2 speakers in 80%+ of samples → static podcast_dual. Anything else falls
+# through to per-frame tracking.
+
+static_payload = done_msg = None
+static_layouts = [None] * len(args.aspects)   # per aspect, None where it needs tracking
+if analyze_range:
+    log("Shard: the layout is decided at merge - tracking the range")
+else:
+    # One layout per output aspect (--aspects); the first is the primary
+    static = [aspects.static_payload(video_type, sample_faces, len(sample_times), type_sample_t, static_shot,
+                                     longest_webcam_box(),
+                                     aspects.geometry(src_w, src_h, fps, aspect, preset["post_passes"]))
+              for aspect in args.aspects]
+    static_layouts = [p for p, _ in static]
+    static_payload, done_msg = static[0]
+    tracked = [aspects.name(a) for a, p in zip(args.aspects[1:], static_layouts[1:]) if p is None]
+    if static_payload is not None and tracked and not long_form:
+        # Tracking runs for those; the aspects with a layout keep it
+        log(f"Aspect(s) {', '.join(tracked)} need tracking - tracking the clip")
+        static_payload = None
+    if static_payload is not None:
+        static_payload = aspects.attach(static_payload, args.aspects, [p for p, _ in static[1:]])
+if static_payload is not None:
+    if budget.degraded:
+        static_payload["degraded"] = budget.degraded
+    write_coords(static_payload)
+    run_stats.mode = static_payload["mode"]
+    dump_detections()
+    save_detections()
+    log(done_msg)
+    store_result()
+    sys.exit(0)
 
 # ── 5c: Podcast / talking head → face tracking crop ──────────────────────────
 
@@ -590,672 +1231,494 @@ hf_token = os.environ.get("HF_TOKEN")
 has_audio = False
 diarization_segments = []
 
+# Long-form: look for a checkpoint before diarization, so a resumed run reuses
+# the speaker turns it already paid for.
+lf_files = lf_state = None
+if long_form:
+    checkpoint_dir = args.checkpoint_dir or tmp_dir
+    lf_files = longform.paths(checkpoint_dir, clip_id)
+    lf_job = longform.job_key(local_video, duration, fps, sample_interval, {
+        "active_speaker": args.active_speaker,
+        "roi_detect":     args.roi_detect,
+        "adaptive_res":   args.adaptive_res,
+        "preset":         args.preset,
+        **({"range": list(analyze_range)} if analyze_range else {}),
+    })
+    lf_state = longform.load_checkpoint(lf_files, lf_job)
+    if lf_state:
+        log(f"Long-form: resuming from checkpoint at t={lf_state['track']['t']:.1f}s (chunk {lf_state['chunk']})")
+    else:
+        log(f"Long-form: {longform.CHUNK_SEC:.0f}s chunks, checkpoints in {checkpoint_dir}")
+
+# Audio extraction and diarization run in a background process
+# (smartcrop/diarize.py) while faces are tracked; they are only joined when
+# speaker turns are needed, so a clip costs max(diarize, track), not the sum.
+diarization_job  = None
+diarization_path = os.path.join(tmp_dir, f"{clip_id}_diarization.json")
+
+# Visual active-speaker detection replaces diarization: audio is only needed
+# for its energy envelope, so extract it but never load pyannote/torch.
+if args.active_speaker:
+    log("Active-speaker mode - extracting audio for energy gating in the background (no diarization)...")
+    diarization_job = DiarizationJob(local_video, audio_path, diarization_path, diarize=False)
+elif lf_state is not None:
+    diarization_segments = lf_state["diarization"]
+    log(f"Reusing {len(diarization_segments)} diarization segments from checkpoint")
+elif hf_token and not preset["diarize"]:
+    log(f"Preset {args.preset} - skipping audio extraction & diarization")
+elif hf_token and not latency.plan_diarization(budget, span[1] - span[0]):
+    log("Deadline too tight for diarization - skipping audio extraction & diarization")
 # Only extract audio if HF_TOKEN is set (needed for diarization)
-if hf_token:
-    log("Extracting audio for diarization...")
-    audio_result = subprocess.run(
-        ["ffmpeg", "-y", "-i", local_video,
-         "-vn", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", audio_path],
-        capture_output=True
-    )
-    has_audio = audio_result.returncode == 0
-    if not has_audio:
-        log("WARNING: No audio track found - skipping diarization")
-
-    if has_audio:
-        try:
-            log("Running speaker diarization...")
-            from pyannote.audio import Pipeline
-            pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", token=hf_token)
-            diarization = pipeline(audio_path)
-            for turn, _, speaker in diarization.itertracks(yield_label=True):
-                diarization_segments.append({"start": turn.start, "end": turn.end, "speaker": speaker})
-            speakers = set(s["speaker"] for s in diarization_segments)
-            log(f"Diarization done: {len(diarization_segments)} segments, {len(speakers)} speakers")
-        except Exception as e:
-            log(f"WARNING: Diarization failed ({e}) - face-only tracking. "
-                f"To fix: pip install pyannote.audio && accept model terms at "
-                f"https://huggingface.co/pyannote/speaker-diarization-3.1")
+elif hf_token:
+    log("Extracting audio + running speaker diarization in the background...")
+    diarization_job = DiarizationJob(local_video, audio_path, diarization_path, time_range=analyze_range)
 else:
     log("No HF_TOKEN - skipping audio extraction & diarization")
 
-def get_speaker_at(t):
-    for seg in diarization_segments:
-        if seg["start"] <= t <= seg["end"]:
-            return seg["speaker"]
+def join_diarization():
+    """Wait for the background audio/diarization process, if one is running."""
+    global diarization_job, has_audio, diarization_segments, result_cacheable
+    if diarization_job is None:
+        return
+    timeout = None
+    if budget.deadline is not None:
+        timeout = max(0.0, budget.remaining() - budget.reserve(duration))
+    has_audio, segments = diarization_job.join(timeout)
+    if diarization_job.timed_out:
+        budget.degrade("diarization_cancelled")
+    if diarization_job.failed:
+        result_cacheable = False   # a later run may get the speakers this one lost
+    run_stats.diarization_sec = diarization_job.elapsed
+    if not args.active_speaker:
+        diarization_segments = segments
+    diarization_job = None
+
+# ── Adaptive detection resolution ─────────────────────────────────────────────
+# DETECT_MAX_H suits no content in particular: a close-up talking head is found
+# just as well at 192p, while a small PiP webcam needs more than 480p. Pick the
+# lowest rung of the ladder at which the smallest faces seen during type
+# detection are still TARGET_FACE_PX wide, and escalate during tracking when
+# detections drop out.
+DETECT_LADDER  = (192, 288, 360, 480, 720, 1080)
+TARGET_FACE_PX = 48   # smallest face width wanted at detection resolution
+ESCALATE_AFTER = 2    # rescued dropouts before moving up a rung for good
+
+def choose_detect_height(face_widths, frame_h):
+    """Lowest ladder rung that keeps small faces TARGET_FACE_PX wide.
+    face_widths are source pixels, frame_h the source height."""
+    if not face_widths:
+        return min(DETECT_MAX_H, frame_h)
+    widths  = sorted(face_widths)
+    small_w = widths[len(widths) // 10]  # 10th percentile - ignore a stray tiny false positive
+    for h in DETECT_LADDER:
+        if h >= frame_h or small_w * h / frame_h >= TARGET_FACE_PX:
+            return min(h, frame_h)
+    return min(DETECT_LADDER[-1], frame_h)
+
+def next_detect_height(h, frame_h):
+    """Next ladder rung above h that the frame can still provide, or None."""
+    for rung in DETECT_LADDER:
+        if rung > h and h < frame_h:
+            return min(rung, frame_h)
     return None
 
+track_video = proxy_video
+track_scale = proxy_scale
+if args.adaptive_res:
+    detect_h = choose_detect_height([f["w"] for faces in sample_faces for f in faces], src_h)
+    if preset["detect_min_h"]:
+        detect_h = max(detect_h, min(preset["detect_min_h"], src_h))
+    if preset["detect_cap_h"]:
+        detect_h = min(detect_h, preset["detect_cap_h"])
+else:
+    detect_h = DETECT_MAX_H
+
+# Under --deadline, price the tracking pass from what type detection cost per
+# sample and give up sampling density / resolution until it fits.
+track_interval, detect_h = latency.plan_tracking(
+    budget, duration, sample_interval, detect_h,
+    type_detect[1] / type_detect[0] if type_detect[0] else latency.DEFAULT_SAMPLE_SEC,
+    DETECT_MAX_H, DETECT_LADDER)
+if budget.degraded:
+    log(f"Deadline {args.deadline:.1f}s ({budget.remaining():.1f}s left): degraded {', '.join(budget.degraded)}")
+
+if args.adaptive_res:
+    if detect_h > PROXY_MAX_H and proxy_video != local_video:
+        # Faces too small for the proxy - track on the original resolution
+        track_video = local_video
+        track_scale = 1.0
+    log(f"Detection resolution: {detect_h}p (ladder {DETECT_LADDER}, "
+        f"tracking on {'proxy' if track_video == proxy_video else 'original'})")
+
 # ── IMPROVEMENT 3: Face detection loop with identity matching ─────────────────
 
-def classify_frame(faces):
-    """Classify a single frame based on its detected faces.
-    Returns: 'split' | 'face' | 'podcast_dual' | 'group' | 'no_face'"""
-    if not faces:
-        return "no_face"
-    if len(faces) >= 4:
-        return "group"
-    # Check for PiP pattern: small face in corner/side
-    for face in faces:
-        w_ratio = face["w"] / src_w if src_w > 0 else 0
-        is_small = w_ratio < 0.10
-        in_corner = (face["cx"] < src_w * 0.30 or face["cx"] > src_w * 0.70) and \
-                    (face["cy"] < src_h * 0.30 or face["cy"] > src_h * 0.70)
-        on_side = face["cx"] < src_w * 0.25 or face["cx"] > src_w * 0.75
-        if is_small and (in_corner or on_side):
-            return "split"
-    # Check for 2 spread-apart faces (podcast dual layout)
-    if len(faces) == 2:
-        both_big = all(f["w"] / src_w >= 0.08 for f in faces)
-        if both_big:
-            sorted_f = sorted(faces, key=lambda f: f["cx"])
-            gap_ratio = (sorted_f[1]["cx"] - sorted_f[0]["cx"]) / src_w if src_w > 0 else 0
-            if gap_ratio >= 0.25:
-                return "podcast_dual"
-    return "face"
-
-# Pre-compute PiP region from sample_faces for split segments
-# (used later when building split segment info)
-global_pip_region = detect_pip_region(sample_faces)
-if not global_pip_region:
-    global_pip_region = {"x": src_w - src_w // 4, "y": src_h - src_h // 4, "w": src_w // 4, "h": src_h // 4}
-
-cap = cv2.VideoCapture(proxy_video)
+# Pre-compute PiP region for split segments (used later when building split
+# segment info) - the measured webcam box when there is one
+global_pip_region = (longest_webcam_box() or detect_pip_region(sample_faces, src_w, src_h)
+                     or default_pip_region(src_w, src_h))
+
+cap = cv2.VideoCapture(track_video)
 if not cap.isOpened():
     log("WARNING: Could not open proxy for face tracking, trying original")
     cap = cv2.VideoCapture(local_video)
-    proxy_scale = 1.0
+    track_scale = 1.0
     if not cap.isOpened():
         write_fallback_and_exit("could not open video for face tracking")
-# Adaptive sample interval: 0.1s for short clips, 0.2s for longer ones
-sample_interval = 0.2 if duration > 30 else 0.1
-log(f"Face tracking interval: {sample_interval}s ({int(duration / sample_interval)} samples)")
-frame_data = []
-prev_faces = []
-t = 0.0
-try:
-    while t < duration:
-        cap.set(cv2.CAP_PROP_POS_MSEC, t * 1000)
-        ret, frame = cap.read()
-        if not ret:
-            break
-        faces = detect_faces_in_frame(frame, proxy_scale)
-        faces = match_faces_across_frames(prev_faces, faces)
-        frame_type = classify_frame(faces)
-        # For split frames, also try to detect PiP region from this specific frame
-        frame_pip = None
-        if frame_type == "split":
-            frame_pip = detect_pip_region([faces])
-        frame_data.append({"t": round(t, 2), "faces": faces, "frame_type": frame_type, "pip": frame_pip})
-        prev_faces = faces
-        t += sample_interval
-except Exception as e:
-    log(f"WARNING: Face tracking loop error at t={t:.2f}s: {e} — using {len(frame_data)} frames collected so far")
-finally:
-    cap.release()
-
-# If we got zero usable frames, fall back
-if not frame_data:
-    write_fallback_and_exit("face tracking produced zero frames")
-
-detected = sum(1 for f in frame_data if f["faces"])
-log(f"Face detection done: {detected}/{len(frame_data)} frames have faces")
-
-fd_map = {}
-for fd in frame_data:
-    # Use string key to avoid floating point comparison issues
-    fd_map[f"{fd['t']:.2f}"] = fd
-
-speaker_pos = {}  # speaker_id → average face cx position
-
-# Build speaker → face position mapping by correlating diarization with face detections
-# For each frame with 2+ faces where someone is speaking, record which face is closest
-# to where that speaker has been seen before (or assign by elimination)
-speaker_face_samples = {}  # speaker_id → list of cx values
-
-for fd in frame_data:
-    if len(fd["faces"]) < 2:
-        continue
-    spk = get_speaker_at(fd["t"])
-    if not spk:
-        continue
-
-    sorted_faces = sorted(fd["faces"], key=lambda f: f["cx"])
-
-    if spk in speaker_pos:
-        # Already have a position estimate - pick the closest face
-        best_face = min(sorted_faces, key=lambda f: abs(f["cx"] - speaker_pos[spk]))
-        speaker_face_samples.setdefault(spk, []).append(best_face["cx"])
+log(f"Face tracking interval: {track_interval}s ({int(duration / track_interval)} samples)")
+
+# Tracking state - one dict so long-form checkpoints can save and restore it
+track = {
+    "t":              0.0,
+    "interval":       track_interval,   # widened by the deadline governor
+    "prev_faces":     [],
+    "roi_samples":    0,      # samples since the last full-frame scan
+    "full_scans":     0,
+    "detect_h":       detect_h,
+    "detect_rescues": 0,
+    "samples":        0,
+    "detected":       0,
+    "reused":         0,      # samples answered by the detection store
+    "pip_skipped":    0,      # samples inside a measured webcam-box shot
+}
+track_end = span[1]
+if analyze_range:
+    # First sample on the grid a whole-source run would sample
+    shard_grid = grid_times(range_start, range_end, track_interval, source_offset if det_store is not None else 0.0)
+    track["t"] = shard_grid[0] if shard_grid else range_end
+shard_start = {"t": track["t"], "detect_h": track["detect_h"]}   # shard edge state
+if analyze_range and not shard_grid:
+    # A sliver shorter than the interval - an empty shard, not a failure
+    log("Shard: no tracking samples in the range")
+    if diarization_job is not None:
+        diarization_job.cancel()
+    sys.exit(0 if dump_detections([]) else 1)
+governor = latency.TrackingGovernor(budget, duration, DETECT_LADDER)
+
+def track_next_sample():
+    """Detect faces at track["t"] and advance. Returns the sample's frame_data
+    entry, or None when the video ends (or the deadline leaves no time)."""
+    if not governor.check(track):
+        return None
+    t = track["t"]
+    prev_faces = track["prev_faces"]
+    webcam_box = webcam_box_at(t)
+    faces = (det_store.get("track", source_offset + t, track["detect_h"], args.roi_detect)
+             if det_store is not None else None)
+    if faces is not None:
+        track["reused"] += 1
+    elif webcam_box is not None:
+        # Split shot with a measured box: the layout is fixed, the nearest
+        # type sample stands in for the faces
+        nearest = min(range(len(type_sample_t)), key=lambda i: abs(type_sample_t[i] - t))
+        faces = sample_faces[nearest]
+        track["pip_skipped"] += 1
     else:
-        # First time seeing this speaker - pick the face NOT claimed by other speakers
-        claimed_positions = set(speaker_pos.keys())
-        unclaimed_faces = sorted_faces[:]
-
-        # Remove faces that are closest to already-mapped speakers
-        for mapped_spk, mapped_cx in speaker_pos.items():
-            if unclaimed_faces:
-                closest = min(unclaimed_faces, key=lambda f: abs(f["cx"] - mapped_cx))
-                unclaimed_faces.remove(closest)
-
-        if unclaimed_faces:
-            # Assign the first unclaimed face (leftmost remaining)
-            best_face = unclaimed_faces[0]
-        else:
-            # All faces claimed - just pick the closest to center as fallback
-            best_face = min(sorted_faces, key=lambda f: abs(f["cx"] - src_w // 2))
-
-        speaker_face_samples.setdefault(spk, []).append(best_face["cx"])
-
-    # Update running average position for this speaker
-    samples = speaker_face_samples[spk]
-    speaker_pos[spk] = int(sum(samples) / len(samples))
-
-if speaker_pos:
-    for spk, cx in speaker_pos.items():
-        log(f"Speaker mapping: {spk} → cx={cx}")
+        detect_started = time.time()
+        detected = detect_sample(t, prev_faces)
+        if detected is None:
+            return None
+        faces, detect_h, roi = detected
+        governor.observe(time.time() - detect_started)
+        if det_store is not None:
+            det_store.put("track", source_offset + t, faces, detect_h, roi)
+    faces = match_faces_across_frames(prev_faces, faces)
+    frame_type = "split" if webcam_box is not None else classify_frame(faces, src_w, src_h)
+    # For split frames, also try to detect PiP region from this specific frame
+    frame_pip = webcam_box
+    if frame_type == "split" and frame_pip is None:
+        frame_pip = detect_pip_region([faces], src_w, src_h)
+    track["prev_faces"] = faces
+    if det_store is not None:
+        track["t"] = next_grid_time(t, track["interval"], source_offset)
+    else:
+        track["t"] = t + track["interval"]
+    track["samples"] += 1
+    run_stats.samples += 1
+    if faces:
+        track["detected"] += 1
+    return {"t": round(t, 2), "faces": faces, "frame_type": frame_type, "pip": frame_pip}
+
+def decode_frame(t):
+    cap.set(cv2.CAP_PROP_POS_MSEC, t * 1000)
+    ret, frame = cap.read()
+    return frame if ret else None
+
+def detect_sample(t, prev_faces):
+    """Decode the frame at t and detect faces (ROI / adaptive resolution /
+    frame cache aware). Returns (faces, detection height, whether only the
+    ROIs were searched), or None when the video ends."""
+    frame    = None
+    faces    = None
+    detect_h = track["detect_h"]
+    if args.roi_detect and prev_faces and track["roi_samples"] < ROI_FULL_SCAN_EVERY:
+        frame = decode_frame(t)
+        if frame is None:
+            return None
+        faces = detect_faces_roi(frame, prev_faces, track_scale)
+        track["roi_samples"] += 1
+    if faces is None:
+        decoded = frame
+        faces, frame = detect_cached(t, lambda: (decoded if decoded is not None else decode_frame(t), track_scale),
+                                     track_scale, track["detect_h"])
+        if faces is None:
+            return None
+        track["roi_samples"] = 0
+        track["full_scans"] += 1
+        if not faces and prev_faces and args.adaptive_res:
+            # Faces dropped out - retry one rung up before believing it
+            if frame is None:
+                frame = decode_frame(t)   # the cached frame is only detection resolution
+            higher_h = next_detect_height(track["detect_h"], frame.shape[0]) if frame is not None else None
+            if higher_h:
+                faces    = detect_faces_in_frame(frame, track_scale, detect_h=higher_h)
+                detect_h = higher_h
+                if faces:
+                    track["detect_rescues"] += 1
+                    if track["detect_rescues"] >= ESCALATE_AFTER:
+                        log(f"Detection resolution escalated {track['detect_h']}p → {higher_h}p at t={t:.2f}s")
+                        track["detect_h"] = higher_h
+                        track["detect_rescues"] = 0
+        return faces, detect_h, False
+    return faces, detect_h, True
+
+# ── Crop path stages (smartcrop.pipeline) ─────────────────────────────────────
+# Speaker mapping → raw crop x → adaptive EMA → eased interpolation → 2-pass
+# post-smoothing → segment builder. Every stage streams, so a normal clip runs
+# them once over all samples and long-form mode runs them chunk by chunk.
+# --path-engine global swaps EMA, interpolation and post-smoothing for one
+# solve over the whole clip (smartcrop/trend.py).
+
+geom = aspects.geometry(src_w, src_h, fps, args.aspects[0], preset["post_passes"])
+log(f"Smoothing thresholds (scaled to {src_w}px): DEAD={geom.dead_zone}, MOVE={geom.move_zone}, SNAP={geom.snap_zone}")
+
+if long_form:
+    sink = SpoolSink(lf_files["spool"], lf_state["spool_size"] if lf_state else None)
 else:
-    log("No speaker-face mapping established")
-
-# Fallback: if diarization exists but no mapping was built (e.g., never 2+ faces while speaking)
-# Map speakers to evenly spaced positions across the frame
-if not speaker_pos and diarization_segments:
-    all_speakers = sorted(set(s["speaker"] for s in diarization_segments),
-                          key=lambda sp: next(s["start"] for s in diarization_segments if s["speaker"] == sp))
-    for i, spk in enumerate(all_speakers):
-        speaker_pos[spk] = int(src_w * (i + 1) / (len(all_speakers) + 1))
-        log(f"Speaker mapping (fallback): {spk} → cx={speaker_pos[spk]}")
-
-def get_crop_x(faces, t, last_crop_cx=None):
-    """Get the horizontal crop position for a frame. Returns None if no faces.
-    Wrapped in try/catch so a single bad frame never crashes the pipeline."""
+    sink = MemorySink()
+pipeline = speaker_audio = None
+
+def start_pipeline():
+    """Join the diarization process and set up the crop pipeline - the first
+    point where speaker turns are needed."""
+    global pipeline, speaker_audio
+    join_diarization()
+    pipeline = CropPipeline(geom, diarization_segments, sink, bounded=long_form, engine=args.path_engine)
+    speaker_audio = audio_path if has_audio else None
+
+if not long_form:
+    frame_data = []
     try:
-        if not faces:
-            return None
-        if len(faces) == 1:
-            target_cx = faces[0]["cx"]
-        else:
-            spk = get_speaker_at(t)
-            primary_cx = None
-
-            if spk and spk in speaker_pos:
-                primary_cx = min(faces, key=lambda f: abs(f["cx"] - speaker_pos[spk]))["cx"]
-            elif last_crop_cx is not None:
-                edge_margin = crop_w
-                interior = [f for f in faces if edge_margin < f["cx"] < src_w - edge_margin]
-                candidates = interior if interior else faces
-                primary_cx = min(candidates, key=lambda f: abs(f["cx"] - last_crop_cx))["cx"]
-            else:
-                edge_margin = crop_w
-                interior = [f for f in faces if edge_margin < f["cx"] < src_w - edge_margin]
-                candidates = interior if interior else faces
-                primary_cx = max(candidates, key=lambda f: f["area"])["cx"]
-
-            nearby = [f for f in faces if abs(f["cx"] - primary_cx) < crop_w * 0.8]
-            if len(nearby) >= 2:
-                left_cx  = min(f["cx"] for f in nearby)
-                right_cx = max(f["cx"] for f in nearby)
-                group_span = right_cx - left_cx
-                face_padding = max(f["w"] for f in nearby) // 2
-                if group_span + face_padding * 2 <= crop_w:
-                    target_cx = (left_cx + right_cx) // 2
-                else:
-                    target_cx = primary_cx
-            else:
-                target_cx = primary_cx
-
-        crop_x = target_cx - crop_w // 2
-        return max(0, min(crop_x, src_w - crop_w))
+        while track["t"] < track_end:
+            fd = track_next_sample()
+            if fd is None:
+                break
+            frame_data.append(fd)
     except Exception as e:
-        log(f"WARNING: get_crop_x failed at t={t}: {e}")
-        return None
-
-# ── IMPROVEMENT 4: Velocity-based prediction when face is missing ─────────────
-
-last_x        = (src_w - crop_w) // 2
-last_cx       = src_w // 2
-last_velocity = 0.0
-raw_coords    = []
-
-for fd in frame_data:
-    x        = get_crop_x(fd["faces"], fd["t"], last_cx)
-    has_face = bool(fd["faces"])
-
-    if x is None:
-        # No face detected - smoothly transition toward center crop
-        # instead of blindly holding the last face position.
-        # This handles B-roll, text screens, etc. much better.
-        center_x = (src_w - crop_w) // 2
-        # Blend toward center: 8% per step (reaches center in ~3-4s)
-        # Slower than before (was 20%) to avoid visible drift when face
-        # detection flickers for just 1-2 frames
-        predicted_x = last_x + (center_x - last_x) * 0.08
-        x             = int(max(0, min(predicted_x, src_w - crop_w)))
-        last_velocity *= 0.3
-    else:
-        last_velocity = x - last_x
-        last_cx       = x + crop_w // 2
-
-    raw_coords.append({"t": fd["t"], "x": x, "face": has_face, "frame_type": fd.get("frame_type", "face"), "pip": fd.get("pip")})
-    last_x = x
-
-# ── IMPROVEMENT 5: Adaptive alpha (velocity-aware EMA smoothing) ──────────────
-
-# DEAD_ZONE: ignore movements smaller than this (prevents micro-jitter from face detection noise)
-# MOVE_ZONE: start slow panning only above this threshold (prevents wobble from natural head sway)
-# SNAP_ZONE: instant jump for speaker switches / scene cuts
-# All thresholds are RELATIVE to video width so they scale correctly for 720p, 1080p, 4K, etc.
-DEAD_ZONE = max(60, int(src_w * 0.025))   # ~2.5% of width (e.g. 96px on 4K, 48px on 1080p)
-MOVE_ZONE = max(120, int(src_w * 0.055))   # ~5.5% of width (e.g. 211px on 4K, 105px on 1080p)
-SNAP_ZONE = max(400, int(src_w * 0.12))    # ~12% of width (e.g. 460px on 4K, 230px on 1080p)
-
-log(f"Smoothing thresholds (scaled to {src_w}px): DEAD={DEAD_ZONE}, MOVE={MOVE_ZONE}, SNAP={SNAP_ZONE}")
-
-# Velocity history: track recent movement directions to detect oscillation.
-# If the face is bouncing left-right (gesturing, laughing), we suppress the pan
-# instead of chasing every frame. Window of 8 samples ≈ 1.6s of history at 0.2s interval.
-VELOCITY_WINDOW = 8
-
-if not raw_coords:
-    log("WARNING: No raw coordinates - skipping reframe")
-    with open(coords_path, "w") as f:
-        json.dump({"mode": "skip"}, f)
-    try: os.unlink(audio_path)
-    except: pass
+        log(f"WARNING: Face tracking loop error at t={track['t']:.2f}s: {e} — using {len(frame_data)} frames collected so far")
+        result_cacheable = False
+    finally:
+        cap.release()
+
+    # If we got zero usable frames, fall back
+    if not frame_data:
+        write_fallback_and_exit("face tracking produced zero frames")
+
+    log(f"Face detection done: {track['detected']}/{len(frame_data)} frames have faces")
+    if det_store is not None:
+        log(f"Detection store: reused {track['reused']}/{len(frame_data)} samples, detected {len(frame_data) - track['reused']}")
+        save_detections()
+    if args.roi_detect:
+        log(f"ROI detection: {track['full_scans']}/{len(frame_data)} samples needed a full-frame scan")
+    if track["pip_skipped"]:
+        log(f"Webcam box: {track['pip_skipped']}/{len(frame_data)} samples skipped detection")
+    log_frame_cache()
+
+    start_pipeline()
+    speaker_seed = {}
+    if args.active_speaker:
+        turns, speaker_seed, gated = pipeline.estimate_speakers(frame_data, track["interval"], speaker_audio)
+        log(f"Active speaker: {len(turns)} turns, {len(speaker_seed)} speaking tracks"
+            f"{' (audio-gated)' if gated else ''}")
+
+    if not analyze_range:   # shards only record - the merge runs the crop path
+        pipeline.run(frame_data)
+        pipeline.log_speaker_mapping()
+    dump_ok = dump_detections(frame_data, pipeline.turns if args.active_speaker else diarization_segments,
+                              speaker_seed)
+else:
+    # Long-form: track CHUNK_SEC at a time, push the chunk through the
+    # pipeline, checkpoint, and forget it. Until the diarization process is
+    # done, tracked chunks wait in `pending` instead (the pipeline needs the
+    # speaker turns); a checkpoint is only written once nothing is pending,
+    # so it never records tracking progress the pipeline hasn't seen.
+    chunk_index = 0
+    dump_turns  = []
+    pending     = []
+    if lf_state:
+        track.update(lf_state["track"])
+        sink.count  = lf_state["spool_count"]
+        chunk_index = lf_state["chunk"]
+    detection_log = longform.DetectionLog(lf_files["detections"],
+                                          lf_state["detections_size"] if lf_state else None)
+    try:
+        while True:
+            chunk = []
+            stop = track["t"] >= track_end
+            if not stop:
+                chunk_end = min(track["t"] + longform.CHUNK_SEC, track_end)
+                try:
+                    while track["t"] < chunk_end:
+                        fd = track_next_sample()
+                        if fd is None:
+                            stop = True
+                            break
+                        chunk.append(fd)
+                        detection_log.append(fd)
+                except Exception as e:
+                    log(f"WARNING: Face tracking loop error at t={track['t']:.2f}s: {e} — finishing with the samples collected so far")
+                    result_cacheable = False
+                    stop = True
+                if not chunk:
+                    stop = True
+                else:
+                    pending.append(chunk)
+                    release_detections("track", source_offset + track["t"])
+            if not stop and diarization_job is not None and not diarization_job.done():
+                log(f"Long-form: tracked to t={track['t']:.1f}s, diarization still running")
+                continue
+            if pipeline is None:
+                start_pipeline()
+                if lf_state:
+                    pipeline.load_state(lf_state["pipeline"])
+            for chunk in pending:
+                if args.active_speaker:
+                    turns, _, _ = pipeline.estimate_speakers(chunk, track["interval"], speaker_audio,
+                                                             prefix=f"TRACK_{chunk_index}_")
+                    dump_turns.extend(turns)
+                if not analyze_range:   # shards only record - the merge runs the crop path
+                    pipeline.run(chunk)
+                chunk_index += 1
+            if pending:
+                pending = []
+                longform.save_checkpoint(lf_files, {
+                    "job":             lf_job,
+                    "chunk":           chunk_index,
+                    "track":           track,
+                    "diarization":     diarization_segments,
+                    "pipeline":        pipeline.state(),
+                    "spool_size":      sink.size(),
+                    "spool_count":     sink.count,
+                    "detections_size": detection_log.size(),
+                })
+                save_detections()
+                log(f"Long-form: chunk {chunk_index} done at t={track['t']:.1f}s "
+                    f"({track['detected']}/{track['samples']} samples with faces)")
+            if stop:
+                break
+    finally:
+        cap.release()
+        detection_log.close()
+
+    if not track["samples"]:
+        longform.cleanup(lf_files)
+        write_fallback_and_exit("face tracking produced zero frames")
+
+    log(f"Face detection done: {track['detected']}/{track['samples']} frames have faces")
+    if det_store is not None:
+        log(f"Detection store: reused {track['reused']}/{track['samples']} samples")
+    if args.roi_detect:
+        log(f"ROI detection: {track['full_scans']}/{track['samples']} samples needed a full-frame scan")
+    if track["pip_skipped"]:
+        log(f"Webcam box: {track['pip_skipped']}/{track['samples']} samples skipped detection")
+    log_frame_cache()
+    if not analyze_range:
+        pipeline.log_speaker_mapping()
+    # Detections are streamed from the log rather than loaded. A resumed run
+    # only knows the active-speaker turns of the chunks it processed itself.
+    dump_ok = dump_detections(longform.read_detections(lf_files["detections"]),
+                              dump_turns if args.active_speaker else diarization_segments)
+
+# ── Shard output ──────────────────────────────────────────────────────────────
+# The shard artifact is the dump; smoothing and segments happen at merge.
+
+if analyze_range:
+    if long_form:
+        sink.close()
+        longform.cleanup(lf_files)
+    try:
+        os.unlink(audio_path)
+    except OSError:
+        pass
+    if not dump_ok:
+        sys.exit(1)
+    run_stats.mode = "shard"
+    log(f"Shard done: {track['samples']} samples in {range_start:.1f}s-{range_end:.1f}s → {args.dump_detections}")
     sys.exit(0)
 
-smoothed_x    = float(raw_coords[0]["x"])
-# Initialize smoothed_y from the first frame's faces
-init_faces    = fd_map.get(f"{raw_coords[0]['t']:.2f}", {}).get("faces", [])
-smoothed_y    = float(get_crop_y(init_faces, src_h, crop_h))
-prev_had_face = raw_coords[0]["face"]
-coords        = []
-velocity_hist = []  # recent (raw_x - smoothed_x) deltas to detect oscillation
-
-def is_oscillating(hist):
-    """Detect if recent movement is oscillating (direction changes ≥ 3 times in window).
-    This catches gesturing, laughing, leaning back-and-forth — movements where
-    the camera should hold still instead of chasing."""
-    if len(hist) < 4:
-        return False
-    signs = [1 if v > 0 else -1 if v < 0 else 0 for v in hist]
-    # Filter out zero-deltas (no movement) before counting direction changes
-    non_zero = [s for s in signs if s != 0]
-    if len(non_zero) < 3:
-        return False
-    direction_changes = sum(1 for i in range(1, len(non_zero)) if non_zero[i] != non_zero[i-1])
-    return direction_changes >= 3
-
-# Y-axis dead zones — scaled to video height like X thresholds
-Y_DEAD_ZONE = max(30, int(src_h * 0.015))   # ~1.5% of height
-Y_MOVE_ZONE = max(60, int(src_h * 0.035))    # ~3.5% of height
-Y_SNAP_ZONE = max(180, int(src_h * 0.10))    # ~10% of height
-y_velocity_hist = []
-
-for rc in raw_coords:
-    raw_x = float(rc["x"])
-    delta = raw_x - smoothed_x  # signed delta (direction matters for oscillation)
-    abs_delta = abs(delta)
-
-    # Track velocity history for oscillation detection
-    velocity_hist.append(delta)
-    if len(velocity_hist) > VELOCITY_WINDOW:
-        velocity_hist.pop(0)
-
-    oscillating = is_oscillating(velocity_hist)
-
-    if rc["face"] and not prev_had_face:
-        # Face reappeared - DON'T snap instantly, blend quickly instead
-        # This prevents a jarring jump when face detection flickers
-        ALPHA = 0.35
-        smoothed_x = ALPHA * raw_x + (1 - ALPHA) * smoothed_x
-        velocity_hist.clear()
-    elif abs_delta > SNAP_ZONE:
-        # Big jump (speaker switch) - snap instantly
-        smoothed_x = raw_x
-        velocity_hist.clear()
-    elif oscillating and abs_delta < SNAP_ZONE:
-        # Face is bouncing around (gesturing, laughing) - hold position.
-        # Only apply a very tiny correction toward the average recent position
-        # so the crop doesn't drift if the person genuinely shifted.
-        avg_raw = smoothed_x + sum(velocity_hist) / len(velocity_hist)
-        ALPHA = 0.005
-        smoothed_x = ALPHA * avg_raw + (1 - ALPHA) * smoothed_x
-    elif abs_delta > MOVE_ZONE:
-        # Intentional movement - smooth pan with low alpha for cinematic glide.
-        # Capped at 0.04 (was 0.06) — slower panning eliminates visible pixel stepping.
-        # The 2-pass post-smoothing will further polish any remaining micro-steps.
-        ALPHA = min(0.04, 0.015 + abs_delta / 5000.0)
-        smoothed_x = ALPHA * raw_x + (1 - ALPHA) * smoothed_x
-    elif abs_delta > DEAD_ZONE:
-        # Small drift - very slow correction to avoid visible wobble
-        ALPHA = 0.008
-        smoothed_x = ALPHA * raw_x + (1 - ALPHA) * smoothed_x
-    # else: abs_delta <= DEAD_ZONE - do nothing, hold position
-
-    # Y-axis smoothing - same approach with oscillation detection
-    frame_faces = fd_map.get(f"{rc['t']:.2f}", {}).get("faces", [])
-    raw_y       = float(get_crop_y(frame_faces, src_h, crop_h))
-    delta_y     = raw_y - smoothed_y
-    abs_delta_y = abs(delta_y)
-
-    y_velocity_hist.append(delta_y)
-    if len(y_velocity_hist) > VELOCITY_WINDOW:
-        y_velocity_hist.pop(0)
-
-    y_oscillating = is_oscillating(y_velocity_hist)
-
-    if rc["face"] and not prev_had_face:
-        ALPHA_Y = 0.30
-        smoothed_y = ALPHA_Y * raw_y + (1 - ALPHA_Y) * smoothed_y
-        y_velocity_hist.clear()
-    elif abs_delta_y > Y_SNAP_ZONE:
-        smoothed_y = raw_y
-        y_velocity_hist.clear()
-    elif y_oscillating and abs_delta_y < Y_SNAP_ZONE:
-        avg_raw_y = smoothed_y + sum(y_velocity_hist) / len(y_velocity_hist)
-        ALPHA_Y = 0.005
-        smoothed_y = ALPHA_Y * avg_raw_y + (1 - ALPHA_Y) * smoothed_y
-    elif abs_delta_y > Y_MOVE_ZONE:
-        ALPHA_Y = min(0.035, 0.015 + abs_delta_y / 4000.0)
-        smoothed_y = ALPHA_Y * raw_y + (1 - ALPHA_Y) * smoothed_y
-    elif abs_delta_y > Y_DEAD_ZONE:
-        ALPHA_Y = 0.008
-        smoothed_y = ALPHA_Y * raw_y + (1 - ALPHA_Y) * smoothed_y
-    # else: abs_delta_y <= Y_DEAD_ZONE - hold vertical position
-
-    coords.append({
-        "t":    rc["t"],
-        "x":    int(smoothed_x),
-        "y":    int(smoothed_y),
-        "w":    crop_w,
-        "h":    crop_h,
-        "face": rc["face"],
-        "frame_type": rc.get("frame_type", "face"),
-        "pip":  rc.get("pip"),
-    })
-    prev_had_face = rc["face"]
-
-log(f"Generated {len(coords)} crop keyframes")
-
-# Interpolate to per-frame with smooth easing
-INTERP_SNAP    = SNAP_ZONE  # match SNAP_ZONE - only hard-cut interpolation for true speaker switches
-frame_coords   = []
-frame_interval = 1.0 / fps
-
-def ease_in_out(t):
-    """Smooth ease-in-out (cubic) for natural camera movement"""
-    if t < 0.5:
-        return 4 * t * t * t
-    return 1 - (-2 * t + 2) ** 3 / 2
-
-for i in range(len(coords) - 1):
-    a, b  = coords[i], coords[i + 1]
-    steps = max(1, round((b["t"] - a["t"]) / frame_interval))
-    is_scene_cut = abs(b["x"] - a["x"]) > INTERP_SNAP
-
-    for step in range(steps):
-        if is_scene_cut:
-            interp_x = b["x"] if step > 0 else a["x"]
-            interp_y = b["y"] if step > 0 else a["y"]
-        else:
-            t_linear = step / steps
-            t_smooth = ease_in_out(t_linear)
-            interp_x = a["x"] + t_smooth * (b["x"] - a["x"])
-            interp_y = a["y"] + t_smooth * (b["y"] - a["y"])
-        frame_coords.append({
-            "t":    round(a["t"] + step * frame_interval, 4),
-            "x":    interp_x,  # keep as float for now, round after post-smoothing
-            "y":    interp_y,
-            "w":    crop_w,
-            "h":    crop_h,
-            "face": a["face"],
-            "frame_type": a.get("frame_type", "face"),
-            "pip":  a.get("pip"),
-        })
+# ── Keyframe-aligned segments (--keyframe-snap) ──────────────────────────────
+# Node renders each mixed segment with its own -ss/-t run. Boundaries on
+# source keyframes let those seeks land without decoding up to the cut.
 
-frame_coords.append(coords[-1])
-
-# ── Post-smoothing pass: multi-pass Gaussian-like smoothing to eliminate pixel stepping ──
-# The EMA + interpolation can still leave tiny 1-3px oscillations that are visible
-# as jitter ("pixel stepping"). A wider kernel + multiple passes eliminates these.
-# Pass 1: wide kernel to remove all micro-jitter
-# Pass 2: narrower kernel to smooth out any artifacts from pass 1
-POST_SMOOTH_RADIUS_1 = max(5, int(fps * 0.35))  # ~0.35s window (wider than before for smoother pans)
-POST_SMOOTH_RADIUS_2 = max(3, int(fps * 0.20))  # ~0.20s second pass for extra polish
-
-def post_smooth(values, radius):
-    """Weighted moving average (triangular kernel) with edge clamping.
-    Preserves hard cuts (scene switches). Triangular weighting gives
-    more influence to nearby frames → smoother than simple box average."""
-    n = len(values)
-    if n <= 1:
-        return values
-    result = values[:]
-    for i in range(n):
-        lo = max(0, i - radius)
-        hi = min(n, i + radius + 1)
-        # Check for hard cuts in the window — don't smooth across them
-        window = values[lo:hi]
-        max_jump = max(abs(window[j] - window[j-1]) for j in range(1, len(window))) if len(window) > 1 else 0
-        if max_jump > SNAP_ZONE:
-            # Hard cut in window — don't smooth this frame
-            result[i] = values[i]
-        else:
-            # Triangular (Bartlett) weighting: center frame has highest weight
-            weights = []
-            for j in range(lo, hi):
-                dist = abs(j - i)
-                weights.append(max(1, radius + 1 - dist))
-            total_w = sum(weights)
-            result[i] = sum(w * v for w, v in zip(weights, window)) / total_w
-    return result
-
-x_values = [fc["x"] for fc in frame_coords]
-y_values = [fc["y"] for fc in frame_coords]
-
-# Two-pass smoothing for buttery transitions
-x_smooth = post_smooth(x_values, POST_SMOOTH_RADIUS_1)
-x_smooth = post_smooth(x_smooth, POST_SMOOTH_RADIUS_2)
-y_smooth = post_smooth(y_values, POST_SMOOTH_RADIUS_1)
-y_smooth = post_smooth(y_smooth, POST_SMOOTH_RADIUS_2)
-
-# Deduplicate: collapse consecutive frames with identical x,y into one keyframe.
-# FFmpeg sendcmd doesn't need a command for every frame if the crop isn't moving.
-# This also reduces the commands file size significantly.
-for i, fc in enumerate(frame_coords):
-    fc["x"] = int(round(x_smooth[i]))
-    fc["y"] = int(round(y_smooth[i]))
-    # Clamp to valid range
-    fc["x"] = max(0, min(fc["x"], src_w - crop_w))
-    fc["y"] = max(0, min(fc["y"], src_h - crop_h))
-
-log(f"Interpolated to {len(frame_coords)} per-frame coords ({fps}fps) with 2-pass post-smoothing (r1={POST_SMOOTH_RADIUS_1}, r2={POST_SMOOTH_RADIUS_2})")
-
-# Guard: if no coords were generated, skip
-if not frame_coords:
-    log("WARNING: No frame coordinates generated - skipping reframe")
-    with open(coords_path, "w") as f:
-        json.dump({"mode": "skip"}, f)
-    try: os.unlink(audio_path)
-    except: pass
-    sys.exit(0)
+def snap_segments(payload):
+    """Snap the mixed payloads (every aspect) onto the source's keyframes."""
+    try:
+        keyframes = decode.keyframe_times(local_video)
+    except RuntimeError as e:
+        log(f"WARNING: Keyframe snapping skipped ({e})")
+        return
+    for p in [payload, *payload.get("aspects", {}).values()]:
+        if p.get("mode") != "mixed":
+            continue
+        moved = snap_to_keyframes(p, keyframes, args.keyframe_snap, fps)
+        log(f"Keyframe snap: {moved}/{len(p['segments']) - 1} boundaries moved (tolerance {args.keyframe_snap}s, "
+            f"{len(keyframes)} keyframes)")
+
+pipeline.flush()
 
 # Build segments — wrapped in try/catch so any edge case in segment
-# building doesn't kill the clip. If this fails, we still have frame_coords.
+# building doesn't kill the clip. If this fails, we still have the frame coords.
 try:
-    segments = []
-    if frame_coords:
-        # Classify each frame into segment types: split, face, podcast_dual, group, no_face
-        def get_seg_type(fc):
-            ft = fc.get("frame_type", "face" if fc.get("face") else "no_face")
-            if ft == "split":
-                return "split"
-            elif ft == "podcast_dual":
-                return "podcast_dual"
-            elif ft == "group":
-                return "group"
-            elif fc.get("face"):
-                return "face"
-            else:
-                return "no_face"
-
-        seg_type   = get_seg_type(frame_coords[0])
-        seg_start  = frame_coords[0]["t"]
-        seg_coords = [frame_coords[0]]
-        for fc in frame_coords[1:]:
-            t = get_seg_type(fc)
-            if t != seg_type:
-                segments.append({"type": seg_type, "start": seg_start, "end": fc["t"], "coords": seg_coords})
-                seg_type   = t
-                seg_start  = fc["t"]
-                seg_coords = [fc]
-            else:
-                seg_coords.append(fc)
-        segments.append({"type": seg_type, "start": seg_start, "end": round(duration, 4), "coords": seg_coords})
-
-    # Merge short segments into their neighbors
-    MIN_SEG_DURATION = 1.5
-    merged = []
-    for seg in segments:
-        seg_dur = seg["end"] - seg["start"]
-        if merged and seg_dur < MIN_SEG_DURATION:
-            merged[-1]["end"] = seg["end"]
-            merged[-1]["coords"].extend(seg["coords"])
-        else:
-            merged.append(seg)
-    segments = merged
-    log(f"Segments after merge: {len(segments)} (min_dur={MIN_SEG_DURATION}s)")
-
-    for seg in segments:
-        log(f"  segment: type={seg['type']}, start={seg['start']:.2f}, end={seg['end']:.2f}, frames={len(seg['coords'])}")
-
-    # Determine output mode based on segment types present
-    seg_types = set(s["type"] for s in segments)
-    has_face         = "face" in seg_types
-    has_no_face      = "no_face" in seg_types
-    has_split        = "split" in seg_types
-    has_group        = "group" in seg_types
-    has_podcast_dual = "podcast_dual" in seg_types
-    is_mixed         = len(seg_types) > 1 or has_split or has_podcast_dual
-
-    # Build split info for split segments
-    split_info = build_split_info(global_pip_region)
-
-    # For split segments, also check if any frame had a more specific PiP detection
-    for seg in segments:
-        if seg["type"] == "split":
-            # Find the best PiP region from frames in this segment
-            seg_pip = None
-            for fc in seg["coords"]:
-                if fc.get("pip"):
-                    seg_pip = fc["pip"]
-                    break
-            if seg_pip:
-                seg["split_info"] = build_split_info(seg_pip)
-            else:
-                seg["split_info"] = split_info
-
-    # Build podcast_dual crop info for dual segments
-    # Compute static left/right crops from the faces detected in those frames
-    def build_dual_crop_for_segment(seg):
-        """Compute left_crop and right_crop for a podcast_dual segment
-        using the faces from its frames."""
-        left_cxs, left_cys, right_cxs, right_cys = [], [], [], []
-        for fc in seg["coords"]:
-            faces_at_t = fd_map.get(f"{fc['t']:.2f}", {}).get("faces", [])
-            if len(faces_at_t) >= 2:
-                sf = sorted(faces_at_t, key=lambda f: f["cx"])
-                left_cxs.append(sf[0]["cx"])
-                left_cys.append(sf[0]["cy"])
-                right_cxs.append(sf[1]["cx"])
-                right_cys.append(sf[1]["cy"])
-        if not left_cxs:
-            return None
-        avg_l_cx = int(sum(left_cxs) / len(left_cxs))
-        avg_l_cy = int(sum(left_cys) / len(left_cys))
-        avg_r_cx = int(sum(right_cxs) / len(right_cxs))
-        avg_r_cy = int(sum(right_cys) / len(right_cys))
-
-        panel_aspect = 9.0 / 8.0
-        mid_x = (avg_l_cx + avg_r_cx) // 2
-        max_cw = min(mid_x, src_w - mid_x)
-        fc_h = src_h
-        fc_w = int(fc_h * panel_aspect)
-        if fc_w > max_cw:
-            fc_w = max_cw
-            fc_h = int(fc_w / panel_aspect)
-        fc_w = fc_w - (fc_w % 2)
-        fc_h = fc_h - (fc_h % 2)
-
-        lx = max(0, min(avg_l_cx - fc_w // 2, mid_x - fc_w))
-        rx = max(mid_x, min(avg_r_cx - fc_w // 2, src_w - fc_w))
-        ly = max(0, min(avg_l_cy - int(fc_h * 0.40), src_h - fc_h))
-        ry = max(0, min(avg_r_cy - int(fc_h * 0.40), src_h - fc_h))
-
-        return {
-            "left_crop":  {"x": lx, "y": ly, "w": fc_w, "h": fc_h},
-            "right_crop": {"x": rx, "y": ry, "w": fc_w, "h": fc_h},
-        }
-
-    for seg in segments:
-        if seg["type"] == "podcast_dual":
-            dual_info = build_dual_crop_for_segment(seg)
-            if dual_info:
-                seg["dual_crop"] = dual_info
-            else:
-                # No valid dual faces found in this segment — downgrade to face
-                seg["type"] = "face"
-
-    with open(coords_path, "w") as f:
-        if is_mixed or (has_face and has_no_face):
-            # Mixed mode: multiple segment types — TS side will render each segment
-            # separately and concat them
-            # Strip non-serializable / internal fields from coords
-            clean_segments = []
-            for seg in segments:
-                clean_seg = {
-                    "type": seg["type"],
-                    "start": seg["start"],
-                    "end": seg["end"],
-                }
-                if seg["type"] == "split":
-                    clean_seg["split_info"] = seg.get("split_info", split_info)
-                if seg["type"] == "podcast_dual":
-                    clean_seg["dual_crop"] = seg.get("dual_crop")
-                if seg["type"] in ("face", "no_face"):
-                    clean_seg["coords"] = [{k: v for k, v in c.items() if k not in ("face", "frame_type", "pip")} for c in seg["coords"]]
-                clean_segments.append(clean_seg)
-            json.dump({
-                "mode": "mixed",
-                "segments": clean_segments,
-                "crop_w": crop_w,
-                "crop_h": crop_h,
-                "src_w": src_w,
-                "src_h": src_h,
-                "split_info": split_info,
-            }, f)
-        elif has_face:
-            clean = [{k: v for k, v in c.items() if k not in ("face", "frame_type", "pip")} for c in frame_coords]
-            json.dump({"mode": "crop", "coords": clean}, f)
-        elif has_split:
-            # All split — use static split mode
-            json.dump({"mode": "split", **split_info}, f)
-        else:
-            json.dump({"mode": "skip"}, f)
-
+    payload = pipeline.finish(duration, global_pip_region)
+    if static_layouts[0] is not None:
+        payload = static_layouts[0]   # tracked only for another aspect
+    extra_payloads = []
+    if long_form and len(args.aspects) > 1:
+        log("Long-form: writing the first aspect only - replay the detection dump for the others")
+    elif len(args.aspects) > 1:
+        # Same samples and speaker turns, only the geometry stages again
+        extra_payloads = [layout if layout is not None else
+                          aspects.tracked_payload(aspects.geometry(src_w, src_h, fps, aspect, preset["post_passes"]),
+                                                  frame_data, pipeline.turns if args.active_speaker else diarization_segments,
+                                                  speaker_seed, duration, global_pip_region, args.path_engine)
+                          for aspect, layout in zip(args.aspects[1:], static_layouts[1:])]
+    payload = aspects.attach(payload, args.aspects, extra_payloads)
+    if budget.degraded:
+        payload["degraded"] = budget.degraded
+    if args.keyframe_snap > 0:
+        snap_segments(payload)
+    write_coords(payload)
+    run_stats.mode = payload["mode"]
 except Exception as e:
     log(f"WARNING: Segment building / JSON write failed: {e}")
-    # Last-ditch fallback: try to write raw frame_coords as simple crop mode
+    result_cacheable = False
+    # Last-ditch fallback: try to write raw frame coords as simple crop mode
     try:
-        with open(coords_path, "w") as f:
-            if frame_coords:
-                clean = [{k: v for k, v in c.items() if k not in ("face", "frame_type", "pip")} for c in frame_coords]
-                json.dump({"mode": "crop", "coords": clean}, f)
-            else:
-                json.dump({"mode": "skip", "fallback_reason": f"segment build failed: {e}"}, f)
+        if len(sink):
+            write_coords({"mode": "crop", "coords": all_coords(sink, pipeline.builder.segments)})
+            run_stats.mode = "crop"
+        else:
+            run_stats.fell_back(f"segment build failed: {e}")
+            write_coords({"mode": "skip", "fallback_reason": f"segment build failed: {e}"})
     except Exception as e2:
         write_fallback_and_exit(f"could not write any coords: {e2}")
 
-for path in [audio_path]:
+if long_form:
+    sink.close()
+    longform.cleanup(lf_files)
+
+store_result()
+
+for path in [audio_path, stream_spool]:
     if path is None:
         continue
     try:
@@ -1263,7 +1726,6 @@ for path in [audio_path]:
     except Exception:
         pass
 # NOTE: local_video is NOT deleted here - it's owned by the Node.js worker (cleanup in finally block).
-# Proxy video is kept for potential reuse by other clips from the same source.
+# Proxy video is kept in the artifact store for reuse by other clips from the same source.
 
 log("Done.")
-sys.exit(0)
\ No newline at end of file
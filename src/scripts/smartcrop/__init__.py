@@ -0,0 +1,10 @@
+"""
+Helper modules for the smart crop sidecar (smart_crop.py).
+
+smart_crop.py is run as a script, so this directory is importable as
+`smartcrop` without installation (the script's own directory is on sys.path).
+"""
+
+
+def log(msg):
+    print(f"[SMART CROP PY] {msg}", flush=True)
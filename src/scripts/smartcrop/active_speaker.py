@@ -0,0 +1,204 @@
+"""
+Visual active-speaker estimation from BlazeFace keypoints.
+
+BlazeFace returns 6 keypoints for every face (right eye, left eye, nose tip,
+mouth center, right ear, left ear). When someone talks, the mouth keypoint
+moves relative to the eyes and nose. Measuring that motion per face track over
+a short sliding window tells us who is talking - a speaker signal that costs
+nothing beyond the detections we already run and needs no torch/pyannote.
+
+An optional audio energy envelope gates the result: when the audio is silent,
+nobody is talking no matter how much a mouth moves (chewing, smiling, nodding).
+
+The output uses the same shapes as pyannote diarization in smart_crop.py, so
+get_speaker_at() / get_crop_x() work unchanged:
+  segments    = [{"start": 1.2, "end": 4.8, "speaker": "TRACK_0"}, ...]
+  speaker_pos = {"TRACK_0": 412, "TRACK_1": 1490}   # average face cx
+"""
+
+ACTIVITY_WINDOW_SEC = 1.0    # sliding window for mouth motion, centered on each sample
+MIN_ACTIVITY        = 0.015  # mean |Δ mouth ratio| below this = mouth is not moving
+ACTIVITY_MARGIN     = 1.3    # the winner must move 30%+ more than the runner-up
+MIN_TURN_SEC        = 0.6    # speaker turns shorter than this are keypoint noise
+SILENCE_LEVEL       = 0.12   # audio RMS below 12% of the loud level = silence
+
+
+def mouth_ratio(keypoints):
+    """Mouth-opening proxy from normalized (x, y) keypoints: nose→mouth distance
+    relative to eyes→mouth distance. Scale-invariant, so it doesn't change when
+    the person leans toward or away from the camera. None if unavailable."""
+    if len(keypoints) < 4:
+        return None
+    eye_y   = (keypoints[0][1] + keypoints[1][1]) / 2
+    nose_y  = keypoints[2][1]
+    mouth_y = keypoints[3][1]
+    span = mouth_y - eye_y
+    if span <= 0:
+        return None
+    return (mouth_y - nose_y) / span
+
+
+def assign_tracks(frame_data, src_w):
+    """Give every face a stable track id from its horizontal position.
+    Returns a list parallel to frame_data of {track_id: face}."""
+    last_cx = {}  # track_id → cx where it was last seen
+    frame_tracks = []
+    for fd in frame_data:
+        used = {}
+        # Biggest faces first so a small false positive can't steal a track
+        for face in sorted(fd["faces"], key=lambda f: -f["area"]):
+            max_dist = max(face["w"], src_w * 0.05)
+            best_id, best_dist = None, None
+            for tid, cx in last_cx.items():
+                if tid in used:
+                    continue
+                dist = abs(face["cx"] - cx)
+                if dist <= max_dist and (best_dist is None or dist < best_dist):
+                    best_id, best_dist = tid, dist
+            if best_id is None:
+                best_id = len(last_cx)
+            last_cx[best_id] = face["cx"]
+            used[best_id] = face
+        frame_tracks.append(used)
+    return frame_tracks
+
+
+def track_activity(frame_tracks, times, window_sec=ACTIVITY_WINDOW_SEC):
+    """Mouth motion per track per sample: mean absolute change of the mouth
+    ratio between consecutive samples inside a window centered on the sample.
+    Returns a list parallel to times of {track_id: activity}."""
+    half = window_sec / 2
+    n = len(times)
+    activity = []
+    lo = 0
+    for i, t in enumerate(times):
+        while times[lo] < t - half:
+            lo += 1
+        hi = i
+        while hi + 1 < n and times[hi + 1] <= t + half:
+            hi += 1
+        acts = {}
+        for tid in frame_tracks[i]:
+            deltas = []
+            for j in range(lo, hi):
+                a = frame_tracks[j].get(tid)
+                b = frame_tracks[j + 1].get(tid)
+                if a is None or b is None or a.get("mouth") is None or b.get("mouth") is None:
+                    continue
+                deltas.append(abs(b["mouth"] - a["mouth"]))
+            if deltas:
+                acts[tid] = sum(deltas) / len(deltas)
+        activity.append(acts)
+    return activity
+
+
+def audio_energy_envelope(wav_path, times, window_sec):
+    """RMS energy of a 16-bit PCM WAV around each sample time, normalized so the
+    95th percentile (loud speech) is 1.0. Returns None if the audio is unusable.
+    Only the span covered by times is read, so long-form chunks stay small."""
+    import wave
+    import numpy as np
+
+    if not times:
+        return None
+    with wave.open(wav_path, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            return None
+        rate     = wf.getframerate()
+        channels = wf.getnchannels()
+        half     = max(1, int(window_sec * rate / 2))
+        first    = min(max(0, int(times[0] * rate) - half), wf.getnframes())
+        last     = min(int(times[-1] * rate) + half, wf.getnframes())
+        wf.setpos(first)
+        pcm = np.frombuffer(wf.readframes(max(0, last - first)), dtype=np.int16)
+    if channels > 1:
+        pcm = pcm[: len(pcm) - len(pcm) % channels].reshape(-1, channels).mean(axis=1)
+    pcm = pcm.astype(np.float32)
+    if len(pcm) == 0:
+        return None
+
+    env = []
+    for t in times:
+        i = int(t * rate) - first
+        chunk = pcm[max(0, i - half):max(0, i + half)]
+        env.append(float(np.sqrt(np.mean(chunk * chunk))) if len(chunk) else 0.0)
+    ref = float(np.percentile(env, 95)) if env else 0.0
+    if ref <= 0:
+        return None
+    return [e / ref for e in env]
+
+
+def _label_samples(activity, audio_env):
+    """Pick the talking track per sample (or None). Ambiguous samples keep the
+    previous speaker if that track is still visible - hysteresis against flicker."""
+    labels = []
+    prev = None
+    for i, acts in enumerate(activity):
+        label = None
+        silent = audio_env is not None and audio_env[i] < SILENCE_LEVEL
+        if acts and not silent:
+            ranked = sorted(acts.items(), key=lambda kv: -kv[1])
+            best_id, best = ranked[0]
+            second = ranked[1][1] if len(ranked) > 1 else 0.0
+            if best >= MIN_ACTIVITY:
+                if best >= second * ACTIVITY_MARGIN:
+                    label = best_id
+                elif prev in acts:
+                    label = prev
+        labels.append(label)
+        prev = label
+    return labels
+
+
+def _runs(labels, times):
+    """Collapse per-sample labels into [label, start_idx, end_idx] runs."""
+    runs = []
+    for i, label in enumerate(labels):
+        if runs and runs[-1][0] == label:
+            runs[-1][2] = i
+        else:
+            runs.append([label, i, i])
+    return runs
+
+
+def estimate_active_speakers(frame_data, src_w, sample_interval, audio_env=None,
+                             window_sec=ACTIVITY_WINDOW_SEC, prefix="TRACK_"):
+    """Estimate who is talking at each sample of frame_data.
+    Returns (segments, speaker_pos) in pyannote diarization format.
+    prefix namespaces the speaker ids (track ids restart for every call)."""
+    if not frame_data:
+        return [], {}
+    times        = [fd["t"] for fd in frame_data]
+    frame_tracks = assign_tracks(frame_data, src_w)
+    activity     = track_activity(frame_tracks, times, window_sec)
+    labels       = _label_samples(activity, audio_env)
+
+    # Drop turns too short to be real speech, then bridge short gaps between
+    # turns of the same speaker so a blink of "nobody" doesn't cut a turn.
+    def run_dur(run):
+        return times[run[2]] - times[run[1]] + sample_interval
+
+    runs = _runs(labels, times)
+    for run in runs:
+        if run[0] is not None and run_dur(run) < MIN_TURN_SEC:
+            for i in range(run[1], run[2] + 1):
+                labels[i] = None
+    runs = _runs(labels, times)
+    for k in range(1, len(runs) - 1):
+        if runs[k][0] is None and runs[k - 1][0] is not None \
+                and runs[k - 1][0] == runs[k + 1][0] and run_dur(runs[k]) < MIN_TURN_SEC:
+            for i in range(runs[k][1], runs[k][2] + 1):
+                labels[i] = runs[k - 1][0]
+
+    segments = []
+    for label, start_i, end_i in _runs(labels, times):
+        if label is None:
+            continue
+        end_t = times[end_i + 1] if end_i + 1 < len(times) else times[end_i] + sample_interval
+        segments.append({"start": times[start_i], "end": end_t, "speaker": f"{prefix}{label}"})
+
+    speaker_pos = {}
+    for tid in set(label for label in labels if label is not None):
+        cxs = [ft[tid]["cx"] for ft in frame_tracks if tid in ft]
+        speaker_pos[f"{prefix}{tid}"] = int(sum(cxs) / len(cxs))
+    return segments, speaker_pos
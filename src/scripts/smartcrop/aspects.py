@@ -0,0 +1,96 @@
+"""
+Several output aspect ratios from one analysis pass (--aspects 9:16,1:1,4:5).
+
+Detection, video-type classification, the webcam box, the static-shot
+differences and the speaker turns don't depend on the shape of the crop, so
+they run once. Only the geometry stages repeat per aspect: the static
+layouts, and for tracked clips speaker mapping, the crop path and segment
+building over the recorded samples - the work replay does, milliseconds per
+aspect. A clip is tracked when any aspect needs it (a static layout found
+for one crop shape may not fit another); aspects with a static layout keep
+it.
+
+The first aspect is the primary one: its payload is the coords JSON a
+single-aspect run writes. Every other aspect's payload - the same shape, for
+its own crop size - is nested under "aspects", and each is labelled:
+
+  {"mode": "mixed", "segments": [...], ..., "aspect": "9:16",
+   "aspects": {"1:1": {"mode": "mixed", "segments": [...], ..., "aspect": "1:1"},
+               "4:5": {"mode": "crop", "coords": [...], "aspect": "4:5"}}}
+
+A run with the default 9:16 alone writes neither key. Long-form runs write
+the primary aspect only; replay their --dump-detections for the others.
+"""
+
+from smartcrop import log
+from smartcrop.layout import static_layout
+from smartcrop.path import crop_size, CropGeometry
+from smartcrop.pipeline import CropPipeline
+from smartcrop.segments import MemorySink
+from smartcrop.shots import static_shot_layout
+
+DEFAULT = (9, 16)
+
+
+def parse(text):
+    """"9:16,1:1,4:5" → [(9, 16), (1, 1), (4, 5)]. Raises ValueError."""
+    out = []
+    for item in text.split(","):
+        w, sep, h = item.strip().partition(":")
+        if not sep or not w.isdigit() or not h.isdigit() or int(w) <= 0 or int(h) <= 0:
+            raise ValueError(f"aspect {item.strip()!r} is not W:H")
+        aspect = (int(w), int(h))
+        if aspect in out:
+            raise ValueError(f"aspect {name(aspect)} given twice")
+        out.append(aspect)
+    return out
+
+
+def name(aspect):
+    return f"{aspect[0]}:{aspect[1]}"
+
+
+def geometry(src_w, src_h, fps, aspect, post_passes):
+    """CropGeometry of one aspect (thresholds scale with the source, not the crop)."""
+    geom = CropGeometry(src_w, src_h, fps, *crop_size(src_w, src_h, aspect), aspect=aspect)
+    geom.post_passes = post_passes
+    return geom
+
+
+def static_payload(video_type, sample_faces, n_samples, sample_times, static_shot, webcam_box, geom):
+    """Whole-clip layout for one aspect - the static layouts, then the
+    locked-off static-shot crop when its differences were recorded.
+    Returns (payload, done_message), or (None, None) when the clip needs tracking."""
+    payload, done_msg = static_layout(video_type, sample_faces, n_samples, geom.src_w, geom.src_h, geom.crop_w,
+                                      pip_region=webcam_box, aspect=geom.aspect)
+    if payload is None and static_shot is not None:
+        payload = static_shot_layout(sample_faces, sample_times, static_shot["diffs"], static_shot["cuts"], geom)
+        done_msg = "Done (static crop - locked-off camera)."
+    return payload, done_msg
+
+
+def tracked_payload(geom, samples, turns, speaker_seed, duration, global_pip_region, engine="chain"):
+    """Speaker mapping, crop path and segments over tracked samples for one
+    aspect. Returns the payload (coords held in memory)."""
+    pipeline = CropPipeline(geom, turns, MemorySink(), engine=engine)
+    if speaker_seed:
+        pipeline.set_speakers(turns, speaker_seed)
+    pipeline.run(samples)
+    pipeline.log_speaker_mapping()
+    pipeline.flush()
+    return pipeline.finish(duration, global_pip_region)
+
+
+def attach(payload, aspects, extra_payloads):
+    """Label the primary payload and nest the extra aspects' payloads (in
+    aspects[1:] order, None where an aspect produced nothing) under "aspects"."""
+    if aspects == [DEFAULT]:
+        return payload
+    payload["aspect"]  = name(aspects[0])
+    payload["aspects"] = {}
+    for aspect, extra in zip(aspects[1:], extra_payloads):
+        if extra is None:
+            log(f"WARNING: aspect {name(aspect)} produced no layout - left out")
+            continue
+        payload["aspects"][name(aspect)] = {**extra, "aspect": name(aspect)}
+    return payload
@@ -0,0 +1,188 @@
+"""
+Quality presets and the latency budget (--preset, --deadline).
+
+Interactive re-crops want an answer in seconds; batch clip generation can
+afford the full analysis. A preset fixes the baseline work:
+
+  fast      coarse sampling, low detection resolution, one post-smoothing
+            pass, no diarization
+  balanced  the defaults (same output as before presets existed)
+  quality   dense sampling and never below the default detection resolution
+
+With a deadline, the work actually done is planned from an estimate of what
+is left: after type detection the measured cost per sample prices the
+tracking pass, and sampling interval, detection resolution and diarization
+are given up one step at a time until the estimate fits. Tracking re-checks
+the projection as it goes and keeps degrading (and as a last resort stops
+early, the rest of the clip holding the last position) rather than overrun.
+Every step taken is listed under "degraded" in the coords JSON.
+"""
+
+import time
+
+PRESETS = {
+    "fast": {
+        "interval_short": 0.2,    # tracking interval for clips up to 30s
+        "interval_long":  0.4,    # ... and longer ones
+        "type_interval":  2.0,    # type-detection sampling
+        "detect_max_h":   360,    # fixed / type-detection resolution
+        "detect_min_h":   None,   # bounds for the adaptive resolution
+        "detect_cap_h":   360,
+        "post_passes":    1,
+        "diarize":        False,
+    },
+    "balanced": {
+        "interval_short": 0.1,
+        "interval_long":  0.2,
+        "type_interval":  1.0,
+        "detect_max_h":   480,
+        "detect_min_h":   None,
+        "detect_cap_h":   None,
+        "post_passes":    2,
+        "diarize":        True,
+    },
+    "quality": {
+        "interval_short": 0.1,
+        "interval_long":  0.1,
+        "type_interval":  0.5,
+        "detect_max_h":   480,
+        "detect_min_h":   480,
+        "detect_cap_h":   None,
+        "post_passes":    2,
+        "diarize":        True,
+    },
+}
+
+MAX_INTERVAL      = 0.8    # coarsest tracking interval a deadline may force
+MIN_DETECT_H      = 192
+DECODE_SHARE      = 0.4    # share of a sample's cost that doesn't scale with detection resolution
+DEFAULT_SAMPLE_SEC = 0.03  # per-sample cost when type detection measured nothing
+DIARIZE_LOAD_SEC  = 8.0    # pyannote model load
+DIARIZE_RTF       = 0.15   # CPU diarization time per second of audio
+CHECK_EVERY       = 10     # samples between projections during tracking
+TYPE_SHARE        = 0.25   # share of a deadline type detection may use
+
+
+class Budget:
+    """Deadline bookkeeping. Without a deadline every check passes and nothing
+    is ever degraded."""
+
+    def __init__(self, deadline=None, started=None):
+        self.deadline = deadline
+        self.started  = time.time() if started is None else started
+        self.degraded = []
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def remaining(self):
+        if self.deadline is None:
+            return float("inf")
+        return self.deadline - self.elapsed()
+
+    def over(self, share):
+        """True once more than share of the deadline has been used."""
+        return self.deadline is not None and self.elapsed() > self.deadline * share
+
+    def reserve(self, duration):
+        """Time to keep for everything after tracking (smoothing, segments, JSON)."""
+        return 0.5 + duration * 0.005
+
+    def degrade(self, step):
+        self.degraded.append(step)
+
+
+def sample_cost(base_sec, detect_h, measured_h):
+    """Cost of one tracking sample at detect_h, from one measured at measured_h."""
+    return base_sec * (DECODE_SHARE + (1 - DECODE_SHARE) * (detect_h / measured_h) ** 2)
+
+
+def lower_rung(h, ladder):
+    lower = [r for r in ladder if r < h and r >= MIN_DETECT_H]
+    return lower[-1] if lower else None
+
+
+def next_step(interval, detect_h, coarsen, ladder):
+    """One degradation step, alternating a coarser interval with a lower
+    detection rung (either one once the other is exhausted). Returns
+    (interval, detect_h, step) - step None when there is nothing left."""
+    lower = lower_rung(detect_h, ladder)
+    can_coarsen = interval * 2 <= MAX_INTERVAL + 1e-9
+    if can_coarsen and (coarsen or lower is None):
+        interval = round(interval * 2, 4)
+        return interval, detect_h, f"sample_interval={interval}"
+    if lower is not None:
+        return interval, lower, f"detect_h={lower}"
+    return interval, detect_h, None
+
+
+def plan_diarization(budget, duration):
+    """False when diarization can't finish within the deadline (it runs
+    alongside tracking, so it only has to fit the remaining time)."""
+    if budget.deadline is None:
+        return True
+    if DIARIZE_LOAD_SEC + duration * DIARIZE_RTF > budget.remaining() - budget.reserve(duration):
+        budget.degrade("diarization")
+        return False
+    return True
+
+
+def plan_tracking(budget, duration, interval, detect_h, base_sec, measured_h, ladder):
+    """Degrade the sampling interval and detection resolution until the
+    tracking estimate fits the remaining budget. base_sec is the measured
+    cost of one sample at measured_h. Returns (interval, detect_h)."""
+    if budget.deadline is None:
+        return interval, detect_h
+    available = budget.remaining() - budget.reserve(duration)
+    coarsen = True
+    while duration / interval * sample_cost(base_sec, detect_h, measured_h) > available:
+        interval, detect_h, step = next_step(interval, detect_h, coarsen, ladder)
+        if step is None:
+            break   # nothing left to give up up front - tracking may stop early
+        budget.degrade(step)
+        coarsen = not coarsen
+    return interval, detect_h
+
+
+class TrackingGovernor:
+    """Re-projects the tracking pass every CHECK_EVERY samples and degrades
+    the shared track state ("interval", "detect_h") when the deadline would
+    be missed; check() returns False once the deadline leaves no time at all."""
+
+    def __init__(self, budget, duration, ladder):
+        self.budget   = budget
+        self.duration = duration
+        self.ladder   = ladder
+        self.count    = 0
+        self.spent    = 0.0
+        self.coarsen  = True
+        self.stopped  = False
+
+    def observe(self, sample_sec):
+        self.count += 1
+        self.spent += sample_sec
+
+    def check(self, track):
+        """Called before each sample. Returns False when tracking should stop."""
+        b = self.budget
+        if b.deadline is None or self.stopped:
+            return not self.stopped
+        available = b.remaining() - b.reserve(self.duration)
+        if available <= 0 and track["samples"]:
+            self.stopped = True
+            b.degrade(f"tracking_stopped_at={track['t']:.1f}")
+            return False
+        if not self.count or self.count % CHECK_EVERY:
+            return True
+        left = max(0.0, self.duration - track["t"])
+        if left / track["interval"] * self.spent / self.count <= available:
+            return True
+        track["interval"], track["detect_h"], step = next_step(track["interval"], track["detect_h"],
+                                                               self.coarsen, self.ladder)
+        if step is not None:
+            b.degrade(f"{step}@{track['t']:.1f}")
+            self.coarsen = not self.coarsen
+            # Measure the new settings from scratch
+            self.count = 0
+            self.spent = 0.0
+        return True
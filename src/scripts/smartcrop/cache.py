@@ -0,0 +1,121 @@
+"""
+Persistent on-disk cache of smart_crop.py results.
+
+Re-exports, caption edits and retries regenerate the same clip from the same
+source, and the full analysis (decode + face detection + diarization) is by
+far the slowest part. Results are stored under a key made of:
+
+  - a content fingerprint of the source: file size + md5 of a few sampled
+    blocks (head, tail and evenly spaced in between) - cheap even for GBs,
+    and independent of the temp path Node downloaded the clip to
+  - the analysed range (start/end seconds)
+  - ENGINE_VERSION - bump it whenever a change alters the output
+  - the tuning parameters / options the result depends on
+
+Entries are plain coords JSON files in the artifact store's results/
+directory (smartcrop/store.py): written atomically, evicted LRU under this
+cache's own cap and the store's shared one, hits and misses counted in the
+store's stats.
+
+Environment:
+  SMART_CROP_CACHE_DIR     store root when SMART_CROP_STORE_DIR is unset
+                           (default: {tmp}/smart_crop_cache)
+  SMART_CROP_CACHE_MAX_MB  size cap in MB (default 512, 0 disables the cache)
+
+  python3 -m smartcrop.cache [stats|clear]
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+from smartcrop import store
+
+ENGINE_VERSION     = "1"
+DEFAULT_MAX_MB     = 512
+FINGERPRINT_BLOCKS = 8
+BLOCK_SIZE         = 64 * 1024
+
+
+def default_dir():
+    """Root of the artifact store the caches live in."""
+    return store.default_root()
+
+
+def default_max_bytes():
+    return store.env_bytes("SMART_CROP_CACHE_MAX_MB", DEFAULT_MAX_MB)
+
+
+def fingerprint(path):
+    """Size + md5 over FINGERPRINT_BLOCKS sampled blocks of the file."""
+    size = os.path.getsize(path)
+    h = hashlib.md5(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= BLOCK_SIZE * FINGERPRINT_BLOCKS:
+            h.update(f.read())
+        else:
+            for i in range(FINGERPRINT_BLOCKS):
+                # The last block ends at the end of the file
+                f.seek(i * (size - BLOCK_SIZE) // (FINGERPRINT_BLOCKS - 1))
+                h.update(f.read(BLOCK_SIZE))
+    return f"{size:x}-{h.hexdigest()}"
+
+
+def cache_key(source_fp, start, end, params):
+    blob = json.dumps({
+        "engine": ENGINE_VERSION,
+        "source": source_fp,
+        "range":  [round(start, 3), None if end is None else round(end, 3)],
+        "params": params,
+    }, sort_keys=True)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root=None, max_bytes=None):
+        self.max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+        self.store     = store.ArtifactStore("results", root or default_dir(), max_bytes=self.max_bytes)
+        self.root      = self.store.dir
+
+    def get(self, key):
+        """Cached coords JSON text for key, or None. Counts a hit or miss."""
+        path = self.store.get(f"{key}.json")
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                return f.read()
+        except OSError:
+            return None   # evicted between the lookup and the read
+
+    def put(self, key, result_path):
+        """Store the coords file at result_path (atomic), then evict to the cap."""
+        with self.store.write(f"{key}.json") as tmp:
+            shutil.copyfile(result_path, tmp)
+
+    def entries(self):
+        """[(mtime, size, path)] of cached results, oldest first."""
+        return store.kind_entries(self.store.root, "results")
+
+    def evict(self):
+        self.store.evict()
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        results = store.stats(self.store.root)["kinds"]["results"]
+        return {**results, "max_bytes": self.max_bytes, "dir": self.root}
+
+
+if __name__ == "__main__":
+    cache = ResultCache()
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
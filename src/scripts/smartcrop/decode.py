@@ -0,0 +1,268 @@
+"""
+ffmpeg decoders feeding detection frames straight from a pipe.
+
+Streaming input (--stream)
+
+Node normally finishes downloading or cutting src-*.mp4 before the sidecar
+starts, so transfer and analysis add up. With --stream the source may be a
+file that is still being written, a pipe ("-" for stdin) or an HTTP URL, and
+one ffmpeg process reads it as it arrives:
+
+  - output 0: frames at the tracking interval, scaled to detection height,
+    as raw BGR on a pipe - detection runs on them while bytes still arrive
+  - output 1: the video and audio streams copied into a local Matroska
+    spool, so once the source is complete everything that needs random
+    access (webcam box, static-shot cuts, audio, re-decodes) reads the spool
+
+A growing file is read with -follow 1: ffmpeg waits at the current end of
+file for more data, and the stream ends once nothing has arrived for
+idle_sec (-rw_timeout), as it does for a stalled pipe or connection. The
+container must be streamable - fragmented MP4, MPEG-TS or Matroska, or an
+MP4 with its index up front.
+
+Dimensions and frame rate come from ffmpeg's stream summary on stderr (input
+and output), so no separate probe has to wait for the source.
+
+Keyframe type detection (--keyframe-type)
+
+Type detection only needs a rough picture of the face layout about once a
+second, but a cv2 seek decodes every frame from the previous keyframe up to
+the sample. KeyframeReader decodes intra frames only (-skip_frame nokey),
+scaled to detection height, and takes their timestamps from showinfo - on
+2s-GOP sources a small fraction of the decoding. keyframe_at() decodes the
+one keyframe at or before a time, for a handful of quick looks
+(--progressive, smartcrop/estimate.py). keyframe_times() lists them all
+from packet flags without decoding (--keyframe-snap).
+"""
+
+import json
+import os
+import re
+import subprocess
+import threading
+
+from smartcrop import log
+
+HEADER_TIMEOUT_SEC = 60    # longest wait for ffmpeg to see the first stream header
+DEFAULT_IDLE_SEC   = 10.0  # no new data for this long ends a stream
+
+_SIZE     = re.compile(r", (\d+)x(\d+)[ ,]")
+_FPS      = re.compile(r", ([\d.]+) (?:tbr|fps)")
+_DURATION = re.compile(r"Duration: (\d+):(\d+):([\d.]+)")
+_PTS_TIME = re.compile(r"\bn: *\d+ .*\bpts_time:(-?[\d.]+)")
+
+
+def is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def is_pipe(source):
+    return source in ("-", "pipe:", "pipe:0")
+
+
+def input_args(source, idle_sec):
+    """ffmpeg input options for a growing file, a pipe or a URL."""
+    timeout = ["-rw_timeout", str(int(idle_sec * 1_000_000))]
+    if is_pipe(source):
+        return ["-i", "pipe:0"]
+    if is_url(source):
+        return [*timeout, "-i", source]
+    return ["-follow", "1", *timeout, "-i", f"file:{os.path.abspath(source)}"]
+
+
+def keyframe_at(source, t, out_w, out_h, timeout=HEADER_TIMEOUT_SEC):
+    """BGR keyframe at or before t, scaled to out_w x out_h, or None."""
+    import numpy as np
+    cmd = ["ffmpeg", "-v", "error", "-nostdin", "-skip_frame", "nokey", "-noaccurate_seek", "-ss", f"{t:.3f}",
+           "-i", source, "-frames:v", "1", "-vf", f"scale={out_w}:{out_h}",
+           "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+    try:
+        out = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    size = out_w * out_h * 3
+    if len(out.stdout) < size:
+        return None
+    return np.frombuffer(out.stdout[:size], np.uint8).reshape(out_h, out_w, 3)
+
+
+def keyframe_times(source, timeout=HEADER_TIMEOUT_SEC):
+    """Sorted times of the video keyframes, from the start of the stream.
+    Reads packet flags only - no decoding. Raises RuntimeError."""
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "stream=start_time:packet=pts_time,flags", "-of", "json", source]
+    try:
+        out = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise RuntimeError(f"ffprobe failed: {e}")
+    if out.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {out.stderr.decode(errors='replace').strip()[-200:]}")
+    info    = json.loads(out.stdout or b"{}")
+    streams = info.get("streams") or [{}]
+    start   = streams[0].get("start_time")
+    start   = float(start) if start not in (None, "N/A") else 0.0
+    keys    = sorted({round(float(p["pts_time"]) - start, 4) for p in info.get("packets") or []
+                      if "K" in p.get("flags", "") and p.get("pts_time") not in (None, "N/A")})
+    if not keys:
+        raise RuntimeError("no keyframes listed")
+    return keys
+
+
+class _FrameReader:
+    """ffmpeg writing raw BGR frames to stdout; a thread reads the stream
+    summary (and showinfo timestamps) from stderr."""
+
+    def __init__(self, cmd, stdin=subprocess.DEVNULL):
+        self.stderr = []
+        self.src_w = self.src_h = self.fps = self.duration_hint = None
+        self.out_w = self.out_h = None
+        self.pts_times = []
+        self._header   = threading.Event()
+        self._pts      = threading.Condition()
+        self._done     = False
+        self.proc = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_thread.start()
+
+    def _read_stderr(self):
+        section = None
+        for raw in iter(self.proc.stderr.readline, b""):
+            line = raw.decode(errors="replace").rstrip()
+            pts = _PTS_TIME.search(line) if "showinfo" in line else None
+            if pts:
+                with self._pts:
+                    self.pts_times.append(float(pts.group(1)))
+                    self._pts.notify_all()
+                continue
+            self.stderr.append(line)
+            if len(self.stderr) > 200:
+                del self.stderr[:100]
+            if line.startswith("Input #0"):
+                section = "input"
+            elif line.startswith("Output #0"):
+                section = "output"
+            elif line.startswith("Output #"):
+                section = None
+            duration = _DURATION.search(line)
+            if section == "input" and duration:
+                h, m, s = duration.groups()
+                self.duration_hint = int(h) * 3600 + int(m) * 60 + float(s)
+            if "Video:" not in line or section is None:
+                continue
+            size, fps = _SIZE.search(line), _FPS.findall(line)
+            if section == "input" and size and self.src_w is None:
+                self.src_w, self.src_h = int(size.group(1)), int(size.group(2))
+                self.fps = float(fps[-1]) if fps else None   # tbr (nominal) over fps (measured average)
+            elif section == "output" and size and self.out_w is None:
+                self.out_w, self.out_h = int(size.group(1)), int(size.group(2))
+                self._header.set()
+        self._header.set()   # ffmpeg exited - header() reports what it saw
+        with self._pts:
+            self._done = True
+            self._pts.notify_all()
+
+    def header(self, timeout=HEADER_TIMEOUT_SEC):
+        """(src_w, src_h, fps, duration_hint) - the hint is None when the
+        source doesn't say (growing files, live pipes). Raises RuntimeError
+        when ffmpeg can't read the source."""
+        self._header.wait(timeout)
+        if self.out_w is None or self.src_w is None or not self.fps:
+            self.close()
+            tail = " | ".join(self.stderr[-3:])
+            raise RuntimeError(f"no video stream header from ffmpeg ({tail or 'no output'})")
+        return self.src_w, self.src_h, self.fps, self.duration_hint
+
+    def _read_frame(self):
+        import numpy as np
+        size = self.out_w * self.out_h * 3
+        buf  = self.proc.stdout.read(size)
+        if len(buf) < size:
+            return None
+        return np.frombuffer(buf, np.uint8).reshape(self.out_h, self.out_w, 3)
+
+    def finish(self):
+        """Wait for ffmpeg to close the spool. Returns True when it ended cleanly."""
+        self.proc.stdout.close()
+        code = self.proc.wait()
+        self._stderr_thread.join(timeout=5)
+        if code != 0:
+            log(f"WARNING: Stream decode ended with ffmpeg exit {code}: {' | '.join(self.stderr[-3:])}")
+        return code == 0
+
+    def close(self):
+        """Stop ffmpeg (early exit)."""
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+class StreamReader(_FrameReader):
+    """One ffmpeg process decoding the arriving source into sampled frames
+    and copying it into spool_path (None: frames only, for --live).
+    header() waits for the stream summary; frames() yields (t, frame) until
+    the source ends. realtime reads a local file at its frame rate (-re),
+    standing in for a live feed."""
+
+    def __init__(self, source, spool_path, interval, max_h, idle_sec=DEFAULT_IDLE_SEC, realtime=False):
+        self.interval   = interval
+        self.spool_path = spool_path
+        spool = ["-map", "0:v:0", "-map", "0:a:0?", "-c", "copy", "-f", "matroska", "-y", spool_path] if spool_path else []
+        # stdin is the source itself for a pipe, otherwise ffmpeg must not read it
+        super().__init__(["ffmpeg", "-hide_banner", "-nostats", *([] if is_pipe(source) else ["-nostdin"]),
+                          *(["-re"] if realtime else []), *input_args(source, idle_sec),
+                          "-map", "0:v:0", "-vf", f"fps={1.0 / interval:g},scale=-2:'min({max_h},ih)'",
+                          "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1", *spool],
+                         stdin=None if is_pipe(source) else subprocess.DEVNULL)
+
+    def frames(self):
+        """(t, BGR frame at detection height) per sample until the source ends."""
+        k = 0
+        while True:
+            frame = self._read_frame()
+            if frame is None:
+                return
+            yield round(k * self.interval, 4), frame
+            k += 1
+
+    def close(self):
+        """Stop ffmpeg (early exit) and drop the spool."""
+        super().close()
+        if self.spool_path is None:
+            return
+        try:
+            os.unlink(self.spool_path)
+        except OSError:
+            pass
+
+
+class KeyframeReader(_FrameReader):
+    """The keyframes of a local file in [start, end), scaled to at most
+    max_h. frames() yields (t, frame) - t in the source's timeline, as cv2
+    seeks it."""
+
+    def __init__(self, source, max_h, start=0.0, end=None):
+        self.start = max(0.0, start)
+        seek  = ["-ss", f"{self.start:.3f}"] if self.start > 0 else []
+        until = ["-t", f"{end - self.start:.3f}"] if end is not None else []
+        super().__init__(["ffmpeg", "-hide_banner", "-nostats", "-nostdin", "-skip_frame", "nokey",
+                          *seek, *until, "-i", source, "-map", "0:v:0",
+                          "-vf", f"showinfo,scale=-2:'min({max_h},ih)'", "-fps_mode", "passthrough",
+                          "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"])
+
+    def frames(self):
+        self.header()
+        k = 0
+        try:
+            while True:
+                frame = self._read_frame()
+                if frame is None:
+                    return
+                # showinfo logs a frame before it is written out
+                with self._pts:
+                    self._pts.wait_for(lambda: len(self.pts_times) > k or self._done, timeout=HEADER_TIMEOUT_SEC)
+                if len(self.pts_times) <= k:
+                    raise RuntimeError("keyframe decode lost its timestamps")
+                yield round(self.start + self.pts_times[k], 4), frame
+                k += 1
+        finally:
+            self.close()
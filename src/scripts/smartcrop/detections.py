@@ -0,0 +1,186 @@
+"""
+Per-source store of face detections keyed by absolute source time.
+
+Nudging a clip's start/end in the editor cuts a new src-*.mp4 and reruns
+smart_crop.py on it. When Node passes --source-id (the video) and
+--source-offset (where the clip starts in it), detections are recorded
+against absolute time, and sample times are put on a grid aligned to
+absolute time, so a trimmed or extended clip lands on the same sample
+points. Only the newly uncovered ranges are decoded and detected; smoothing
+and segments are still recomputed over the whole new range.
+
+One JSON file per (source, resolution, detector), kind and BUCKET_SEC of
+absolute source time - "type" holds type-detection samples, "track"
+face-tracking samples:
+  {"<abs t>": entry, ...}, entry = {"h": detection height, "faces": faces}  (+ "roi": true)
+Only the buckets a run looks up are read, and a long-form run drops each
+one once it is past it.
+
+Runs of different presets share the files, so each entry records how it was
+taken: a lookup passes the detection height the run wants and only gets
+entries taken at that height or above, and ROI detections (faces searched
+only around the previous sample's) only when the run uses --roi-detect too.
+Anything else is detected again, and the better entry is kept. Files live
+in the artifact store's detections/ directory (smartcrop/store.py) and are
+evicted oldest-first beyond SMART_CROP_DETECTIONS_MAX_MB (default 256) or
+the store's shared cap.
+"""
+
+import fcntl
+import hashlib
+import json
+import math
+
+from smartcrop.store import ArtifactStore, env_bytes
+
+STORE_VERSION  = 2
+DEFAULT_MAX_MB = 256
+BUCKET_SEC     = 300   # seconds of absolute source time per file
+
+
+def grid_times(start, end, interval, offset):
+    """Relative sample times in [start, end) on the absolute grid k * interval,
+    for a clip that starts at absolute time offset."""
+    k = math.ceil((offset + start) / interval - 1e-6)
+    times = []
+    while True:
+        t = round(k * interval - offset, 4)
+        if t >= end:
+            return times
+        times.append(t)
+        k += 1
+
+
+def next_grid_time(t, interval, offset):
+    """First grid time after relative time t."""
+    k = math.floor((offset + t) / interval + 1e-6) + 1
+    return round(k * interval - offset, 4)
+
+
+class DetectionStore:
+    """Detections of one source, a file per kind and BUCKET_SEC of absolute
+    source time, read when a lookup first needs them. A clip touches one or
+    two buckets; long-form runs release() the ones they are past, so memory
+    stays at a bucket or two whatever the source length."""
+
+    def __init__(self, source_id, src_w, src_h, detector, root=None, max_bytes=None):
+        self.key = hashlib.sha1(json.dumps([STORE_VERSION, source_id, src_w, src_h, detector]).encode()).hexdigest()[:24]
+        if max_bytes is None:
+            max_bytes = env_bytes("SMART_CROP_DETECTIONS_MAX_MB", DEFAULT_MAX_MB)
+        self.store     = ArtifactStore("detections", root, max_bytes=max_bytes)
+        self.max_bytes = max_bytes
+        self.data  = {}   # (kind, bucket) → {"<abs t>": entry}
+        self.added = {}   # (kind, bucket) → this run's new entries
+
+    def _name(self, kind, bucket):
+        return f"{self.key}.{kind}.{bucket}.json"
+
+    def _load(self, kind, bucket):
+        name = self._name(kind, bucket)
+        self.store.touch(name)   # LRU: a bucket in use is never the oldest
+        return self._read(name)
+
+    def _read(self, name):
+        try:
+            with open(self.store.path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _key(abs_t):
+        key = f"{abs_t:.2f}"
+        return key, int(float(key) // BUCKET_SEC)
+
+    def _entries(self, kind, bucket):
+        if (kind, bucket) not in self.data:
+            self.data[(kind, bucket)] = self._load(kind, bucket)
+        return self.data[(kind, bucket)]
+
+    @staticmethod
+    def _rank(entry):
+        return (entry["h"], not entry.get("roi", False))
+
+    def _usable(self, entry, min_h, roi):
+        return entry is not None and entry["h"] >= min_h and (roi or not entry.get("roi", False))
+
+    def get(self, kind, abs_t, min_h, roi=False):
+        """Faces detected at absolute time abs_t by an earlier run at min_h or
+        above (ROI detections only when roi), or None."""
+        key, bucket = self._key(abs_t)
+        entry = self._entries(kind, bucket).get(key)
+        return entry["faces"] if self._usable(entry, min_h, roi) else None
+
+    def put(self, kind, abs_t, faces, h, roi=False):
+        key, bucket = self._key(abs_t)
+        entry = {"h": h, "faces": faces, **({"roi": True} if roi else {})}
+        self._entries(kind, bucket)[key] = entry
+        self.added.setdefault((kind, bucket), {})[key] = entry
+
+    def coverage(self, kind, abs_times, min_h, roi=False):
+        """Fraction of abs_times that already have usable detections. Buckets
+        not loaded yet are read one at a time and not kept."""
+        if not abs_times:
+            return 1.0
+        by_bucket = {}
+        for t in abs_times:
+            key, bucket = self._key(t)
+            by_bucket.setdefault(bucket, []).append(key)
+        covered = 0
+        for bucket, keys in by_bucket.items():
+            entries = self.data.get((kind, bucket))
+            if entries is None:
+                entries = self._load(kind, bucket)
+            covered += sum(1 for key in keys if self._usable(entries.get(key), min_h, roi))
+        return covered / len(abs_times)
+
+    def save(self, buckets=None):
+        """Merge this run's new detections (of buckets, default all) into
+        their files - other workers may have added theirs meanwhile - and
+        evict old files beyond the cap."""
+        for b in list(self.added if buckets is None else buckets):
+            samples = self.added.pop(b, None)
+            if not samples:
+                continue
+            name = self._name(*b)
+            with open(self.store.path(name) + ".lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                data = self._read(name)
+                for key, entry in samples.items():
+                    # Another worker may have stored a better detection meanwhile
+                    old = data.get(key)
+                    if old is None or self._rank(entry) >= self._rank(old):
+                        data[key] = entry
+                with self.store.write(name) as tmp:
+                    with open(tmp, "w") as f:
+                        json.dump(data, f)
+
+    def release(self, kind, before=None):
+        """Save and forget the kind's buckets that end at or before absolute
+        time before (all of them when None)."""
+        done = [b for b in self.data if b[0] == kind and (before is None or (b[1] + 1) * BUCKET_SEC <= before)]
+        self.save(done)
+        for b in done:
+            del self.data[b]
+
+
+class MemoryDetectionStore(DetectionStore):
+    """Detections of the current run only, never written to disk. --stream
+    fills one with the frames it detected while the source arrived, so the
+    type and tracking loops reuse them like detections of an earlier cut."""
+
+    def __init__(self):
+        self.data  = {}
+        self.added = {}
+
+    def _load(self, kind, bucket):
+        return {}
+
+    def _usable(self, entry, min_h, roi):
+        return entry is not None   # this run's own detections, whatever the rung
+
+    def save(self, buckets=None):
+        self.added = {}
+
+    def release(self, kind, before=None):
+        pass
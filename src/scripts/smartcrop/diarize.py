@@ -0,0 +1,150 @@
+"""
+Audio extraction + pyannote speaker diarization in a separate process.
+
+Diarization and face tracking don't depend on each other until speakers are
+mapped to faces, so smart_crop.py starts this process before the tracking
+loop and only joins it at the speaker-mapping stage: wall-clock time becomes
+roughly max(diarize, track) instead of their sum. A separate process (not a
+thread) so torch and mediapipe don't fight over the GIL.
+
+  python3 -m smartcrop.diarize <video> <audio.wav> <result.json> [--no-diarize] [--range START END]
+
+Writes {"audio": bool, "segments": [{"start", "end", "speaker"}], "elapsed": sec, "error"?}.
+--no-diarize only extracts the audio (active-speaker energy gating).
+--range extracts and diarizes only START..END seconds of the video (shards);
+segment times stay in video time.
+HF_TOKEN comes from the environment.
+"""
+
+import atexit
+import json
+import os
+import subprocess
+import sys
+import time
+
+from smartcrop import log
+
+
+def extract_audio(video_path, audio_path, start=None, end=None):
+    seek = [] if start is None else ["-ss", str(start), "-to", str(end)]
+    result = subprocess.run(
+        ["ffmpeg", "-y", *seek, "-i", video_path,
+         "-vn", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", audio_path],
+        capture_output=True
+    )
+    return result.returncode == 0
+
+
+def diarize(audio_path, hf_token):
+    from pyannote.audio import Pipeline
+    pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", token=hf_token)
+    diarization = pipeline(audio_path)
+    return [{"start": turn.start, "end": turn.end, "speaker": speaker}
+            for turn, _, speaker in diarization.itertracks(yield_label=True)]
+
+
+def main(argv):
+    video_path, audio_path, result_path = argv[:3]
+    run_diarization = "--no-diarize" not in argv[3:]
+    start = end = None
+    if "--range" in argv[3:]:
+        i = argv.index("--range")
+        start, end = float(argv[i + 1]), float(argv[i + 2])
+    started = time.time()
+    result = {"audio": extract_audio(video_path, audio_path, start, end), "segments": []}
+    if not result["audio"]:
+        log("WARNING: No audio track found - skipping diarization" if run_diarization
+            else "WARNING: No audio track found - active speaker from mouth motion only")
+    elif run_diarization:
+        try:
+            log("Running speaker diarization...")
+            result["segments"] = diarize(audio_path, os.environ.get("HF_TOKEN"))
+            if start:
+                for seg in result["segments"]:
+                    seg["start"] += start
+                    seg["end"]   += start
+            speakers = set(s["speaker"] for s in result["segments"])
+            log(f"Diarization done: {len(result['segments'])} segments, {len(speakers)} speakers")
+        except Exception as e:
+            result["error"] = str(e)
+            log(f"WARNING: Diarization failed ({e}) - face-only tracking. "
+                f"To fix: pip install pyannote.audio && accept model terms at "
+                f"https://huggingface.co/pyannote/speaker-diarization-3.1")
+    result["elapsed"] = round(time.time() - started, 3)
+    tmp = result_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp, result_path)
+    return 0
+
+
+class DiarizationJob:
+    """Runs this module in a child process; join() returns (has_audio, segments).
+    failed is set when the process or pyannote failed (not for a source
+    without audio) - the face-only result must not be cached."""
+
+    def __init__(self, video_path, audio_path, result_path, diarize=True, time_range=None):
+        self.result_path = result_path
+        self.started     = time.time()
+        self.elapsed     = None
+        self.timed_out   = False
+        self.failed      = False
+        try:
+            os.unlink(result_path)
+        except OSError:
+            pass
+        cmd = [sys.executable, "-m", "smartcrop.diarize",
+               os.path.abspath(video_path), os.path.abspath(audio_path), os.path.abspath(result_path)]
+        if not diarize:
+            cmd.append("--no-diarize")
+        if time_range is not None:
+            cmd += ["--range", str(time_range[0]), str(time_range[1])]
+        # Run from the scripts directory so the smartcrop package resolves;
+        # stdout/stderr are inherited, so its log lines reach the Node worker.
+        self.proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        # A fallback exit must not leave the child running (or writing the wav)
+        atexit.register(self.cancel)
+
+    def done(self):
+        return self.proc.poll() is not None
+
+    def join(self, timeout=None):
+        """(has_audio, segments). With a timeout, a process still running then
+        is killed and treated as having no audio (timed_out is set)."""
+        waited = time.time()
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.cancel()
+            self.timed_out = True
+            log(f"WARNING: Audio/diarization still running after {time.time() - self.started:.1f}s - "
+                f"cancelled to meet the deadline")
+            return False, []
+        waited = time.time() - waited
+        self.elapsed = time.time() - self.started
+        try:
+            with open(self.result_path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            log(f"WARNING: Diarization process failed (exit {self.proc.returncode}) - face-only tracking")
+            self.failed = True
+            return False, []
+        finally:
+            try:
+                os.unlink(self.result_path)
+            except OSError:
+                pass
+        self.elapsed = result.get("elapsed", self.elapsed)
+        self.failed  = "error" in result
+        log(f"Audio/diarization joined (ran {self.elapsed:.1f}s, waited {waited:.1f}s for it)")
+        return result["audio"], result["segments"]
+
+    def cancel(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,351 @@
+"""
+Analysis cost estimate for queue scheduling and autoscaling.
+
+A 20s screen recording reaches its static split in milliseconds; a 3-minute
+diarized 4K podcast takes minutes. Before queueing a clip the worker can ask
+for a prediction:
+
+  python3 -m smartcrop.estimate SOURCE [--preset NAME] [--active-speaker] [--table PATH]
+
+prints one JSON object, typically in 0.1-0.5s:
+
+  {"duration": 184.2, "width": 3840, "height": 2160, "fps": 29.97, "gop_sec": 2.0,
+   "diarization": true, "long_form": false, "type_guess": "podcast",
+   "wall_sec": 96.4, "peak_rss_mb": 1460.0, "basis": "podcast/diarized (38 runs)",
+   "estimate_sec": 0.31}
+
+The inputs are cheap:
+
+  - ffprobe: container duration, size and frame rate of the first video
+    stream, and the keyframe spacing (GOP) from packet flags over the first
+    GOP_WINDOW_SEC - no decoding
+  - whether diarization would run: HF_TOKEN set, the preset diarizes and
+    --active-speaker is off (as smart_crop.py decides)
+  - a type guess from TYPE_FRAMES keyframes at 25/50/75%, decoded with
+    -skip_frame nokey and scanned with OpenCV's bundled Haar face cascade,
+    then classified like the real type detection. Skipped (type_guess null)
+    when cv2 is missing or has no Haar cascades (OpenCV 5 moved them to
+    contrib) - the estimate then uses the video-type-agnostic buckets.
+
+wall_sec and peak_rss_mb come from a calibration table. Per bucket (video
+type x diarized) it holds least-squares coefficients over
+
+  wall_sec    = c0 + c1 * duration + c2 * duration * megapixels + c3 * duration * gop_sec
+  peak_rss_mb = m0 + m1 * megapixels  (+ the bucket's p95 residual as headroom)
+
+A bucket with fewer than MIN_RUNS runs borrows its video type's pooled fit,
+then the all-runs fit, then DEFAULT_TABLE (rough numbers for a 4-vCPU
+worker). Build the table on the worker instance type:
+
+  python3 -m smartcrop.estimate calibrate SOURCE... [--preset NAME] [--out PATH]
+
+runs smart_crop.py on each source (no cache), takes wall time, peak RSS,
+video type and whether it diarized from the run's metrics line
+(smartcrop/metrics.py) and fits the buckets. The table lives at
+SMART_CROP_ESTIMATE_TABLE (default {cache dir}/estimate_table.json).
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from smartcrop import log
+from smartcrop import decode
+from smartcrop import longform
+from smartcrop.budget import PRESETS
+from smartcrop.cache import default_dir
+
+TABLE_VERSION  = 1
+GOP_WINDOW_SEC = 10      # packets read to measure keyframe spacing
+TYPE_FRAMES    = (0.25, 0.50, 0.75)
+TYPE_FRAME_H   = 360     # keyframes are scaled to this height for the face scan
+PROBE_TIMEOUT  = 10
+MIN_RUNS       = 5       # runs a bucket needs before its own fit is used
+
+# wall_sec / peak_rss_mb coefficients when no calibration exists
+DEFAULT_TABLE = {
+    "version": TABLE_VERSION,
+    "buckets": {
+        "*": {"runs": 0, "wall": [2.0, 0.25, 0.05, 0.02], "rss": [450.0, 60.0], "rss_headroom": 150.0},
+        "*/diarized": {"runs": 0, "wall": [10.0, 0.4, 0.05, 0.02], "rss": [1300.0, 60.0], "rss_headroom": 300.0},
+        "screen_pip": {"runs": 0, "wall": [1.5, 0.03, 0.01, 0.01], "rss": [400.0, 60.0], "rss_headroom": 100.0},
+        "no_face": {"runs": 0, "wall": [1.5, 0.03, 0.01, 0.01], "rss": [400.0, 60.0], "rss_headroom": 100.0},
+    },
+}
+
+
+def default_table_path():
+    return os.environ.get("SMART_CROP_ESTIMATE_TABLE") or os.path.join(default_dir(), "estimate_table.json")
+
+
+def diarization_enabled(preset, active_speaker):
+    return bool(os.environ.get("HF_TOKEN")) and not active_speaker and PRESETS[preset]["diarize"]
+
+
+# ── Probe ─────────────────────────────────────────────────────────────────────
+
+def parse_rate(text):
+    """ffprobe "30000/1001" → 29.97 (0.0 when unknown)."""
+    num, _, den = (text or "0").partition("/")
+    try:
+        return float(num) / float(den or 1) if float(den or 1) else 0.0
+    except ValueError:
+        return 0.0
+
+
+def gop_seconds(packets, fps):
+    """Median spacing of keyframe packets, or the window length as a lower
+    bound when it holds a single keyframe. None without packet times."""
+    keys = sorted(float(p["pts_time"]) for p in packets
+                  if "K" in p.get("flags", "") and p.get("pts_time") not in (None, "N/A"))
+    if len(keys) >= 2:
+        gaps = sorted(b - a for a, b in zip(keys, keys[1:]))
+        return round(gaps[len(gaps) // 2], 3)
+    times = [float(p["pts_time"]) for p in packets if p.get("pts_time") not in (None, "N/A")]
+    if not times:
+        return None
+    return round(max(times) - min(times) + (1 / fps if fps else 0), 3)
+
+
+def probe(source):
+    """{duration, width, height, fps, gop_sec} from ffprobe. Raises RuntimeError."""
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "format=duration:stream=width,height,avg_frame_rate,r_frame_rate:packet=pts_time,flags",
+           "-read_intervals", f"%+{GOP_WINDOW_SEC}", "-of", "json", source]
+    try:
+        out = subprocess.run(cmd, capture_output=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise RuntimeError(f"ffprobe failed: {e}")
+    if out.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {out.stderr.decode(errors='replace').strip()[-200:]}")
+    info    = json.loads(out.stdout or b"{}")
+    streams = info.get("streams") or []
+    if not streams:
+        raise RuntimeError("no video stream")
+    stream = streams[0]
+    fps    = parse_rate(stream.get("avg_frame_rate")) or parse_rate(stream.get("r_frame_rate"))
+    return {
+        "duration": round(float(info.get("format", {}).get("duration") or 0.0), 3),
+        "width":    int(stream.get("width") or 0),
+        "height":   int(stream.get("height") or 0),
+        "fps":      round(fps, 3),
+        "gop_sec":  gop_seconds(info.get("packets") or [], fps),
+    }
+
+
+# ── Type guess ────────────────────────────────────────────────────────────────
+
+def guess_type(source, info):
+    """Video type from TYPE_FRAMES keyframes, or None when cv2 (with the
+    Haar cascades) is missing or no keyframe decodes."""
+    try:
+        import cv2
+    except ImportError:
+        return None
+    if not hasattr(cv2, "CascadeClassifier"):
+        return None
+    from smartcrop.layout import classify_video
+    src_w, src_h = info["width"], info["height"]
+    out_h = min(TYPE_FRAME_H, src_h) // 2 * 2
+    out_w = max(2, int(round(src_w * out_h / src_h / 2)) * 2)
+    scale = src_w / out_w
+    with concurrent.futures.ThreadPoolExecutor(len(TYPE_FRAMES)) as pool:
+        frames = list(pool.map(lambda f: decode.keyframe_at(source, info["duration"] * f, out_w, out_h, PROBE_TIMEOUT),
+                                TYPE_FRAMES))
+    cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+    sample_faces = []
+    for frame in frames:
+        if frame is None:
+            continue
+        boxes = cascade.detectMultiScale(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 1.1, 5, minSize=(16, 16))
+        faces = []
+        for x, y, w, h in (boxes if len(boxes) else []):
+            x, y, w, h = (int(v * scale) for v in (x, y, w, h))
+            faces.append({"x": x, "y": y, "w": w, "h": h, "cx": x + w // 2, "cy": y + h // 2, "area": w * h})
+        sample_faces.append(faces)
+    if not sample_faces:
+        return None
+    # classify_video logs every face - keep stdout for the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        return classify_video(sample_faces, len(TYPE_FRAMES), src_w, src_h)
+
+
+# ── Model ─────────────────────────────────────────────────────────────────────
+
+def features(info):
+    """Regressors of the wall-time model: [1, duration, duration * Mpx, duration * GOP]."""
+    mpx = info["width"] * info["height"] / 1e6
+    return [1.0, info["duration"], info["duration"] * mpx, info["duration"] * (info["gop_sec"] or 0.0)]
+
+
+def bucket_key(video_type, diarized):
+    return f"{video_type}/diarized" if diarized else video_type
+
+
+def pick_bucket(table, video_type, diarized):
+    """(key, bucket): the most specific bucket with a fit, falling back to
+    the video type's pooled fit, then all runs, then DEFAULT_TABLE."""
+    buckets  = table.get("buckets", {})
+    wildcard = bucket_key("*", diarized)
+    for key in (bucket_key(video_type, diarized), video_type, wildcard, "*"):
+        if key in buckets:
+            return key, buckets[key]
+    for key in (bucket_key(video_type, diarized), video_type, wildcard, "*"):
+        if key in DEFAULT_TABLE["buckets"]:
+            return key, DEFAULT_TABLE["buckets"][key]
+    return "*", DEFAULT_TABLE["buckets"]["*"]
+
+
+def predict(table, info, video_type, diarized):
+    key, bucket = pick_bucket(table, video_type or "*", diarized)
+    wall = sum(c * x for c, x in zip(bucket["wall"], features(info)))
+    mpx  = info["width"] * info["height"] / 1e6
+    rss  = bucket["rss"][0] + bucket["rss"][1] * mpx + bucket.get("rss_headroom", 0.0)
+    return round(max(wall, 0.1), 1), round(rss, 1), f"{key} ({bucket.get('runs', 0)} runs)"
+
+
+def load_table(path):
+    try:
+        with open(path) as f:
+            table = json.load(f)
+    except (OSError, ValueError):
+        return DEFAULT_TABLE
+    return table if table.get("version") == TABLE_VERSION else DEFAULT_TABLE
+
+
+def estimate(source, preset="balanced", active_speaker=False, table=None):
+    started = time.time()
+    info = probe(source)
+    if info["duration"] <= 0 or info["width"] <= 0 or info["height"] <= 0:
+        raise RuntimeError(f"unusable probe result {info}")
+    diarized   = diarization_enabled(preset, active_speaker)
+    video_type = guess_type(source, info)
+    wall, rss, basis = predict(table or DEFAULT_TABLE, info, video_type, diarized)
+    return {**info, "diarization": diarized, "long_form": info["duration"] > longform.AUTO_SEC,
+            "type_guess": video_type, "wall_sec": wall, "peak_rss_mb": rss, "basis": basis,
+            "estimate_sec": round(time.time() - started, 3)}
+
+
+# ── Calibration ───────────────────────────────────────────────────────────────
+
+def fit_nonnegative(rows, targets):
+    """Least squares with the coefficients clamped at zero (a negative cost
+    per second of video only fits noise): regressors that come out negative
+    are dropped and the rest refitted."""
+    import numpy as np
+    x, y   = np.asarray(rows, float), np.asarray(targets, float)
+    active = list(range(x.shape[1]))
+    coef   = np.zeros(x.shape[1])
+    while active:
+        sol, *_ = np.linalg.lstsq(x[:, active], y, rcond=None)
+        if (sol >= 0).all():
+            coef[active] = sol
+            break
+        active = [i for i, c in zip(active, sol) if c >= 0]
+    return coef
+
+
+def fit_bucket(runs):
+    import numpy as np
+    wall  = fit_nonnegative([features(r) for r in runs], [r["wall_sec"] for r in runs])
+    mpx   = [[1.0, r["width"] * r["height"] / 1e6] for r in runs]
+    rss   = fit_nonnegative(mpx, [r["peak_rss_mb"] for r in runs])
+    resid = sorted(r["peak_rss_mb"] - (rss[0] + rss[1] * m[1]) for r, m in zip(runs, mpx))
+    return {"runs": len(runs), "wall": [round(float(c), 5) for c in wall],
+            "rss": [round(float(c), 2) for c in rss],
+            "rss_headroom": round(max(0.0, float(np.percentile(resid, 95))), 1)}
+
+
+def fit_table(runs):
+    """Calibration table from measured runs ({probe fields, video_type,
+    diarized, wall_sec, peak_rss_mb}). Buckets below MIN_RUNS are left out."""
+    groups = {}
+    for r in runs:
+        for key in {"*", bucket_key("*", r["diarized"]), r["video_type"], bucket_key(r["video_type"], r["diarized"])}:
+            groups.setdefault(key, []).append(r)
+    return {"version": TABLE_VERSION, "created": round(time.time(), 3),
+            "buckets": {key: fit_bucket(g) for key, g in sorted(groups.items()) if len(g) >= MIN_RUNS}}
+
+
+def measure(source, preset, work_dir):
+    """Run smart_crop.py on source; its probe plus the metrics line, or None."""
+    info = probe(source)
+    metrics_file = os.path.join(work_dir, "metrics.jsonl")
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "smart_crop.py")
+    env = {**os.environ, "SMART_CROP_METRICS_FILE": metrics_file, "SMART_CROP_METRICS": "1"}
+    with contextlib.suppress(OSError):
+        os.unlink(metrics_file)
+    proc = subprocess.run([sys.executable, script, source, "calibrate", work_dir, "--no-cache", "--preset", preset],
+                          env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with open(metrics_file) as f:
+            record = json.loads(f.readlines()[-1])
+    except (OSError, ValueError, IndexError):
+        log(f"WARNING: {source}: no metrics (exit {proc.returncode}) - skipped")
+        return None
+    if record.get("fell_back") or not record.get("video_type"):
+        log(f"WARNING: {source}: fell back ({record.get('fallback_reason')}) - skipped")
+        return None
+    return {**info, "video_type": record["video_type"], "diarized": record.get("diarization_sec") is not None,
+            "wall_sec": record["wall_sec"], "peak_rss_mb": record["peak_rss_mb"]}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["calibrate"]:
+        parser = argparse.ArgumentParser(prog="python3 -m smartcrop.estimate calibrate",
+                                         description="Fit the estimate table from smart_crop.py runs.")
+        parser.add_argument("sources", nargs="+")
+        parser.add_argument("--preset", choices=sorted(PRESETS), default="balanced")
+        parser.add_argument("--out", default=default_table_path())
+        args = parser.parse_args(argv[1:])
+        runs = []
+        with tempfile.TemporaryDirectory(prefix="smart_crop_calibrate_") as work_dir:
+            for source in args.sources:
+                try:
+                    run = measure(source, args.preset, work_dir)
+                except RuntimeError as e:
+                    log(f"WARNING: {source}: {e} - skipped")
+                    continue
+                if run is not None:
+                    log(f"{source}: {run['video_type']}, {run['duration']:.0f}s {run['width']}x{run['height']} "
+                        f"→ {run['wall_sec']:.1f}s, {run['peak_rss_mb']:.0f}MB")
+                    runs.append(run)
+        if not runs:
+            log("ERROR: no successful runs to calibrate from")
+            return 1
+        table = fit_table(runs)
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        tmp = args.out + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(table, f, indent=2)
+        os.replace(tmp, args.out)
+        log(f"Calibrated {len(table['buckets'])} buckets from {len(runs)} runs → {args.out}")
+        return 0
+
+    parser = argparse.ArgumentParser(prog="python3 -m smartcrop.estimate",
+                                     description="Predict smart_crop.py wall time and peak memory for a source.")
+    parser.add_argument("source")
+    parser.add_argument("--preset", choices=sorted(PRESETS),
+                        default=os.environ.get("SMART_CROP_PRESET") or "balanced")
+    parser.add_argument("--active-speaker", action="store_true",
+                        default=os.environ.get("SMART_CROP_ACTIVE_SPEAKER") == "1")
+    parser.add_argument("--table", default=default_table_path())
+    args = parser.parse_args(argv)
+    try:
+        result = estimate(args.source, args.preset, args.active_speaker, load_table(args.table))
+    except RuntimeError as e:
+        print(json.dumps({"error": str(e)}))
+        return 1
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+Shared memory-mapped cache of decoded frames, per source.
+
+Clips cut from the same long video are often processed at the same time on
+one worker, and each job would decode the same source regions on its own.
+With --frame-cache (and --source-id, which puts samples on the absolute-time
+grid), the first job to decode a sample time stores the frame - already
+downscaled to detection resolution, BGR as the detector takes it - and the
+other jobs read it zero-copy through np.memmap instead of decoding.
+
+Per (source, decode height, detection height), under {cache dir}/frames/:
+  {key}.dat   frame slots, np.memmap of shape (slots, h, w, 3) uint8
+  {key}.meta  {"shape": [h, w, 3]} - written by the first writer
+  {key}.idx   append-only "abs_t slot" lines
+  {key}.lock  flock held by writers - never removed, so every writer of a
+              key always locks the same file
+A frame is written to its slot before its index line is appended, so a
+reader never sees a slot that isn't filled. Writers hold the flock while
+allocating. Slots are never reused within a file: eviction removes whole
+caches (.dat, .meta, .idx), oldest mtime first, beyond
+SMART_CROP_FRAME_CACHE_MAX_MB (default 2048), and skips a cache whose lock
+another writer holds. Frames already read from an evicted cache stay valid
+(the mapping outlives the unlink); before its next miss or write a job
+notices the .dat or .idx is gone or replaced (inode changed), drops its
+mapping and index and starts over on the new files, so it never writes
+into the old mapping or indexes a slot of the new file it didn't fill. A
+miss (range not cached yet, file evicted or full) just means the caller
+decodes.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from smartcrop.cache import default_dir
+
+FRAMES_VERSION = 1
+DEFAULT_MAX_MB = 2048
+GROW_SLOTS     = 64   # the data file grows this many frames at a time
+
+
+def default_max_bytes():
+    try:
+        max_mb = float(os.environ.get("SMART_CROP_FRAME_CACHE_MAX_MB", DEFAULT_MAX_MB))
+    except ValueError:
+        max_mb = DEFAULT_MAX_MB
+    return int(max_mb * 1024 * 1024)
+
+
+class FrameCache:
+    def __init__(self, source_id, src_w, src_h, decode_h, detect_h, root=None, max_bytes=None):
+        key = hashlib.sha1(json.dumps([FRAMES_VERSION, source_id, src_w, src_h, decode_h, detect_h]).encode()).hexdigest()[:24]
+        self.root = os.path.join(root or default_dir(), "frames")
+        os.makedirs(self.root, exist_ok=True)
+        base = os.path.join(self.root, key)
+        self.data_path  = base + ".dat"
+        self.meta_path  = base + ".meta"
+        self.index_path = base + ".idx"
+        self.lock_path  = base + ".lock"
+        self.max_bytes  = default_max_bytes() if max_bytes is None else max_bytes
+        self.shape      = None
+        self.slots      = {}     # "abs t" → slot
+        self.index_pos  = 0      # bytes of the index already read
+        self.mm         = None
+        self.data_ino   = None   # inodes of the .dat / .idx the state above came from
+        self.index_ino  = None
+        self.full       = False
+        self.hits = self.puts = 0
+        for path in (self.data_path, self.index_path):
+            try:
+                os.utime(path)   # LRU: a cache in use is never the oldest
+            except OSError:
+                pass
+
+    @staticmethod
+    def _key(abs_t):
+        return f"{abs_t:.2f}"
+
+    def _load_meta(self):
+        if self.shape is None:
+            try:
+                with open(self.meta_path) as f:
+                    self.shape = tuple(json.load(f)["shape"])
+            except (OSError, ValueError, KeyError):
+                return False
+        return True
+
+    def _reset(self):
+        self.shape     = None
+        self.slots     = {}
+        self.index_pos = 0
+        self.mm        = None
+        self.data_ino  = self.index_ino = None
+        self.full      = False
+
+    def _sync(self):
+        """Start over when the files read so far were evicted or replaced."""
+        for path, ino in ((self.data_path, self.data_ino), (self.index_path, self.index_ino)):
+            if ino is None:
+                continue
+            try:
+                current = os.stat(path).st_ino
+            except OSError:
+                current = None
+            if current != ino:
+                self._reset()
+                return
+
+    def _read_index(self):
+        """Pick up index lines appended since the last read (complete lines only)."""
+        try:
+            with open(self.index_path, "rb") as f:
+                ino = os.fstat(f.fileno()).st_ino
+                if self.index_ino is not None and ino != self.index_ino:
+                    self._reset()
+                self.index_ino = ino
+                f.seek(self.index_pos)
+                data = f.read()
+        except OSError:
+            return
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode().splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1].isdigit():
+                self.slots[parts[0]] = int(parts[1])
+        self.index_pos += end
+
+    def _frames(self, n_slots):
+        """Memory map covering at least n_slots frames (remapped as the file grows)."""
+        if self.mm is None or len(self.mm) < n_slots:
+            frame_bytes = int(np.prod(self.shape))
+            st = os.stat(self.data_path)
+            if self.data_ino is not None and st.st_ino != self.data_ino:
+                return None
+            size = st.st_size // frame_bytes
+            if size < n_slots:
+                return None
+            self.mm = np.memmap(self.data_path, dtype=np.uint8, mode="r+", shape=(size,) + self.shape)
+            self.data_ino = st.st_ino
+        return self.mm
+
+    def get(self, abs_t):
+        """Frame at absolute time abs_t as a read-only view into the map, or None."""
+        key = self._key(abs_t)
+        if key not in self.slots:
+            self._sync()
+            self._read_index()
+            if key not in self.slots or not self._load_meta():
+                return None
+        slot = self.slots[key]
+        try:
+            frames = self._frames(slot + 1)
+        except (OSError, ValueError):
+            return None
+        if frames is None:
+            return None
+        frame = frames[slot]
+        frame.flags.writeable = False
+        self.hits += 1
+        return frame
+
+    def put(self, abs_t, frame):
+        """Store a frame (all frames of one cache share a shape). Best effort:
+        does nothing once the file has reached the size cap."""
+        if self.full:
+            return
+        frame_bytes = frame.size
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._sync()
+            if not self._load_meta():
+                self.shape = tuple(frame.shape)
+                tmp = self.meta_path + ".tmp"
+                with open(tmp, "w") as f:
+                    json.dump({"shape": list(self.shape)}, f)
+                os.replace(tmp, self.meta_path)
+            if tuple(frame.shape) != self.shape:
+                return
+            self._read_index()
+            key = self._key(abs_t)
+            if key in self.slots:
+                return
+            slot = len(self.slots)
+            if (slot + 1) * frame_bytes > self.max_bytes:
+                self.full = True
+                return
+            with open(self.data_path, "ab") as f:
+                if f.tell() < (slot + 1) * frame_bytes:
+                    f.truncate(min(slot + GROW_SLOTS, self.max_bytes // frame_bytes) * frame_bytes)
+            frames = self._frames(slot + 1)
+            if frames is None:
+                return
+            frames[slot] = frame
+            with open(self.index_path, "a") as f:
+                f.write(f"{key} {slot}\n")
+            self._read_index()
+        self.puts += 1
+        if slot % GROW_SLOTS == 0:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".dat"):
+                path = os.path.join(self.root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == self.data_path:
+                continue
+            base = path[:-len(".dat")]
+            try:
+                with open(base + ".lock", "a") as lock:
+                    # A writer in the middle of a put keeps its cache
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    for stale in (path, base + ".meta", base + ".idx"):
+                        try:
+                            os.unlink(stale)
+                        except OSError:
+                            pass
+            except OSError:
+                continue
+            total -= size
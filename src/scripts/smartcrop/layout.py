@@ -0,0 +1,323 @@
+"""
+Layout helpers shared by the static fast paths and per-frame tracking:
+video/frame classification, face identity matching, PiP webcam region,
+split-screen info and the stacked two-speaker (podcast_dual) crops.
+"""
+
+import math
+
+from smartcrop import log
+
+
+def classify_frame(faces, src_w, src_h):
+    """Classify a single frame based on its detected faces.
+    Returns: 'split' | 'face' | 'podcast_dual' | 'group' | 'no_face'"""
+    if not faces:
+        return "no_face"
+    if len(faces) >= 4:
+        return "group"
+    # Check for PiP pattern: small face in corner/side
+    for face in faces:
+        w_ratio = face["w"] / src_w if src_w > 0 else 0
+        is_small = w_ratio < 0.10
+        in_corner = (face["cx"] < src_w * 0.30 or face["cx"] > src_w * 0.70) and \
+                    (face["cy"] < src_h * 0.30 or face["cy"] > src_h * 0.70)
+        on_side = face["cx"] < src_w * 0.25 or face["cx"] > src_w * 0.75
+        if is_small and (in_corner or on_side):
+            return "split"
+    # Check for 2 spread-apart faces (podcast dual layout)
+    if len(faces) == 2:
+        both_big = all(f["w"] / src_w >= 0.08 for f in faces)
+        if both_big:
+            sorted_f = sorted(faces, key=lambda f: f["cx"])
+            gap_ratio = (sorted_f[1]["cx"] - sorted_f[0]["cx"]) / src_w if src_w > 0 else 0
+            if gap_ratio >= 0.25:
+                return "podcast_dual"
+    return "face"
+
+
+def match_faces_across_frames(prev_faces, curr_faces):
+    """Order curr_faces like prev_faces (nearest face first, unmatched ones
+    last) so face identities stay stable across samples."""
+    if not prev_faces or not curr_faces:
+        return curr_faces
+    matched = []
+    used = set()
+    for pf in prev_faces:
+        candidates = [(i, cf) for i, cf in enumerate(curr_faces) if i not in used]
+        if not candidates:
+            break
+        best_i, best_face = min(
+            candidates,
+            key=lambda ic: abs(ic[1]["cx"] - pf["cx"]) + abs(ic[1]["cy"] - pf["cy"])
+        )
+        used.add(best_i)
+        matched.append(best_face)
+    for i, cf in enumerate(curr_faces):
+        if i not in used:
+            matched.append(cf)
+    return matched
+
+
+def detect_pip_region(faces_list, src_w, src_h):
+    """Find the PiP webcam region from a list of face-lists (sampled frames).
+    Returns the pip_region dict or None if no PiP face found."""
+    pip_region = None
+    for faces in faces_list:
+        for face in faces:
+            face_w_ratio = face["w"] / src_w
+            in_corner = (face["cx"] < src_w * 0.35 or face["cx"] > src_w * 0.65) and \
+                        (face["cy"] < src_h * 0.35 or face["cy"] > src_h * 0.65)
+            is_small  = face_w_ratio < 0.25
+            if in_corner or is_small:
+                pad = int(face["w"] * 0.8)
+                pip_region = {
+                    "x": max(0, face["x"] - pad),
+                    "y": max(0, face["y"] - pad),
+                    "w": min(src_w - max(0, face["x"] - pad), face["w"] + pad * 2),
+                    "h": min(src_h - max(0, face["y"] - pad), face["h"] + pad * 2),
+                }
+                return pip_region
+    return None
+
+
+def default_pip_region(src_w, src_h):
+    """Bottom-right quarter - where webcam overlays usually sit."""
+    return {"x": src_w - src_w // 4, "y": src_h - src_h // 4, "w": src_w // 4, "h": src_h // 4}
+
+
+def build_split_info(pip_region, src_w, src_h, crop_w):
+    """Build the split-screen layout info from a PiP region."""
+    pip_cx = pip_region["x"] + pip_region["w"] // 2
+    if pip_cx > src_w * 0.5:
+        screen_x = 0
+        screen_w = pip_region["x"]
+    else:
+        screen_x = pip_region["x"] + pip_region["w"]
+        screen_w = src_w - screen_x
+
+    if screen_w < 100:
+        screen_w = src_w
+        screen_x = 0
+
+    target_w = crop_w if crop_w > 0 else int(src_h * 9 / 16)
+    target_h = src_h
+    face_h = int(target_h * 0.50)
+    screen_h = target_h - face_h
+
+    return {
+        "screen": {"x": screen_x, "y": 0, "w": screen_w, "h": src_h},
+        "pip": pip_region,
+        "src_w": src_w,
+        "src_h": src_h,
+        "target_w": target_w,
+        "face_h": face_h,
+        "screen_h": screen_h,
+        "screen_zoom": 1.25,
+    }
+
+
+def dual_crops(left_cx, left_cy, right_cx, right_cy, src_w, src_h, aspect=(9, 16)):
+    """Left/right speaker crops for the stacked dual layout. Each panel is
+    half the output's height (9:8 for 9:16) so two of them stacked fill it."""
+    panel_aspect = 2.0 * aspect[0] / aspect[1]
+    mid_x = (left_cx + right_cx) // 2
+    max_cw = min(mid_x, src_w - mid_x)
+    fc_h = src_h
+    fc_w = int(fc_h * panel_aspect)
+    if fc_w > max_cw:
+        fc_w = max_cw
+        fc_h = int(fc_w / panel_aspect)
+    fc_w = fc_w - (fc_w % 2)
+    fc_h = fc_h - (fc_h % 2)
+
+    lx = max(0, min(left_cx - fc_w // 2, mid_x - fc_w))
+    rx = max(mid_x, min(right_cx - fc_w // 2, src_w - fc_w))
+    ly = max(0, min(left_cy - int(fc_h * 0.40), src_h - fc_h))
+    ry = max(0, min(right_cy - int(fc_h * 0.40), src_h - fc_h))
+
+    return {
+        "left_crop":  {"x": lx, "y": ly, "w": fc_w, "h": fc_h},
+        "right_crop": {"x": rx, "y": ry, "w": fc_w, "h": fc_h},
+    }
+
+
+def classify_video(sample_faces, n_samples, src_w, src_h):
+    """Decide the video type from the type-detection samples.
+    n_samples counts every sample time, including frames that failed to decode.
+    Returns 'no_face' | 'group' | 'screen_pip' | 'podcast_dual' | 'podcast'."""
+    pip_detections = 0
+    full_detections = 0
+    small_corner_count = 0  # Track consistent small corner faces
+
+    for faces in sample_faces:
+        for face in faces:
+            w_ratio = face["w"] / src_w if src_w > 0 else 0
+            h_ratio = face["h"] / src_h if src_h > 0 else 0
+
+            log(f"  face: cx={face['cx']}, cy={face['cy']}, w={face['w']}, h={face['h']}, w_ratio={w_ratio:.3f}, area={face['area']}")
+
+            is_small_face = w_ratio < 0.10
+            in_corner = (face["cx"] < src_w * 0.30 or face["cx"] > src_w * 0.70) and \
+                        (face["cy"] < src_h * 0.30 or face["cy"] > src_h * 0.70)
+            on_side = face["cx"] < src_w * 0.25 or face["cx"] > src_w * 0.75
+            is_centered = src_w * 0.15 < face["cx"] < src_w * 0.85 and \
+                          src_h * 0.15 < face["cy"] < src_h * 0.85 and \
+                          w_ratio >= 0.08
+
+            if is_small_face and in_corner:
+                pip_detections += 2
+                small_corner_count += 1
+            elif is_small_face and on_side:
+                pip_detections += 1
+            elif is_small_face:
+                pip_detections += 1
+            elif is_centered:
+                full_detections += 1
+            else:
+                full_detections += 1
+
+        centered_faces = [f for f in faces if src_w * 0.25 < f["cx"] < src_w * 0.75
+                          and f["w"] / src_w >= 0.08]
+        if len(centered_faces) >= 2:
+            full_detections += 2
+
+    total_face_frames = sum(1 for f in sample_faces if f)
+    no_face_frames    = n_samples - total_face_frames
+
+    # Detect group shots: if 4+ faces appear consistently, it's a group/panel shot
+    group_shot_frames = sum(1 for f in sample_faces if len(f) >= 4)
+    is_group_shot = group_shot_frames >= n_samples * 0.4  # 4+ faces in 40%+ of samples
+
+    # Detect dual-face podcast: exactly 2 faces in 40%+ of sampled frames
+    # Also check that the two faces are reasonably sized (not tiny PiP)
+    # AND sufficiently far apart (real 2-person podcasts have speakers on opposite sides)
+    dual_face_spread_frames = 0
+    for faces in sample_faces:
+        if len(faces) == 2:
+            both_big = all(f["w"] / src_w >= 0.08 for f in faces)
+            if both_big:
+                # Check if the two faces are far enough apart to be separate speakers
+                # Real dual podcasts: speakers are typically 30%+ of frame width apart
+                sorted_f = sorted(faces, key=lambda f: f["cx"])
+                gap_ratio = (sorted_f[1]["cx"] - sorted_f[0]["cx"]) / src_w
+                if gap_ratio >= 0.25:
+                    dual_face_spread_frames += 1
+    is_dual_face_podcast = dual_face_spread_frames >= n_samples * 0.35
+
+    # Screen PiP detection:
+    # - If we see consistent small corner faces (even just 2+), it's screen_pip
+    # - Or if pip score is high enough relative to full
+    if total_face_frames == 0:
+        video_type = "no_face"
+    elif is_group_shot:
+        video_type = "group"
+    elif small_corner_count >= 2:
+        # Consistent small face in corner = definitely screen recording with webcam
+        video_type = "screen_pip"
+    elif pip_detections >= 3 and pip_detections >= full_detections * 0.5:
+        video_type = "screen_pip"
+    elif is_dual_face_podcast:
+        video_type = "podcast_dual"
+    else:
+        video_type = "podcast"
+
+    log(f"Video type: {video_type} (pip={pip_detections}, full={full_detections}, no_face={no_face_frames}, small_corner={small_corner_count}, group_frames={group_shot_frames}/{n_samples}, dual_face={dual_face_spread_frames}/{n_samples})")
+    return video_type
+
+
+def static_layout(video_type, sample_faces, n_samples, src_w, src_h, crop_w, pip_region=None, aspect=(9, 16)):
+    """Whole-clip layouts that need no per-frame tracking. pip_region is the
+    measured webcam box for screen recordings (smartcrop/pip.py), if any;
+    aspect the output aspect (w, h) the dual panels stack into.
+    Returns (payload, done_message), or (None, None) when the clip needs
+    per-frame face tracking."""
+    if video_type == "no_face":
+        log("No faces detected - applying 1.25x zoom (full frame, no center crop)")
+        return {"mode": "zoom_full", "zoom": 1.25, "src_w": src_w, "src_h": src_h}, "Done (zoom_full - no face)."
+
+    if video_type == "group":
+        log(f"Group shot detected (4+ faces) - letterboxing full frame into {aspect[0]}:{aspect[1]}")
+        return {"mode": "letterbox", "src_w": src_w, "src_h": src_h}, "Done (letterbox - group shot)."
+
+    # If the ENTIRE video is screen_pip, use the old fast path (no per-frame tracking needed)
+    if video_type == "screen_pip":
+        # Check if ALL sampled frames look like PiP — if so, use static split for the whole clip
+        pip_frame_count = 0
+        for faces in sample_faces:
+            has_pip_face = any(
+                (f["w"] / src_w < 0.10 and
+                 ((f["cx"] < src_w * 0.30 or f["cx"] > src_w * 0.70) and
+                  (f["cy"] < src_h * 0.30 or f["cy"] > src_h * 0.70)))
+                or (f["w"] / src_w < 0.10)
+                for f in faces
+            )
+            if has_pip_face or not faces:
+                pip_frame_count += 1
+
+        # If 80%+ of frames are PiP-like, the whole clip is screen recording → static split
+        if pip_frame_count >= n_samples * 0.80:
+            log("Screen recording with PiP face cam (consistent) - using static split screen mode")
+            pip_region = pip_region or detect_pip_region(sample_faces, src_w, src_h) or default_pip_region(src_w, src_h)
+            log(f"PiP region: {pip_region}")
+            return {"mode": "split", **build_split_info(pip_region, src_w, src_h, crop_w)}, "Done (split screen mode - static)."
+        # Not all frames are PiP — fall through to per-frame tracking
+        # which will handle mixed split/face/letterbox segments
+        log(f"Screen PiP detected but only {pip_frame_count}/{n_samples} frames are PiP-like — using per-frame tracking")
+
+    # ── Podcast with 2 speakers → stacked dual-face crop ──────────────────────
+    if video_type == "podcast_dual":
+        log("Podcast dual-face detected - computing static dual crop positions...")
+
+        # Collect face positions from all 2-face sample frames
+        left_faces_all = []
+        right_faces_all = []
+        for faces in sample_faces:
+            if len(faces) >= 2:
+                sorted_f = sorted(faces, key=lambda f: f["cx"])
+                left_faces_all.append(sorted_f[0])
+                right_faces_all.append(sorted_f[1])
+
+        if not left_faces_all:
+            log("WARNING: No dual-face frames found, falling back to single-face podcast")
+            return None, None
+
+        # Average face positions and sizes
+        avg_left_cx = int(sum(f["cx"] for f in left_faces_all) / len(left_faces_all))
+        avg_left_cy = int(sum(f["cy"] for f in left_faces_all) / len(left_faces_all))
+        avg_left_w  = int(sum(f["w"]  for f in left_faces_all) / len(left_faces_all))
+
+        avg_right_cx = int(sum(f["cx"] for f in right_faces_all) / len(right_faces_all))
+        avg_right_cy = int(sum(f["cy"] for f in right_faces_all) / len(right_faces_all))
+        avg_right_w  = int(sum(f["w"]  for f in right_faces_all) / len(right_faces_all))
+
+        log(f"Left speaker:  cx={avg_left_cx}, cy={avg_left_cy}, face_w={avg_left_w}")
+        log(f"Right speaker: cx={avg_right_cx}, cy={avg_right_cy}, face_w={avg_right_w}")
+
+        # Check if ALL sampled frames have 2 faces → use static dual for whole clip.
+        # If not, fall through to per-frame tracking which handles mixed 1-face/2-face segments
+        dual_frame_ratio = len(left_faces_all) / len(sample_faces) if sample_faces else 0
+        log(f"Dual-face frame ratio: {dual_frame_ratio:.2f} ({len(left_faces_all)}/{len(sample_faces)})")
+
+        if dual_frame_ratio < 0.80:
+            # Mixed: some frames have 2 faces, some have 1 or 0. Per-frame tracking
+            # produces "podcast_dual" segments when 2 faces are visible and "face"
+            # segments when only 1 face is visible.
+            log(f"Only {dual_frame_ratio:.0%} of frames have 2 faces — falling through to per-frame tracking for mixed dual/single segments")
+            return None, None
+
+        # 80%+ of frames have 2 faces → safe to use static dual crop for entire clip
+        log("Using static dual crop (2 faces in 80%+ of frames)")
+
+        dual = dual_crops(avg_left_cx, avg_left_cy, avg_right_cx, avg_right_cy, src_w, src_h, aspect)
+        lc, rc = dual["left_crop"], dual["right_crop"]
+
+        panel = math.gcd(2 * aspect[0], aspect[1])
+        log(f"Crop size: {lc['w']}x{lc['h']} (panel {2 * aspect[0] // panel}:{aspect[1] // panel})")
+        log(f"Left crop:  x={lc['x']}, y={lc['y']}")
+        log(f"Right crop: x={rc['x']}, y={rc['y']}")
+        log(f"Gap between crops: {rc['x'] - (lc['x'] + lc['w'])}px")
+
+        return {"mode": "podcast_dual", **dual, "src_w": src_w, "src_h": src_h}, "Done (podcast_dual - static crop)."
+
+    return None, None
@@ -0,0 +1,93 @@
+"""
+Causal reframing for live sources (--live).
+
+The offline chain already runs its crop path stages in timeline order with
+bounded state (smartcrop/path.py): the raw crop x and the velocity-aware
+EMA with its dead/move/snap zones and oscillation hold only look back, over
+at most VELOCITY_WINDOW samples. Only two stages look ahead - interpolation
+waits for the next sample, and each post-smoothing pass waits post_radius
+frames. LiveReframer runs the same stages, with the post-smoothing radii
+cut down so that the delay, sample interval plus radii, fits a fixed
+lookahead:
+
+  lookahead 0.5s, interval 0.1s, 30fps → 12 frames of smoothing (r1 7, r2 5)
+
+A frame at time t is therefore emitted once the sample at t + lookahead
+(or earlier) has been detected - a constant delay, whatever the stream
+length. Memory is constant too: no stage keeps more than its window and
+no segments are built (speaker turns, layouts and segment merging need the
+whole clip and stay offline).
+
+Finished frames are written as JSON lines, {"t", "x", "y", "w", "h"} in
+source pixels, flushed as they are produced.
+"""
+
+from smartcrop import log
+from smartcrop.path import RawCropTracker, CropSmoother, Interpolator, PostSmoother
+from smartcrop.segments import clean_coord, write_json
+
+DEFAULT_LOOKAHEAD_SEC = 0.5
+
+
+def fit_lookahead(geom, interval, lookahead):
+    """Shrink geom's post-smoothing radii so interpolation (one sample
+    interval) plus smoothing (r1 + r2 frames) fits lookahead seconds.
+    Raises ValueError when the lookahead is shorter than the interval."""
+    budget = int((lookahead - interval) * geom.fps + 1e-6)
+    if budget < 0:
+        raise ValueError(f"lookahead {lookahead:g}s is shorter than the sample interval {interval:g}s")
+    r1, r2 = geom.post_radius_1, (geom.post_radius_2 if geom.post_passes > 1 else 0)
+    if r1 + r2 > budget:
+        r1, r2 = budget * r1 // (r1 + r2), budget - budget * r1 // (r1 + r2)
+    if r1 == 0:
+        r1, r2 = r2, 0
+    geom.post_radius_1 = max(1, r1)
+    geom.post_radius_2 = max(1, r2)
+    geom.post_passes   = (r1 > 0) + (r2 > 0)
+    return geom
+
+
+class LiveReframer:
+    """Samples in, finished per-frame crops out, with a constant delay."""
+
+    def __init__(self, geom, interval, lookahead=DEFAULT_LOOKAHEAD_SEC):
+        self.geom          = fit_lookahead(geom, interval, lookahead)
+        self.interval      = interval
+        self.raw_tracker   = RawCropTracker(geom, lambda t: None, dict)   # no speaker turns live
+        self.smoother      = CropSmoother(geom)
+        self.interpolator  = Interpolator(geom)
+        self.post_smoother = PostSmoother(geom)
+        self.frames        = 0
+        radii = [geom.post_radius_1, geom.post_radius_2][:geom.post_passes]
+        self.delay = interval + sum(radii) / geom.fps
+        log(f"Live: {self.delay:.2f}s delay (interval {interval:g}s, smoothing radii {radii or 'off'})")
+
+    def push(self, t, faces):
+        """Feed the detections of the sample at t; returns the frames that
+        are final now."""
+        rc    = self.raw_tracker.step({"t": t, "faces": faces})
+        coord = self.smoother.step(rc, faces)
+        out   = []
+        for frame in self.interpolator.push(coord):
+            out.extend(self.post_smoother.push(frame))
+        return self._finish(out)
+
+    def flush(self):
+        """End of stream: the frames still held back by the lookahead."""
+        out = []
+        for frame in self.interpolator.flush():
+            out.extend(self.post_smoother.push(frame))
+        out.extend(self.post_smoother.flush())
+        return self._finish(out)
+
+    def _finish(self, frames):
+        self.frames += len(frames)
+        return [clean_coord(frame) for frame in frames]
+
+
+def write_frames(f, frames):
+    """Append frames as JSON lines and flush them to the reader."""
+    for frame in frames:
+        write_json(f, frame)
+        f.write("\n")
+    f.flush()
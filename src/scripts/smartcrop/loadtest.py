@@ -0,0 +1,276 @@
+"""
+Concurrency sweep: how many smart_crop.py runs one host sustains.
+
+Single-run timings (smartcrop/metrics.py, smartcrop/estimate.py) don't show
+where a host saturates - past some concurrency, detector threads, ffmpeg
+decodes and diarization fight for cores and memory bandwidth, and latency
+grows faster than throughput. The load test runs the sidecar at each
+concurrency level N over a local corpus and reports per level:
+
+  clips/min, source seconds analysed per second, latency p50/p95/p99,
+  CPU utilisation (/proc/stat), host memory in use (/proc/meminfo, peak and
+  mean), p95 peak RSS per run and failed/fallen-back runs
+
+and the knee: the smallest N reaching KNEE_FRACTION of the best throughput
+- the worker concurrency to configure; more only adds latency. The sweep
+stops early once throughput drops below COLLAPSE_FRACTION of the best.
+
+The corpus is generated into the work directory: each --seed video is
+looped and re-encoded into CORPUS_VARIANTS (length, height) so the sweep
+covers short and long, 720p and 1080p clips. Seeds should have faces in them -
+without seeds a synthetic test pattern is used, which has none, so runs
+take the no-face fallback and only measure decode and detection. --corpus
+uses existing clips as they are.
+
+Each run gets its own tmp and artifact store directory (nothing is shared
+or cached between runs) and --no-cache; the runs' metrics lines are
+collected from a private SMART_CROP_METRICS_FILE.
+
+  python3 -m smartcrop.loadtest [--levels 1,2,4,8,16,32] [--seed VIDEO ... | --corpus DIR]
+                                [--rounds 2] [--preset NAME] [--out report.json]
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from smartcrop import log
+from smartcrop.metrics import percentile, read_records
+
+DEFAULT_LEVELS    = (1, 2, 4, 8, 12, 16, 24, 32)
+CORPUS_VARIANTS   = ((30, 720), (60, 1080), (90, 1080))   # (seconds, height)
+KNEE_FRACTION     = 0.95
+COLLAPSE_FRACTION = 0.8
+RUN_TIMEOUT_SEC   = 900
+MEM_SAMPLE_SEC    = 0.5
+VIDEO_EXTENSIONS  = (".mp4", ".mov", ".mkv", ".webm", ".ts")
+
+
+# ── Corpus ────────────────────────────────────────────────────────────────────
+
+def generate_corpus(out_dir, seeds):
+    """Clip paths for the sweep: every seed in every CORPUS_VARIANTS length
+    and height, or a synthetic pattern without seeds. Raises RuntimeError."""
+    os.makedirs(out_dir, exist_ok=True)
+    inputs = [(os.path.splitext(os.path.basename(s))[0], ["-stream_loop", "-1", "-i", s]) for s in seeds]
+    if not inputs:
+        log("WARNING: No --seed videos - the synthetic corpus has no faces, runs measure the no-face path")
+        inputs = [("pattern", ["-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=30",
+                               "-f", "lavfi", "-i", "sine=frequency=220:sample_rate=48000"])]
+    clips = []
+    for name, source in inputs:
+        for seconds, height in CORPUS_VARIANTS:
+            path = os.path.join(out_dir, f"{name}_{seconds}s_{height}p.mp4")
+            if not os.path.exists(path):
+                cmd = ["ffmpeg", "-v", "error", "-nostdin", *source, "-t", str(seconds),
+                       "-vf", f"scale=-2:{height}", "-c:v", "libx264", "-preset", "veryfast", "-g", "60",
+                       "-c:a", "aac", "-b:a", "128k", "-shortest", "-y", path + ".tmp.mp4"]
+                proc = subprocess.run(cmd, capture_output=True)
+                if proc.returncode != 0:
+                    raise RuntimeError(f"corpus {name}: {proc.stderr.decode(errors='replace').strip()[-200:]}")
+                os.replace(path + ".tmp.mp4", path)
+            clips.append(path)
+    return clips
+
+
+def list_corpus(corpus_dir):
+    return sorted(os.path.join(corpus_dir, name) for name in os.listdir(corpus_dir)
+                  if name.lower().endswith(VIDEO_EXTENSIONS))
+
+
+# ── Host sampling ─────────────────────────────────────────────────────────────
+
+def cpu_times():
+    """(busy, total) jiffies of all cores from /proc/stat."""
+    with open("/proc/stat") as f:
+        fields = [int(v) for v in f.readline().split()[1:]]
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)   # idle + iowait
+    return sum(fields) - idle, sum(fields)
+
+
+def memory_used_mb():
+    """MemTotal - MemAvailable from /proc/meminfo."""
+    info = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            info[key] = int(value.split()[0])
+    return (info["MemTotal"] - info.get("MemAvailable", info.get("MemFree", 0))) / 1024
+
+
+class MemorySampler:
+    """Host memory in use, sampled every MEM_SAMPLE_SEC in a thread."""
+
+    def __init__(self):
+        self.samples = []
+        self._stop   = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while True:
+            with contextlib.suppress(OSError, KeyError, ValueError):
+                self.samples.append(memory_used_mb())
+            if self._stop.wait(MEM_SAMPLE_SEC):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# ── Sweep ─────────────────────────────────────────────────────────────────────
+
+def run_once(clip, index, work_dir, sidecar_args, metrics_file):
+    """One sidecar run in its own tmp and store directory. Returns
+    {"clip", "wall_sec", "exit"} - exit None on timeout."""
+    script  = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "smart_crop.py")
+    run_dir = os.path.join(work_dir, f"run-{index}")
+    os.makedirs(run_dir, exist_ok=True)
+    env = {**os.environ, "SMART_CROP_METRICS_FILE": metrics_file, "SMART_CROP_METRICS": "1",
+           "SMART_CROP_STORE_DIR": os.path.join(run_dir, "store")}
+    started = time.time()
+    try:
+        proc = subprocess.run([sys.executable, script, clip, f"load{index}", run_dir, "--no-cache", *sidecar_args],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=RUN_TIMEOUT_SEC)
+        code = proc.returncode
+    except subprocess.TimeoutExpired:
+        code = None
+    wall = time.time() - started
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return {"clip": clip, "wall_sec": wall, "exit": code}
+
+
+def run_level(n, clips, rounds, work_dir, sidecar_args):
+    """n runs at a time, n * rounds runs in total (the corpus cycled)."""
+    metrics_file = os.path.join(work_dir, f"metrics-{n}.jsonl")
+    jobs = [clips[i % len(clips)] for i in range(n * rounds)]
+    busy_started, total_started = cpu_times()
+    started = time.time()
+    with MemorySampler() as memory, concurrent.futures.ThreadPoolExecutor(n) as pool:
+        runs = list(pool.map(lambda job: run_once(job[1], f"{n}-{job[0]}", work_dir, sidecar_args, metrics_file),
+                             enumerate(jobs)))
+    wall = time.time() - started
+    busy_ended, total_ended = cpu_times()
+
+    records = [r for r in read_records(metrics_file) if r.get("clip_id", "").startswith("load")]
+    ok      = [r for r in runs if r["exit"] == 0]
+    latency = [r["wall_sec"] for r in ok]
+    rss     = [r["peak_rss_mb"] for r in records if r.get("peak_rss_mb") is not None]
+    cpu_util = (busy_ended - busy_started) / max(1, total_ended - total_started)
+    return {
+        "n":                  n,
+        "runs":               len(runs),
+        "failed":             len(runs) - len(ok),
+        "fell_back":          sum(1 for r in records if r.get("fell_back")),
+        "wall_sec":           round(wall, 2),
+        "clips_per_min":      round(len(ok) / wall * 60, 2),
+        "source_sec_per_sec": round(sum(r.get("duration") or 0.0 for r in records) / wall, 2),
+        "latency_sec":        {f"p{p}": round(percentile(latency, p), 2) for p in (50, 95, 99)} if latency else None,
+        "cpu_util":           round(cpu_util, 3),
+        "cpu_cores_busy":     round(cpu_util * (os.cpu_count() or 1), 2),
+        "mem_peak_mb":        round(max(memory.samples), 1) if memory.samples else None,
+        "mem_mean_mb":        round(sum(memory.samples) / len(memory.samples), 1) if memory.samples else None,
+        "run_rss_p95_mb":     round(percentile(rss, 95), 1) if rss else None,
+    }
+
+
+def find_knee(levels):
+    """The smallest level reaching KNEE_FRACTION of the best clips/min, or None."""
+    if not levels:
+        return None
+    best = max(level["clips_per_min"] for level in levels)
+    if best <= 0:
+        return None
+    return next(level["n"] for level in levels if level["clips_per_min"] >= KNEE_FRACTION * best)
+
+
+def sweep(clips, levels, rounds, work_dir, sidecar_args):
+    results = []
+    best    = 0.0
+    for n in levels:
+        level = run_level(n, clips, rounds, work_dir, sidecar_args)
+        results.append(level)
+        lat = level["latency_sec"] or {}
+        log(f"N={n:>2}: {level['clips_per_min']:6.1f} clips/min, p50 {lat.get('p50', 0):.1f}s "
+            f"p95 {lat.get('p95', 0):.1f}s p99 {lat.get('p99', 0):.1f}s, cpu {level['cpu_util']:.0%}, "
+            f"mem peak {level['mem_peak_mb'] or 0:.0f}MB, {level['failed']} failed")
+        best = max(best, level["clips_per_min"])
+        if best > 0 and level["clips_per_min"] < COLLAPSE_FRACTION * best:
+            log(f"Throughput collapsed at N={n} ({level['clips_per_min']:.1f} < {COLLAPSE_FRACTION:.0%} of "
+                f"{best:.1f} clips/min) - stopping the sweep")
+            break
+    knee = find_knee(results)
+    return {"host": os.uname().nodename, "cores": os.cpu_count(), "clips": len(clips), "rounds": rounds,
+            "sidecar_args": sidecar_args, "levels": results, "knee": knee,
+            "knee_level": next((level for level in results if level["n"] == knee), None)}
+
+
+def parse_levels(text):
+    try:
+        levels = sorted({int(v) for v in text.split(",") if v.strip()})
+    except ValueError:
+        levels = []
+    if not levels or levels[0] < 1:
+        raise argparse.ArgumentTypeError(f"expected comma-separated positive counts, got {text!r}")
+    return levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m smartcrop.loadtest",
+                                     description="Sweep smart_crop.py concurrency and find the throughput knee.")
+    parser.add_argument("--levels", type=parse_levels, default=list(DEFAULT_LEVELS),
+                        help="concurrency levels (default %s)" % ",".join(map(str, DEFAULT_LEVELS)))
+    corpus = parser.add_mutually_exclusive_group()
+    corpus.add_argument("--seed", action="append", default=[], metavar="VIDEO",
+                        help="video to generate the corpus from (repeatable)")
+    corpus.add_argument("--corpus", metavar="DIR", help="use the clips in DIR as they are")
+    parser.add_argument("--rounds", type=int, default=2, help="runs per concurrent slot at each level (default 2)")
+    parser.add_argument("--preset", choices=("fast", "balanced", "quality"), default="balanced")
+    parser.add_argument("--active-speaker", action="store_true")
+    parser.add_argument("--work-dir", help="corpus and run directory (default: a temp dir, removed afterwards)")
+    parser.add_argument("--out", help="report JSON path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="smart_crop_loadtest_")
+    try:
+        if args.corpus:
+            clips = list_corpus(args.corpus)
+        else:
+            clips = generate_corpus(os.path.join(work_dir, "corpus"), args.seed)
+        if not clips:
+            log("ERROR: empty corpus")
+            return 1
+        log(f"Load test: {len(clips)} clips, levels {args.levels}, {args.rounds} rounds, {os.cpu_count()} cores")
+        sidecar_args = ["--preset", args.preset, *(["--active-speaker"] if args.active_speaker else [])]
+        report = sweep(clips, args.levels, max(1, args.rounds), work_dir, sidecar_args)
+    except RuntimeError as e:
+        log(f"ERROR: {e}")
+        return 1
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    log(f"Knee: N={report['knee']}" if report["knee"] else "Knee: none (no successful runs)")
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
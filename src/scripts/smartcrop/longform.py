@@ -0,0 +1,120 @@
+"""
+Long-form mode: bounded memory + checkpoint/resume for full-episode reframes.
+
+Normal clips hold every detection and per-frame coord in memory, which is fine
+for 60s but not for 90 minutes at 60fps. In long-form mode smart_crop.py
+tracks the timeline in CHUNK_SEC chunks and pushes each chunk straight through
+the streaming path stages (smartcrop.path) and segment builder; per-frame
+coords are spooled to disk and the coords JSON is streamed from the spool.
+
+After every chunk a checkpoint is written atomically: tracker/smoother/segment
+state plus the sizes of the spool and the detections log. A worker crash or
+spot reclaim resumes from the last checkpoint instead of starting over - the
+spool and log are truncated back to the checkpointed sizes, so nothing written
+after it is duplicated.
+
+Files (in --checkpoint-dir, default tmpDir):
+  {clipId}_longform.ckpt.json         latest checkpoint
+  {clipId}_longform.spool.jsonl       per-frame coords so far
+  {clipId}_longform.detections.jsonl  per-sample detections so far
+"""
+
+import json
+import os
+
+from smartcrop.segments import LazyList
+
+CHUNK_SEC          = 60.0   # timeline processed per chunk (and per checkpoint)
+AUTO_SEC           = 900.0  # clips longer than this use long-form mode automatically
+TYPE_SAMPLES       = 240    # cap on type-detection samples (1/s would be 5400 for 90 min)
+CHECKPOINT_VERSION = 1
+
+
+def paths(checkpoint_dir, clip_id):
+    base = os.path.join(checkpoint_dir, f"{clip_id}_longform")
+    return {
+        "checkpoint": f"{base}.ckpt.json",
+        "spool":      f"{base}.spool.jsonl",
+        "detections": f"{base}.detections.jsonl",
+    }
+
+
+def job_key(video_path, duration, fps, sample_interval, options):
+    """Everything a checkpoint depends on. A checkpoint for a different source
+    file or different settings is ignored."""
+    st = os.stat(video_path)
+    return {
+        "version":  CHECKPOINT_VERSION,
+        "source":   os.path.realpath(video_path),
+        "size":     st.st_size,
+        "mtime":    int(st.st_mtime),
+        "duration": duration,
+        "fps":      fps,
+        "interval": sample_interval,
+        "options":  options,
+    }
+
+
+def load_checkpoint(files, job):
+    """Return the saved state if it belongs to this job and its spool/log files
+    are intact, else None."""
+    try:
+        with open(files["checkpoint"]) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("job") != job:
+        return None
+    for name, key in (("spool", "spool_size"), ("detections", "detections_size")):
+        if not os.path.exists(files[name]) or os.path.getsize(files[name]) < state[key]:
+            return None
+    return state
+
+
+def save_checkpoint(files, state):
+    """Write-then-rename so a crash mid-write never leaves a torn checkpoint."""
+    tmp = files["checkpoint"] + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, files["checkpoint"])
+
+
+def cleanup(files):
+    for path in files.values():
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def read_detections(path):
+    """Lazily stream a detections log back as a JSON array (for dumps)."""
+    def produce():
+        with open(path) as f:
+            for line in f:
+                yield json.loads(line)
+    return LazyList(produce)
+
+
+class DetectionLog:
+    """Append-only JSON-lines log of per-sample detections ({"t", "faces", ...})."""
+
+    def __init__(self, path, resume_size=None):
+        if resume_size is None:
+            open(path, "w").close()
+        else:
+            with open(path, "r+") as f:
+                f.truncate(resume_size)
+        self._f = open(path, "a")
+
+    def append(self, fd):
+        self._f.write(json.dumps(fd) + "\n")
+
+    def size(self):
+        self._f.flush()
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
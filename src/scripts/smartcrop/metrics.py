@@ -0,0 +1,254 @@
+"""
+Per-run analysis metrics for capacity planning and autoscaling.
+
+Every smart_crop.py run appends one JSON line to a host-local metrics file
+(SMART_CROP_METRICS_FILE, default {tmp}/smart_crop_metrics.jsonl) when it
+exits - normal exit, cache hit or fallback alike:
+
+  {"v": 1, "ts": 1760000000.0, "host": "ip-10-0-0-1", "clip_id": "...",
+   "video_type": "podcast", "mode": "mixed", "duration": 42.0,
+   "wall_sec": 12.3, "cpu_sec": 30.1, "realtime_factor": 0.29,
+   "samples": 252, "detector_calls": 240, "diarization_sec": 9.8,
+   "peak_rss_mb": 612.0, "fell_back": false, "fallback_reason": null,
+   "cache_hit": false, "preset": "balanced", "degraded": []}
+
+realtime_factor is wall time per second of source (lower is faster). The
+file is rotated to .1 beyond SMART_CROP_METRICS_MAX_MB (default 16).
+SMART_CROP_METRICS=0 disables recording.
+
+A rolling aggregate over the last --window seconds gives per-host samples/s,
+source seconds analysed per second, CPU cores busy and latency percentiles:
+
+  python3 -m smartcrop.metrics [summary|prom|cloudwatch] [--window SEC] [--out PATH]
+
+summary prints JSON, prom writes Prometheus textfile-collector format and
+cloudwatch prints a PutMetricData --metric-data list (see
+deploy/autoscaling/smartcrop-metrics.sh).
+"""
+
+import argparse
+import atexit
+import fcntl
+import json
+import math
+import os
+import resource
+import socket
+import sys
+import tempfile
+import time
+
+SCHEMA_VERSION = 1
+DEFAULT_MAX_MB = 16
+DEFAULT_WINDOW = 300
+PERCENTILES    = (50, 95, 99)
+
+
+def default_path():
+    return os.environ.get("SMART_CROP_METRICS_FILE") or os.path.join(tempfile.gettempdir(), "smart_crop_metrics.jsonl")
+
+
+def cpu_seconds():
+    """User + system CPU of this process and its reaped children (ffmpeg, diarization)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def peak_rss_mb():
+    """Peak RSS of this process or its largest child, whichever is larger."""
+    self_kb  = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(self_kb, child_kb) / 1024, 1)   # ru_maxrss is KB on Linux
+
+
+class RunStats:
+    """Counters for one run; the line is appended at interpreter exit."""
+
+    def __init__(self, clip_id, path=None):
+        self.path            = path or default_path()
+        self.clip_id         = clip_id
+        self.started         = time.time()
+        self.cpu_started     = cpu_seconds()
+        self.video_type      = None
+        self.mode            = None
+        self.duration        = None
+        self.samples         = 0
+        self.detector_calls  = 0
+        self.diarization_sec = None
+        self.fallback_reason = None
+        self.cache_hit       = False
+        self.preset          = None
+        self.degraded        = []
+        if os.environ.get("SMART_CROP_METRICS") != "0":
+            atexit.register(self.record)
+
+    def fell_back(self, reason):
+        self.fallback_reason = reason
+        self.mode = "skip"
+
+    def line(self):
+        wall = time.time() - self.started
+        return {
+            "v":               SCHEMA_VERSION,
+            "ts":              round(time.time(), 3),
+            "host":            socket.gethostname(),
+            "clip_id":         self.clip_id,
+            "video_type":      self.video_type,
+            "mode":            self.mode,
+            "duration":        None if self.duration is None else round(self.duration, 3),
+            "wall_sec":        round(wall, 3),
+            "cpu_sec":         round(cpu_seconds() - self.cpu_started, 3),
+            "realtime_factor": round(wall / self.duration, 4) if self.duration else None,
+            "samples":         self.samples,
+            "detector_calls":  self.detector_calls,
+            "diarization_sec": None if self.diarization_sec is None else round(self.diarization_sec, 3),
+            "peak_rss_mb":     peak_rss_mb(),
+            "fell_back":       self.fallback_reason is not None,
+            "fallback_reason": self.fallback_reason,
+            "cache_hit":       self.cache_hit,
+            "preset":          self.preset,
+            "degraded":        self.degraded,
+        }
+
+    def record(self):
+        try:
+            append(self.path, self.line())
+        except OSError:
+            pass   # metrics must never fail a clip
+
+
+def append(path, record, max_bytes=None):
+    """Append one JSON line under an flock, rotating the file beyond the cap."""
+    if max_bytes is None:
+        try:
+            max_bytes = int(float(os.environ.get("SMART_CROP_METRICS_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        except ValueError:
+            max_bytes = DEFAULT_MAX_MB * 1024 * 1024
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.getsize(path) > max_bytes:
+                os.replace(path, path + ".1")
+        except OSError:
+            pass
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def read_records(path, since=0.0):
+    """Records with ts >= since from the rotated and the current file."""
+    records = []
+    for p in (path + ".1", path):
+        try:
+            with open(p) as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue   # torn line from a crashed writer
+                    if rec.get("ts", 0) >= since:
+                        records.append(rec)
+        except OSError:
+            continue
+    return records
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(records, window):
+    """Rolling aggregate of the records of the last window seconds."""
+    analysed = [r for r in records if not r.get("cache_hit")]
+    wall     = [r["wall_sec"] for r in records]
+    summary  = {
+        "window_sec":       window,
+        "runs":             len(records),
+        "runs_per_min":     round(len(records) * 60 / window, 3),
+        "cache_hits":       len(records) - len(analysed),
+        "fallbacks":        sum(1 for r in records if r.get("fell_back")),
+        # Throughput over the runs' own wall time (per analysis slot)
+        "samples_per_sec":  round(sum(r.get("samples", 0) for r in analysed) /
+                                  max(sum(r["wall_sec"] for r in analysed), 1e-9), 3) if analysed else 0.0,
+        "source_sec_per_sec": round(sum(r.get("duration") or 0 for r in analysed) /
+                                    max(sum(r["wall_sec"] for r in analysed), 1e-9), 3) if analysed else 0.0,
+        # Host load: CPU seconds burnt per wall second of the window
+        "cpu_cores_busy":   round(sum(r.get("cpu_sec", 0) for r in records) / window, 3),
+        "detector_calls":   sum(r.get("detector_calls", 0) for r in records),
+        "peak_rss_mb":      max((r.get("peak_rss_mb") or 0 for r in records), default=0),
+        "by_video_type":    {},
+    }
+    for p in PERCENTILES:
+        summary[f"wall_sec_p{p}"] = round(percentile(wall, p), 3) if wall else None
+    rtf = [r["realtime_factor"] for r in analysed if r.get("realtime_factor") is not None]
+    for p in PERCENTILES:
+        summary[f"realtime_factor_p{p}"] = round(percentile(rtf, p), 4) if rtf else None
+    for r in records:
+        key = r.get("video_type") or "unknown"
+        summary["by_video_type"][key] = summary["by_video_type"].get(key, 0) + 1
+    return summary
+
+
+# Summary field → (metric name, CloudWatch unit)
+EXPORTED = {
+    "runs_per_min":        ("SmartCropRunsPerMin", "Count"),
+    "samples_per_sec":     ("SmartCropSamplesPerSec", "Count/Second"),
+    "source_sec_per_sec":  ("SmartCropSourceSecPerSec", "None"),
+    "cpu_cores_busy":      ("SmartCropCpuCoresBusy", "None"),
+    "fallbacks":           ("SmartCropFallbacks", "Count"),
+    "peak_rss_mb":         ("SmartCropPeakRssMB", "Megabytes"),
+    **{f"wall_sec_p{p}":        (f"SmartCropLatencyP{p}", "Seconds") for p in PERCENTILES},
+    **{f"realtime_factor_p{p}": (f"SmartCropRealtimeFactorP{p}", "None") for p in PERCENTILES},
+}
+
+
+def to_prometheus(summary, host):
+    lines = []
+    for field in EXPORTED:
+        value = summary.get(field)
+        if value is None:
+            continue
+        metric = f"smartcrop_{field}"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f'{metric}{{host="{host}",window="{summary["window_sec"]}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def to_cloudwatch(summary, dimensions):
+    return [{"MetricName": name, "Value": summary[field], "Unit": unit, "Dimensions": dimensions}
+            for field, (name, unit) in EXPORTED.items() if summary.get(field) is not None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m smartcrop.metrics",
+                                     description="Aggregate smart_crop.py run metrics on this host.")
+    parser.add_argument("format", nargs="?", default="summary", choices=("summary", "prom", "cloudwatch"))
+    parser.add_argument("--window", type=float, default=DEFAULT_WINDOW, help="seconds to aggregate over")
+    parser.add_argument("--file", default=default_path())
+    parser.add_argument("--out", help="write here atomically instead of stdout")
+    args = parser.parse_args(argv)
+
+    summary = summarize(read_records(args.file, time.time() - args.window), args.window)
+    host    = socket.gethostname()
+    if args.format == "prom":
+        text = to_prometheus(summary, host)
+    elif args.format == "cloudwatch":
+        dims = [{"Name": "Environment", "Value": os.environ.get("ENVIRONMENT", "production")}]
+        text = json.dumps(to_cloudwatch(summary, dims))
+    else:
+        text = json.dumps(summary, indent=2)
+
+    if args.out:
+        tmp = args.out + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, args.out)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,462 @@
+"""
+Crop path stages for face tracking, as resumable state machines:
+
+  RawCropTracker  per-sample crop x (speaker-aware) + drift to center when no face
+  CropSmoother    velocity-aware EMA with dead/move/snap zones + oscillation hold
+  Interpolator    eased interpolation from samples to every output frame
+  PostSmoother    2-pass triangular smoothing, streamed with a bounded lookahead
+
+Each stage consumes items in timeline order and keeps only O(window) state, so
+the same code serves a 60s clip held in memory and a 90-minute episode
+processed in chunks. state()/load_state() round-trip through JSON for
+long-form checkpoints.
+"""
+
+from smartcrop import log
+
+
+def crop_size(src_w, src_h, aspect=(9, 16)):
+    """Crop window of the output aspect (w, h) for the source - full height
+    unless the source is too narrow - even-sized for libx264."""
+    aspect_w, aspect_h = aspect
+    crop_w = int(src_h * aspect_w / aspect_h)
+    crop_h = src_h
+    if crop_w > src_w:
+        crop_w = src_w
+        crop_h = int(src_w * aspect_h / aspect_w)
+    crop_w = crop_w - (crop_w % 2)
+    crop_h = crop_h - (crop_h % 2)
+    return crop_w, crop_h
+
+
+class CropGeometry:
+    """Source/crop dimensions plus every smoothing threshold derived from them."""
+
+    def __init__(self, src_w, src_h, fps, crop_w, crop_h, aspect=(9, 16)):
+        self.src_w  = src_w
+        self.src_h  = src_h
+        self.fps    = fps
+        self.crop_w = crop_w
+        self.crop_h = crop_h
+        self.aspect = aspect   # output aspect (w, h) - dual panels are half its height
+
+        # DEAD_ZONE: ignore movements smaller than this (prevents micro-jitter from face detection noise)
+        # MOVE_ZONE: start slow panning only above this threshold (prevents wobble from natural head sway)
+        # SNAP_ZONE: instant jump for speaker switches / scene cuts
+        # All thresholds are RELATIVE to video width so they scale correctly for 720p, 1080p, 4K, etc.
+        self.dead_zone = max(60, int(src_w * 0.025))   # ~2.5% of width (e.g. 96px on 4K, 48px on 1080p)
+        self.move_zone = max(120, int(src_w * 0.055))  # ~5.5% of width (e.g. 211px on 4K, 105px on 1080p)
+        self.snap_zone = max(400, int(src_w * 0.12))   # ~12% of width (e.g. 460px on 4K, 230px on 1080p)
+
+        # Y-axis dead zones — scaled to video height like X thresholds
+        self.y_dead_zone = max(30, int(src_h * 0.015))   # ~1.5% of height
+        self.y_move_zone = max(60, int(src_h * 0.035))   # ~3.5% of height
+        self.y_snap_zone = max(180, int(src_h * 0.10))   # ~10% of height
+
+        # Post-smoothing kernel radii in frames
+        self.post_radius_1 = max(5, int(fps * 0.35))  # ~0.35s window (wider for smoother pans)
+        self.post_radius_2 = max(3, int(fps * 0.20))  # ~0.20s second pass for extra polish
+        self.post_passes   = 2                          # 1 skips the second pass (fast preset)
+
+
+# Velocity history: track recent movement directions to detect oscillation.
+# If the face is bouncing left-right (gesturing, laughing), we suppress the pan
+# instead of chasing every frame. Window of 8 samples ≈ 1.6s of history at 0.2s interval.
+VELOCITY_WINDOW = 8
+
+
+def get_crop_y(faces, src_h, crop_h):
+    if not faces:
+        # No face - center crop vertically (better for B-roll / text screens)
+        return max(0, (src_h - crop_h) // 2)
+    top_face_y = min(f["y"] for f in faces)
+    target_y = top_face_y - int(crop_h * 0.20)
+    return max(0, min(target_y, src_h - crop_h))
+
+
+def get_crop_x(faces, t, last_crop_cx, geom, speaker_at, speaker_pos):
+    """Get the horizontal crop position for a frame. Returns None if no faces.
+    Wrapped in try/catch so a single bad frame never crashes the pipeline."""
+    src_w, crop_w = geom.src_w, geom.crop_w
+    try:
+        if not faces:
+            return None
+        if len(faces) == 1:
+            target_cx = faces[0]["cx"]
+        else:
+            spk = speaker_at(t)
+            primary_cx = None
+
+            if spk and spk in speaker_pos:
+                primary_cx = min(faces, key=lambda f: abs(f["cx"] - speaker_pos[spk]))["cx"]
+            elif last_crop_cx is not None:
+                edge_margin = crop_w
+                interior = [f for f in faces if edge_margin < f["cx"] < src_w - edge_margin]
+                candidates = interior if interior else faces
+                primary_cx = min(candidates, key=lambda f: abs(f["cx"] - last_crop_cx))["cx"]
+            else:
+                edge_margin = crop_w
+                interior = [f for f in faces if edge_margin < f["cx"] < src_w - edge_margin]
+                candidates = interior if interior else faces
+                primary_cx = max(candidates, key=lambda f: f["area"])["cx"]
+
+            nearby = [f for f in faces if abs(f["cx"] - primary_cx) < crop_w * 0.8]
+            if len(nearby) >= 2:
+                left_cx  = min(f["cx"] for f in nearby)
+                right_cx = max(f["cx"] for f in nearby)
+                group_span = right_cx - left_cx
+                face_padding = max(f["w"] for f in nearby) // 2
+                if group_span + face_padding * 2 <= crop_w:
+                    target_cx = (left_cx + right_cx) // 2
+                else:
+                    target_cx = primary_cx
+            else:
+                target_cx = primary_cx
+
+        crop_x = target_cx - crop_w // 2
+        return max(0, min(crop_x, src_w - crop_w))
+    except Exception as e:
+        log(f"WARNING: get_crop_x failed at t={t}: {e}")
+        return None
+
+
+class RawCropTracker:
+    """Per-sample crop x. When the face is missing, drift toward center instead
+    of blindly holding the last face position (handles B-roll, text screens)."""
+
+    def __init__(self, geom, speaker_at, speaker_pos):
+        self.geom          = geom
+        self.speaker_at    = speaker_at
+        self.speaker_pos   = speaker_pos   # callable → current speaker_id → cx map
+        self.last_x        = (geom.src_w - geom.crop_w) // 2
+        self.last_cx       = geom.src_w // 2
+        self.last_velocity = 0.0
+
+    def step(self, fd):
+        g = self.geom
+        x        = get_crop_x(fd["faces"], fd["t"], self.last_cx, g, self.speaker_at, self.speaker_pos())
+        has_face = bool(fd["faces"])
+
+        if x is None:
+            center_x = (g.src_w - g.crop_w) // 2
+            # Blend toward center: 8% per step (reaches center in ~3-4s)
+            # Slower than before (was 20%) to avoid visible drift when face
+            # detection flickers for just 1-2 frames
+            predicted_x = self.last_x + (center_x - self.last_x) * 0.08
+            x = int(max(0, min(predicted_x, g.src_w - g.crop_w)))
+            self.last_velocity *= 0.3
+        else:
+            self.last_velocity = x - self.last_x
+            self.last_cx       = x + g.crop_w // 2
+
+        self.last_x = x
+        return {"t": fd["t"], "x": x, "face": has_face, "frame_type": fd.get("frame_type", "face"), "pip": fd.get("pip")}
+
+    def state(self):
+        return {"last_x": self.last_x, "last_cx": self.last_cx, "last_velocity": self.last_velocity}
+
+    def load_state(self, state):
+        self.last_x        = state["last_x"]
+        self.last_cx       = state["last_cx"]
+        self.last_velocity = state["last_velocity"]
+
+
+def is_oscillating(hist):
+    """Detect if recent movement is oscillating (direction changes ≥ 3 times in window).
+    This catches gesturing, laughing, leaning back-and-forth — movements where
+    the camera should hold still instead of chasing."""
+    if len(hist) < 4:
+        return False
+    signs = [1 if v > 0 else -1 if v < 0 else 0 for v in hist]
+    # Filter out zero-deltas (no movement) before counting direction changes
+    non_zero = [s for s in signs if s != 0]
+    if len(non_zero) < 3:
+        return False
+    direction_changes = sum(1 for i in range(1, len(non_zero)) if non_zero[i] != non_zero[i-1])
+    return direction_changes >= 3
+
+
+class CropSmoother:
+    """Adaptive alpha (velocity-aware EMA smoothing) on X and Y."""
+
+    def __init__(self, geom):
+        self.geom            = geom
+        self.smoothed_x      = None   # initialized from the first sample
+        self.smoothed_y      = None
+        self.prev_had_face   = None
+        self.velocity_hist   = []     # recent (raw_x - smoothed_x) deltas to detect oscillation
+        self.y_velocity_hist = []
+
+    def step(self, rc, faces):
+        """rc: RawCropTracker output; faces: the detections at rc["t"] (for Y)."""
+        g = self.geom
+        raw_y = float(get_crop_y(faces, g.src_h, g.crop_h))
+        if self.smoothed_x is None:
+            self.smoothed_x    = float(rc["x"])
+            self.smoothed_y    = raw_y
+            self.prev_had_face = rc["face"]
+
+        raw_x = float(rc["x"])
+        delta = raw_x - self.smoothed_x  # signed delta (direction matters for oscillation)
+        abs_delta = abs(delta)
+
+        # Track velocity history for oscillation detection
+        self.velocity_hist.append(delta)
+        if len(self.velocity_hist) > VELOCITY_WINDOW:
+            self.velocity_hist.pop(0)
+
+        oscillating = is_oscillating(self.velocity_hist)
+
+        if rc["face"] and not self.prev_had_face:
+            # Face reappeared - DON'T snap instantly, blend quickly instead
+            # This prevents a jarring jump when face detection flickers
+            ALPHA = 0.35
+            self.smoothed_x = ALPHA * raw_x + (1 - ALPHA) * self.smoothed_x
+            self.velocity_hist.clear()
+        elif abs_delta > g.snap_zone:
+            # Big jump (speaker switch) - snap instantly
+            self.smoothed_x = raw_x
+            self.velocity_hist.clear()
+        elif oscillating and abs_delta < g.snap_zone:
+            # Face is bouncing around (gesturing, laughing) - hold position.
+            # Only apply a very tiny correction toward the average recent position
+            # so the crop doesn't drift if the person genuinely shifted.
+            avg_raw = self.smoothed_x + sum(self.velocity_hist) / len(self.velocity_hist)
+            ALPHA = 0.005
+            self.smoothed_x = ALPHA * avg_raw + (1 - ALPHA) * self.smoothed_x
+        elif abs_delta > g.move_zone:
+            # Intentional movement - smooth pan with low alpha for cinematic glide.
+            # Capped at 0.04 (was 0.06) — slower panning eliminates visible pixel stepping.
+            # The 2-pass post-smoothing will further polish any remaining micro-steps.
+            ALPHA = min(0.04, 0.015 + abs_delta / 5000.0)
+            self.smoothed_x = ALPHA * raw_x + (1 - ALPHA) * self.smoothed_x
+        elif abs_delta > g.dead_zone:
+            # Small drift - very slow correction to avoid visible wobble
+            ALPHA = 0.008
+            self.smoothed_x = ALPHA * raw_x + (1 - ALPHA) * self.smoothed_x
+        # else: abs_delta <= DEAD_ZONE - do nothing, hold position
+
+        # Y-axis smoothing - same approach with oscillation detection
+        delta_y     = raw_y - self.smoothed_y
+        abs_delta_y = abs(delta_y)
+
+        self.y_velocity_hist.append(delta_y)
+        if len(self.y_velocity_hist) > VELOCITY_WINDOW:
+            self.y_velocity_hist.pop(0)
+
+        y_oscillating = is_oscillating(self.y_velocity_hist)
+
+        if rc["face"] and not self.prev_had_face:
+            ALPHA_Y = 0.30
+            self.smoothed_y = ALPHA_Y * raw_y + (1 - ALPHA_Y) * self.smoothed_y
+            self.y_velocity_hist.clear()
+        elif abs_delta_y > g.y_snap_zone:
+            self.smoothed_y = raw_y
+            self.y_velocity_hist.clear()
+        elif y_oscillating and abs_delta_y < g.y_snap_zone:
+            avg_raw_y = self.smoothed_y + sum(self.y_velocity_hist) / len(self.y_velocity_hist)
+            ALPHA_Y = 0.005
+            self.smoothed_y = ALPHA_Y * avg_raw_y + (1 - ALPHA_Y) * self.smoothed_y
+        elif abs_delta_y > g.y_move_zone:
+            ALPHA_Y = min(0.035, 0.015 + abs_delta_y / 4000.0)
+            self.smoothed_y = ALPHA_Y * raw_y + (1 - ALPHA_Y) * self.smoothed_y
+        elif abs_delta_y > g.y_dead_zone:
+            ALPHA_Y = 0.008
+            self.smoothed_y = ALPHA_Y * raw_y + (1 - ALPHA_Y) * self.smoothed_y
+        # else: abs_delta_y <= Y_DEAD_ZONE - hold vertical position
+
+        self.prev_had_face = rc["face"]
+        return {
+            "t":    rc["t"],
+            "x":    int(self.smoothed_x),
+            "y":    int(self.smoothed_y),
+            "w":    g.crop_w,
+            "h":    g.crop_h,
+            "face": rc["face"],
+            "frame_type": rc.get("frame_type", "face"),
+            "pip":  rc.get("pip"),
+        }
+
+    def state(self):
+        return {"smoothed_x": self.smoothed_x, "smoothed_y": self.smoothed_y,
+                "prev_had_face": self.prev_had_face,
+                "velocity_hist": self.velocity_hist, "y_velocity_hist": self.y_velocity_hist}
+
+    def load_state(self, state):
+        self.smoothed_x      = state["smoothed_x"]
+        self.smoothed_y      = state["smoothed_y"]
+        self.prev_had_face   = state["prev_had_face"]
+        self.velocity_hist   = list(state["velocity_hist"])
+        self.y_velocity_hist = list(state["y_velocity_hist"])
+
+
+def ease_in_out(t):
+    """Smooth ease-in-out (cubic) for natural camera movement"""
+    if t < 0.5:
+        return 4 * t * t * t
+    return 1 - (-2 * t + 2) ** 3 / 2
+
+
+class Interpolator:
+    """Interpolate smoothed samples to per-frame coords with easing. Only hard
+    cuts (jumps beyond SNAP_ZONE, i.e. true speaker switches) skip the easing."""
+
+    def __init__(self, geom):
+        self.geom = geom
+        self.prev = None
+        self.frame_interval = 1.0 / geom.fps
+
+    def push(self, coord):
+        """Feed the next sample; returns the frames from the previous sample up to (not including) this one."""
+        a, self.prev = self.prev, coord
+        if a is None:
+            return []
+        b = coord
+        g = self.geom
+        frames = []
+        steps = max(1, round((b["t"] - a["t"]) / self.frame_interval))
+        is_scene_cut = abs(b["x"] - a["x"]) > g.snap_zone
+
+        for step in range(steps):
+            if is_scene_cut:
+                interp_x = b["x"] if step > 0 else a["x"]
+                interp_y = b["y"] if step > 0 else a["y"]
+            else:
+                t_linear = step / steps
+                t_smooth = ease_in_out(t_linear)
+                interp_x = a["x"] + t_smooth * (b["x"] - a["x"])
+                interp_y = a["y"] + t_smooth * (b["y"] - a["y"])
+            frames.append({
+                "t":    round(a["t"] + step * self.frame_interval, 4),
+                "x":    interp_x,  # keep as float for now, round after post-smoothing
+                "y":    interp_y,
+                "w":    g.crop_w,
+                "h":    g.crop_h,
+                "face": a["face"],
+                "frame_type": a.get("frame_type", "face"),
+                "pip":  a.get("pip"),
+            })
+        return frames
+
+    def flush(self):
+        """The last sample itself closes the timeline."""
+        return [self.prev] if self.prev is not None else []
+
+    def state(self):
+        return {"prev": self.prev}
+
+    def load_state(self, state):
+        self.prev = state["prev"]
+
+
+def smooth_window(window, center, radius, snap):
+    """Triangular (Bartlett) weighted average of window around index center.
+    Preserves hard cuts: if the window contains a jump beyond snap, the value
+    is left unsmoothed."""
+    max_jump = max(abs(window[j] - window[j-1]) for j in range(1, len(window))) if len(window) > 1 else 0
+    if max_jump > snap:
+        # Hard cut in window — don't smooth this frame
+        return window[center]
+    # Triangular (Bartlett) weighting: center frame has highest weight
+    weights = [max(1, radius + 1 - abs(j - center)) for j in range(len(window))]
+    total_w = sum(weights)
+    return sum(w * v for w, v in zip(weights, window)) / total_w
+
+
+class _SmoothPass:
+    """One post-smoothing pass over (frame, x, y) items. Emits item i once
+    item i+radius has arrived; flush() emits the tail with edge clamping."""
+
+    def __init__(self, radius, snap):
+        self.radius   = radius
+        self.snap     = snap
+        self.buf      = []   # items from index self.base onward
+        self.base     = 0
+        self.count    = 0    # items pushed so far
+        self.next_out = 0    # index of the next item to emit
+
+    def push(self, item):
+        self.buf.append(item)
+        self.count += 1
+        out = []
+        while self.next_out + self.radius < self.count:
+            out.append(self._emit(self.count))
+        return out
+
+    def flush(self):
+        out = []
+        while self.next_out < self.count:
+            out.append(self._emit(self.count))
+        return out
+
+    def _emit(self, n):
+        i  = self.next_out
+        lo = max(0, i - self.radius)
+        hi = min(n, i + self.radius + 1)
+        window = self.buf[lo - self.base:hi - self.base]
+        xs = [w[1] for w in window]
+        ys = [w[2] for w in window]
+        item = (window[i - lo][0],
+                smooth_window(xs, i - lo, self.radius, self.snap),
+                smooth_window(ys, i - lo, self.radius, self.snap))
+        self.next_out += 1
+        # Drop items no future window can reach
+        drop = (self.next_out - self.radius) - self.base
+        if drop > 0:
+            del self.buf[:drop]
+            self.base += drop
+        return item
+
+    def state(self):
+        return {"buf": self.buf, "base": self.base, "count": self.count, "next_out": self.next_out}
+
+    def load_state(self, state):
+        self.buf      = [tuple(item) for item in state["buf"]]
+        self.base     = state["base"]
+        self.count    = state["count"]
+        self.next_out = state["next_out"]
+
+
+class PostSmoother:
+    """Post-smoothing to eliminate pixel stepping.
+
+    The EMA + interpolation can still leave tiny 1-3px oscillations that are visible
+    as jitter ("pixel stepping"). A wider kernel + multiple passes eliminates these.
+    Pass 1: wide kernel to remove all micro-jitter
+    Pass 2: narrower kernel to smooth out any artifacts from pass 1
+    Output frames get integer x/y clamped to the source."""
+
+    def __init__(self, geom):
+        self.geom   = geom
+        self.passes = [_SmoothPass(geom.post_radius_1, geom.snap_zone),
+                       _SmoothPass(geom.post_radius_2, geom.snap_zone)][:geom.post_passes]
+
+    def push(self, frame):
+        return self._run([(frame, frame["x"], frame["y"])], 0, flush=False)
+
+    def flush(self):
+        return self._run([], 0, flush=True)
+
+    def _run(self, items, stage, flush):
+        if stage == len(self.passes):
+            return [self._finish(*item) for item in items]
+        p = self.passes[stage]
+        out = []
+        for item in items:
+            out.extend(p.push(item))
+        if flush:
+            out.extend(p.flush())
+        return self._run(out, stage + 1, flush)
+
+    def _finish(self, frame, x, y):
+        g = self.geom
+        frame["x"] = max(0, min(int(round(x)), g.src_w - g.crop_w))
+        frame["y"] = max(0, min(int(round(y)), g.src_h - g.crop_h))
+        return frame
+
+    def state(self):
+        return [p.state() for p in self.passes]
+
+    def load_state(self, state):
+        for p, s in zip(self.passes, state):
+            p.load_state(s)
@@ -0,0 +1,164 @@
+"""
+Webcam-overlay (PiP) box detector for screen recordings.
+
+detect_pip_region guesses the webcam box by padding a small face. A webcam
+overlay is a fixed rectangle of live video inside a mostly static screen,
+which a few downscaled frames show directly:
+
+  1. Temporal change: for pairs of frames PAIR_GAP apart (spread over the
+     shot), mark pixels whose local difference exceeds the pair's noise
+     floor, taken from the screen that fills most of the frame (0 for a
+     clean screen, a little more for a noisy or re-encoded one). Screen
+     content is static between most pairs (typing, the cursor and scrolling
+     touch few pairs); camera noise and the presenter touch nearly all of
+     them, including the webcam's static background.
+  2. The persistent-change component holding the face (or the largest one)
+     gives a coarse box.
+  3. Each side grows outward to the nearest straight edge in the
+     time-averaged frame - the overlay border - or to the frame border.
+
+The box is validated (size, aspect, the face inside it) and returned in
+source pixels, or None so callers keep the face-padding heuristic.
+Needs cv2 + numpy (imported by smart_crop.py anyway).
+"""
+
+import cv2
+import numpy as np
+
+ANALYSIS_W    = 320    # frames are analysed at this width
+PAIR_GAP      = 0.2    # seconds between the two frames of a pair
+PAIRS         = 6      # pairs per shot
+NOISE_WINDOW  = 5      # pixels averaged into a pair's local difference
+NOISE_QUANTILE = 0.9   # the screen covers most of the frame, so this quantile of the
+NOISE_FACTOR  = 2.0    # local difference is its noise; a change must exceed it twice
+PERSIST_MIN   = 0.5    # fraction of pairs a webcam pixel changes in
+EDGE_LEVEL    = 12     # gray-level step that counts as an edge
+LINE_MIN      = 0.6    # fraction of the box side an overlay border must span
+MIN_AREA      = 0.01   # box area bounds (fraction of the frame)
+MAX_AREA      = 0.35
+ASPECT_RANGE  = (0.5, 2.5)
+
+
+def analysis_frame(frame):
+    """Grayscale, ANALYSIS_W wide."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    h, w = gray.shape
+    return cv2.resize(gray, (ANALYSIS_W, max(1, round(h * ANALYSIS_W / w))), interpolation=cv2.INTER_AREA)
+
+
+def change_persistence(pairs):
+    """Per-pixel fraction of pairs in which the pixel changed beyond noise."""
+    moved = np.zeros(pairs[0][0].shape, np.float32)
+    for a, b in pairs:
+        diff = cv2.blur(cv2.absdiff(a, b).astype(np.float32), (NOISE_WINDOW, NOISE_WINDOW))
+        # 0 for a clean screen, where any change counts
+        floor = NOISE_FACTOR * float(np.quantile(diff, NOISE_QUANTILE))
+        # A 3x3 max keeps single-pixel flicker inside the webcam connected
+        moved += cv2.dilate((diff > floor).astype(np.uint8), np.ones((3, 3), np.uint8))
+    return moved / len(pairs)
+
+
+def _coarse_box(persist, face_points):
+    mask = (persist >= PERSIST_MIN).astype(np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((7, 7), np.uint8))
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if n <= 1:
+        return None
+    label = None
+    for fx, fy in face_points:
+        if 0 <= fy < labels.shape[0] and 0 <= fx < labels.shape[1] and labels[fy, fx] > 0:
+            label = labels[fy, fx]
+            break
+    if label is None:
+        label = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    x, y, w, h = (int(stats[label, k]) for k in (cv2.CC_STAT_LEFT, cv2.CC_STAT_TOP,
+                                                  cv2.CC_STAT_WIDTH, cv2.CC_STAT_HEIGHT))
+    return [x, y, x + w, y + h]
+
+
+def _first_line(score, start, stop):
+    """Box coordinate of the first line (score >= LINE_MIN) scanning from
+    boundary index start towards stop (exclusive), or None. A line between
+    pixels i and i+1 gives coordinate i+1."""
+    step = 1 if stop > start else -1
+    for i in range(start, stop, step):
+        if 0 <= i < len(score) and score[i] >= LINE_MIN:
+            return i + 1
+    return None
+
+
+def _refine(mean, box):
+    """Grow the coarse box side by side to the nearest overlay border line in
+    the time-averaged frame, or to the frame border when there is none."""
+    x0, y0, x1, y1 = box
+    h, w = mean.shape
+    col_score = (np.abs(np.diff(mean, axis=1))[y0:y1] > EDGE_LEVEL).mean(axis=0)
+    row_score = (np.abs(np.diff(mean, axis=0))[:, x0:x1] > EDGE_LEVEL).mean(axis=1)
+    # Scan outward from just inside each coarse side (dilation pads it a little)
+    pad = 3
+    left   = _first_line(col_score, x0 + pad, -1)
+    right  = _first_line(col_score, x1 - 1 - pad, w - 1)
+    top    = _first_line(row_score, y0 + pad, -1)
+    bottom = _first_line(row_score, y1 - 1 - pad, h - 1)
+    return [0 if left is None else left, 0 if top is None else top,
+            w if right is None else right, h if bottom is None else bottom]
+
+
+def find_webcam_box(pairs, faces_list, src_w, src_h):
+    """Webcam overlay box ({"x", "y", "w", "h"} in source pixels) from frame
+    pairs (raw BGR frames PAIR_GAP apart) and the faces seen in the shot, or
+    None when no convincing rectangle is found."""
+    pairs = [(analysis_frame(a), analysis_frame(b)) for a, b in pairs if a is not None and b is not None]
+    if len(pairs) < 2:
+        return None
+    ah, aw = pairs[0][0].shape
+    scale = aw / src_w
+    small_faces = [f for faces in faces_list for f in faces if f["w"] / src_w < 0.25]
+    face_points = [(int(f["cx"] * scale), int(f["cy"] * scale)) for f in small_faces]
+
+    box = _coarse_box(change_persistence(pairs), face_points)
+    if box is None:
+        return None
+    mean = np.mean([a for a, _ in pairs] + [b for _, b in pairs], axis=0, dtype=np.float32)
+    x0, y0, x1, y1 = _refine(mean, box)
+
+    bw, bh = x1 - x0, y1 - y0
+    if bw <= 0 or bh <= 0:
+        return None
+    area = bw * bh / (aw * ah)
+    if not MIN_AREA <= area <= MAX_AREA or not ASPECT_RANGE[0] <= bw / bh <= ASPECT_RANGE[1]:
+        return None
+    if face_points:
+        inside = sum(1 for fx, fy in face_points if x0 <= fx < x1 and y0 <= fy < y1)
+        if inside < len(face_points) / 2:
+            return None
+    to_src = src_w / aw
+    x, y = int(x0 * to_src), int(y0 * to_src)
+    return {"x": x, "y": y,
+            "w": min(src_w - x, int(round(bw * to_src))),
+            "h": min(src_h - y, int(round(bh * to_src)))}
+
+
+def split_runs(sample_times, frame_types, min_samples=2):
+    """(start, end, indices) of runs of consecutive type samples classified
+    as split - the shots a webcam box is found for."""
+    runs, current = [], []
+    for i, ft in enumerate(frame_types):
+        if ft == "split":
+            current.append(i)
+            continue
+        if len(current) >= min_samples:
+            runs.append((sample_times[current[0]], sample_times[current[-1]], current))
+        current = []
+    if len(current) >= min_samples:
+        runs.append((sample_times[current[0]], sample_times[current[-1]], current))
+    return runs
+
+
+def pair_times(start, end, duration):
+    """PAIRS evenly spread pair start times within [start, end]."""
+    last = max(0.0, min(end, duration - PAIR_GAP - 0.05))
+    start = min(start, last)
+    if PAIRS == 1 or last <= start:
+        return [start]
+    return [start + (last - start) * i / (PAIRS - 1) for i in range(PAIRS)]
@@ -0,0 +1,160 @@
+"""
+Everything downstream of face detection for tracked clips: speaker mapping,
+the crop path stages and segment building. smart_crop.py feeds it live
+detections (all at once, or chunk by chunk in long-form mode); replay feeds
+it detections recorded with --dump-detections.
+"""
+
+from smartcrop import log
+from smartcrop.active_speaker import estimate_active_speakers, audio_energy_envelope
+from smartcrop.path import RawCropTracker, CropSmoother, Interpolator, PostSmoother
+from smartcrop.segments import SegmentBuilder, build_payload
+from smartcrop.speakers import SpeakerTimeline, SpeakerMapper
+from smartcrop import trend
+
+
+class CropPipeline:
+    """Speaker mapping → raw crop x → adaptive EMA → eased interpolation →
+    2-pass post-smoothing → segment builder.
+
+    bounded=False keeps the faces of every sample (podcast_dual segments
+    average them); bounded=True drops a sample's faces once the segment
+    builder is past it - frames still in the interpolation/smoothing
+    lookahead or held back in a short run keep theirs, across batches.
+
+    engine="global" replaces EMA, interpolation and post-smoothing with the
+    whole-timeline optimizer in smartcrop/trend.py; it falls back to the
+    chain in bounded mode or without scipy."""
+
+    def __init__(self, geom, diarization_segments, sink, bounded=False, engine="chain"):
+        if engine == "global" and bounded:
+            log("Global path engine needs the whole timeline - using the chain in long-form mode")
+            engine = "chain"
+        elif engine == "global" and not trend.available():
+            log("WARNING: Global path engine needs scipy - using the chain")
+            engine = "chain"
+        self.geom          = geom
+        self.sink          = sink
+        self.bounded       = bounded
+        self.engine        = engine
+        self.mapper        = SpeakerMapper(SpeakerTimeline(diarization_segments), geom.src_w)
+        self.raw_tracker   = RawCropTracker(geom, self.mapper.speaker_at, self.mapper.positions)
+        self.smoother      = CropSmoother(geom)
+        self.interpolator  = Interpolator(geom)
+        self.post_smoother = PostSmoother(geom)
+        self.global_path   = trend.GlobalPath(geom) if engine == "global" else None
+        self.builder       = SegmentBuilder(sink, self.faces_at)
+        self.turns         = []   # active-speaker turns of the latest batch
+        self.samples       = 0
+        self.recent_faces  = {}   # "t" → faces
+
+    def faces_at(self, t):
+        return self.recent_faces.get(f"{t:.2f}", [])
+
+    def set_speakers(self, turns, positions):
+        """Use these speaker turns from now on, with known speaker positions
+        (active-speaker turns come from face tracks, so positions are known
+        up front instead of being assigned by elimination)."""
+        self.turns = turns
+        self.mapper.timeline = SpeakerTimeline(turns)
+        self.mapper.seed(positions)
+
+    def estimate_speakers(self, samples, sample_interval, audio_path=None, prefix="TRACK_"):
+        """Active-speaker turns for samples (mouth motion, gated by audio energy
+        when audio_path is given). Returns (turns, positions, audio_gated)."""
+        audio_env = None
+        if audio_path:
+            try:
+                audio_env = audio_energy_envelope(audio_path, [fd["t"] for fd in samples], sample_interval)
+            except Exception as e:
+                log(f"WARNING: Audio energy envelope failed ({e}) - mouth motion only")
+        turns, positions = estimate_active_speakers(samples, self.geom.src_w, sample_interval,
+                                                    audio_env, prefix=prefix)
+        self.set_speakers(turns, positions)
+        return turns, positions, bool(audio_env)
+
+    def run(self, samples):
+        """Push a batch of tracked samples ({"t", "faces", "frame_type", "pip"})."""
+        for fd in samples:
+            # Use string key to avoid floating point comparison issues
+            self.recent_faces[f"{fd['t']:.2f}"] = fd["faces"]
+
+        # Speaker positions are learned from the whole batch before it is cropped
+        for fd in samples:
+            self.mapper.observe(fd["t"], fd["faces"])
+        for fd in samples:
+            rc = self.raw_tracker.step(fd)
+            if self.global_path is not None:
+                self.global_path.push(rc, fd["faces"])
+                continue
+            coord = self.smoother.step(rc, fd["faces"])
+            for frame in self.interpolator.push(coord):
+                self._post(frame)
+        self.samples += len(samples)
+
+        if self.bounded:
+            horizon = self.builder.horizon()
+            if horizon is not None:
+                self.recent_faces = {k: faces for k, faces in self.recent_faces.items()
+                                     if float(k) >= horizon - 0.005}
+
+    def _post(self, frame):
+        for done in self.post_smoother.push(frame):
+            self.builder.push(done)
+
+    def log_speaker_mapping(self):
+        if self.mapper.learned:
+            for spk, cx in self.mapper.learned.items():
+                log(f"Speaker mapping: {spk} → cx={cx}")
+        else:
+            log("No speaker-face mapping established")
+            # Fallback: diarization exists but no mapping was built (e.g., never
+            # 2+ faces while speaking) - speakers evenly spaced across the frame
+            for spk, cx in self.mapper.fallback.items():
+                log(f"Speaker mapping (fallback): {spk} → cx={cx}")
+
+    def flush(self):
+        """End of the timeline: drain the interpolator and post-smoother."""
+        g = self.geom
+        log(f"Generated {self.samples} crop keyframes")
+        if self.global_path is not None:
+            for frame in self.global_path.flush():
+                self.builder.push(frame)
+            log(f"Solved {self.builder.frames} per-frame coords ({g.fps}fps) with the global path engine")
+            return
+        for frame in self.interpolator.flush():
+            self._post(frame)
+        for done in self.post_smoother.flush():
+            self.builder.push(done)
+        log(f"Interpolated to {self.builder.frames} per-frame coords ({g.fps}fps) with 2-pass post-smoothing (r1={g.post_radius_1}, r2={g.post_radius_2})")
+
+    def finish(self, duration, global_pip_region):
+        """Close the last segment and build the coords JSON payload."""
+        segments = self.builder.finish(duration)
+        return build_payload(segments, self.sink, self.geom, global_pip_region)
+
+    def state(self):
+        return {
+            "mapper":        self.mapper.state(),
+            "turns":         self.turns,
+            "raw":           self.raw_tracker.state(),
+            "smoother":      self.smoother.state(),
+            "interpolator":  self.interpolator.state(),
+            "post_smoother": self.post_smoother.state(),
+            "builder":       self.builder.state(),
+            "samples":       self.samples,
+            "recent_faces":  self.recent_faces,
+        }
+
+    def load_state(self, state):
+        self.mapper.load_state(state["mapper"])
+        if state["turns"]:
+            self.turns = state["turns"]
+            self.mapper.timeline = SpeakerTimeline(self.turns)
+        self.raw_tracker.load_state(state["raw"])
+        self.smoother.load_state(state["smoother"])
+        self.interpolator.load_state(state["interpolator"])
+        self.post_smoother.load_state(state["post_smoother"])
+        self.builder.load_state(state["builder"])
+        self.samples      = state["samples"]
+        self.recent_faces = dict(state["recent_faces"])
@@ -0,0 +1,272 @@
+"""
+Parallel render of mixed-mode coords.
+
+Node renders a mixed clip (clip-generator.service.ts) one segment at a time:
+one ffmpeg run per segment - split, podcast_dual, group, face/no_face with
+crop commands, or the zoom fallback - each libx264 -preset fast -crf 18,
+then a stream-copy concat. A single libx264 encode of a short segment
+keeps only a few cores busy, so on a large host most of that loop is
+waiting.
+
+render() builds the same per-segment ffmpeg arguments and runs them in a
+pool of `workers` jobs, each limited to `threads` decoder/filter/encoder
+threads so the pool doesn't oversubscribe the host (workers * threads ~
+cores). The concat is unchanged. Per-segment timings come back with the
+output path.
+
+  python3 -m smartcrop.render COORDS SOURCE OUT [--size WxH] [--workers N] [--threads T]
+
+Environment: SMART_CROP_RENDER_WORKERS, SMART_CROP_RENDER_THREADS (defaults:
+cores / threads workers, THREADS_PER_JOB threads). Only the primary payload
+of an --aspects result is rendered.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from smartcrop import log
+
+OUTPUT_W, OUTPUT_H = 1080, 1920   # Node's 9:16 output size
+THREADS_PER_JOB    = 4
+NO_FACE_ZOOM       = 1.25         # no_face / missing coords fallback
+MIN_MOVE_PX        = 3            # crop moves below this are not sent
+
+
+def js_num(v):
+    """A number as JavaScript's String() prints it (3.0 → "3")."""
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+def js_round(v):
+    """Math.round - halves round up, unlike round()."""
+    return math.floor(v + 0.5)
+
+
+def encode_args(out_path):
+    return ["-c:v", "libx264", "-preset", "fast", "-crf", "18",
+            "-c:a", "aac", "-b:a", "192k",
+            "-y", out_path]
+
+
+def center_crop_vf(crop_w, crop_h, width, height):
+    return (f"crop={crop_w}:{crop_h}:(in_w-{crop_w})/2:(in_h-{crop_h})/2,"
+            f"scale={width}:{height}:flags=lanczos,format=yuv420p")
+
+
+def crop_commands(coords, start):
+    """sendcmd lines for a face/no_face segment - times relative to the
+    segment, moves under MIN_MOVE_PX dropped, the last position always sent."""
+    adjusted = [{**c, "t": max(0, c["t"] - start)} for c in coords]
+
+    def line(c):
+        t = js_num(c["t"])
+        return (f"{t} crop x {js_num(c['x'])}; {t} crop y {js_num(c['y'])}; "
+                f"{t} crop w {js_num(c['w'])}; {t} crop h {js_num(c['h'])};")
+
+    first  = adjusted[0]
+    lines  = [line(first)]
+    last_x, last_y = first["x"], first["y"]
+    for c in adjusted[1:]:
+        if abs(c["x"] - last_x) >= MIN_MOVE_PX or abs(c["y"] - last_y) >= MIN_MOVE_PX:
+            lines.append(line(c))
+            last_x, last_y = c["x"], c["y"]
+    last = adjusted[-1]
+    if last_x != last["x"] or last_y != last["y"]:
+        lines.append(line(last))
+    return lines, first
+
+
+def segment_job(payload, seg, source, out_path, cmd_path, width=OUTPUT_W, height=OUTPUT_H):
+    """{"args", "commands"} for one segment - the arguments Node passes to
+    ffmpeg for it, and the sendcmd file contents (None when not needed).
+    None for an empty segment, which Node skips."""
+    duration = seg["end"] - seg["start"]
+    if duration <= 0:
+        return None
+    crop_w = payload.get("crop_w") or width
+    crop_h = payload.get("crop_h") or height
+    seek   = ["-ss", js_num(seg["start"]), "-t", js_num(duration), "-i", source]
+    commands = None
+
+    if seg["type"] == "split":
+        info = seg.get("split_info") or payload.get("split_info")
+        if not info:
+            args = [*seek, "-vf", center_crop_vf(crop_w, crop_h, width, height), *encode_args(out_path)]
+        else:
+            pip      = info["pip"]
+            screen   = info["screen"]
+            face_h   = info.get("face_h") or js_round(height * 0.50)
+            screen_h = height - face_h
+            zoom     = info.get("screen_zoom") or 1.25
+            screen_w_crop = js_round(screen["w"] / zoom)
+            screen_h_crop = js_round(screen["h"] / zoom)
+            screen_x      = max(0, js_round(screen["x"] + screen["w"] / 2 - screen_w_crop / 2))
+            args = [*seek, "-filter_complex",
+                    f"[0:v]crop={pip['w']}:{pip['h']}:{pip['x']}:{pip['y']},scale={width}:{face_h}:flags=lanczos[face];"
+                    f"[0:v]crop={screen_w_crop}:{screen_h_crop}:{screen_x}:{screen['y']},"
+                    f"scale={width}:{screen_h}:flags=lanczos[screen];"
+                    f"[screen][face]vstack=inputs=2,format=yuv420p[out]",
+                    "-map", "[out]", "-map", "0:a?", *encode_args(out_path)]
+    elif seg["type"] == "podcast_dual":
+        dual = seg.get("dual_crop") or {}
+        if dual.get("left_crop") and dual.get("right_crop"):
+            lc, rc = dual["left_crop"], dual["right_crop"]
+            half_h = js_round(height / 2)
+            args = [*seek, "-filter_complex",
+                    f"[0:v]crop={lc['w']}:{lc['h']}:{lc['x']}:{lc['y']},scale={width}:{half_h}:flags=lanczos[top];"
+                    f"[0:v]crop={rc['w']}:{rc['h']}:{rc['x']}:{rc['y']},scale={width}:{half_h}:flags=lanczos[bot];"
+                    f"[top][bot]vstack=inputs=2,format=yuv420p[out]",
+                    "-map", "[out]", "-map", "0:a?", *encode_args(out_path)]
+        else:
+            args = [*seek, "-vf", center_crop_vf(crop_w, crop_h, width, height), *encode_args(out_path)]
+    elif seg["type"] == "group":
+        args = [*seek, "-vf", f"scale={width}:-2:flags=lanczos,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black,"
+                              f"setsar=1,format=yuv420p", *encode_args(out_path)]
+    elif seg["type"] in ("face", "no_face") and seg.get("coords"):
+        commands, first = crop_commands(seg["coords"], seg["start"])
+        args = [*seek, "-vf", f"sendcmd=f={cmd_path},crop={js_num(first['w'])}:{js_num(first['h'])},"
+                              f"scale={width}:{height}:flags=lanczos", *encode_args(out_path)]
+    else:
+        z = js_num(NO_FACE_ZOOM)
+        args = [*seek, "-vf", f"crop=in_w/{z}:in_h/{z}:(in_w-in_w/{z})/2:(in_h-in_h/{z})/2,"
+                              f"scale={width}:{height}:flags=lanczos,format=yuv420p", *encode_args(out_path)]
+    return {"args": args, "commands": commands}
+
+
+def with_threads(args, threads):
+    """Node's arguments with the decoder, filter graph and encoder limited
+    to threads each."""
+    limit = ["-threads", str(threads)]
+    i = args.index("-i")
+    o = args.index("-c:v")
+    return [*args[:i], *limit, "-filter_threads", str(threads), *args[i:o], *limit, *args[o:]]
+
+
+def pool_size(n_jobs, workers=None, threads=None):
+    """(workers, threads per job) for n_jobs segments on this host."""
+    cores   = os.cpu_count() or 1
+    threads = threads or int(os.environ.get("SMART_CROP_RENDER_THREADS") or THREADS_PER_JOB)
+    workers = workers or int(os.environ.get("SMART_CROP_RENDER_WORKERS") or 0) or max(1, cores // threads)
+    return max(1, min(workers, n_jobs)), max(1, threads)
+
+
+def run_ffmpeg(args):
+    proc = subprocess.run(["ffmpeg", *args], stdin=subprocess.DEVNULL, capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode(errors="replace")[-300:])
+
+
+def render(payload, source, out_path, width=OUTPUT_W, height=OUTPUT_H, workers=None, threads=None):
+    """Render a mixed-mode payload of source into out_path. Returns
+    {"output", "workers", "threads", "segments": [timings], "render_sec",
+    "concat_sec", "wall_sec"}. Raises RuntimeError when a segment or the
+    concat fails, ValueError for a payload that isn't mixed."""
+    if payload.get("mode") != "mixed" or not payload.get("segments"):
+        raise ValueError(f"not a mixed-mode payload (mode={payload.get('mode')})")
+    started  = time.time()
+    work_dir = tempfile.mkdtemp(prefix="smart_crop_render_")
+    try:
+        jobs = []
+        for i, seg in enumerate(payload["segments"]):
+            seg_path = os.path.join(work_dir, f"seg-{i}.mp4")
+            cmd_path = os.path.join(work_dir, f"seg-cmds-{i}.txt")
+            job = segment_job(payload, seg, source, seg_path, cmd_path, width, height)
+            if job is None:
+                continue
+            if job["commands"] is not None:
+                with open(cmd_path, "w") as f:
+                    f.write("\n".join(job["commands"]))
+            jobs.append({**job, "index": i, "type": seg["type"], "start": seg["start"], "end": seg["end"],
+                         "path": seg_path})
+        if not jobs:
+            raise ValueError("no segment to render")
+        workers, threads = pool_size(len(jobs), workers, threads)
+        log(f"Render: {len(jobs)} segments, {workers} workers x {threads} threads")
+
+        def run_job(job):
+            began = time.time()
+            try:
+                run_ffmpeg(with_threads(job["args"], threads))
+            except RuntimeError as e:
+                raise RuntimeError(f"FFmpeg seg {job['index']} failed: {e}")
+            ended = time.time()
+            log(f"  segment {job['index']} ({job['type']}, {job['end'] - job['start']:.1f}s) in {ended - began:.1f}s")
+            return {"index": job["index"], "type": job["type"], "start": job["start"], "end": job["end"],
+                    "queued_sec": round(began - render_started, 3), "render_sec": round(ended - began, 3)}
+
+        render_started = time.time()
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            futures = [pool.submit(run_job, job) for job in jobs]
+            try:
+                timings = [f.result() for f in futures]
+            except BaseException:
+                for f in futures:
+                    f.cancel()
+                raise
+        render_sec = time.time() - render_started
+
+        concat_started = time.time()
+        concat_path = os.path.join(work_dir, "concat.txt")
+        with open(concat_path, "w") as f:
+            f.write("\n".join(f"file '{job['path']}'" for job in jobs))
+        try:
+            run_ffmpeg(["-f", "concat", "-safe", "0", "-i", concat_path, "-c", "copy", "-y", out_path])
+        except RuntimeError as e:
+            raise RuntimeError(f"FFmpeg concat failed: {e}")
+        concat_sec = time.time() - concat_started
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    result = {"output": out_path, "workers": workers, "threads": threads, "segments": timings,
+              "render_sec": round(render_sec, 3), "concat_sec": round(concat_sec, 3),
+              "wall_sec": round(time.time() - started, 3)}
+    log(f"Render done in {result['wall_sec']:.1f}s (segments {render_sec:.1f}s, "
+        f"sum {sum(t['render_sec'] for t in timings):.1f}s; concat {concat_sec:.1f}s) → {out_path}")
+    return result
+
+
+def parse_size(text):
+    w, sep, h = text.lower().partition("x")
+    try:
+        size = int(w), int(h)
+    except ValueError:
+        size = None
+    if not sep or size is None or min(size) <= 0:
+        raise argparse.ArgumentTypeError(f"expected WxH, got {text!r}")
+    return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m smartcrop.render",
+                                     description="Render mixed-mode smart crop coords in parallel.")
+    parser.add_argument("coords")
+    parser.add_argument("source")
+    parser.add_argument("out")
+    parser.add_argument("--size", type=parse_size, default=(OUTPUT_W, OUTPUT_H), metavar="WxH",
+                        help=f"output size (default {OUTPUT_W}x{OUTPUT_H})")
+    parser.add_argument("--workers", type=int, help="concurrent segment renders (default: cores / threads)")
+    parser.add_argument("--threads", type=int, help=f"threads per render (default {THREADS_PER_JOB})")
+    args = parser.parse_args(argv)
+
+    with open(args.coords) as f:
+        payload = json.load(f)
+    try:
+        result = render(payload, args.source, args.out, *args.size, args.workers, args.threads)
+    except (ValueError, RuntimeError) as e:
+        log(f"ERROR: {e}")
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Replay recorded detections through everything downstream of the detector.
+
+smart_crop.py --dump-detections PATH records the type-detection samples,
+the measured webcam boxes, the static-shot frame differences, the
+per-sample tracking detections and the speaker turns. Replaying a dump
+runs video-type classification, the static layouts, speaker mapping, crop
+x/y, EMA, interpolation, post-smoothing and segment building - in
+milliseconds, without the video, cv2 or mediapipe. Use it to try smoothing
+thresholds against real footage, or as a regression harness (same dump +
+same code = byte-identical coords JSON).
+
+  python3 -m smartcrop.replay DUMP [OUT] [--set NAME=VALUE ...] [--path-engine chain|global]
+
+--set overrides a CropGeometry threshold (dead_zone, move_zone, snap_zone,
+y_dead_zone, y_move_zone, y_snap_zone, post_radius_1, post_radius_2,
+post_passes) or one
+of MIN_SEG_DURATION / VELOCITY_WINDOW. Dumps of long-form runs are replayed
+as a single batch, so speaker mapping can differ slightly from the run.
+--path-engine replays with the other crop path engine (smartcrop/trend.py).
+A dump of an --aspects run replays every aspect (smartcrop/aspects.py).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from smartcrop import log
+from smartcrop import path as crop_path
+from smartcrop import aspects
+from smartcrop import segments
+from smartcrop.layout import classify_video, detect_pip_region, default_pip_region
+from smartcrop.budget import PRESETS
+
+DUMP_VERSION = 1
+
+GEOMETRY_PARAMS = ("dead_zone", "move_zone", "snap_zone", "y_dead_zone", "y_move_zone",
+                   "y_snap_zone", "post_radius_1", "post_radius_2", "post_passes")
+MODULE_PARAMS   = {"MIN_SEG_DURATION": segments, "VELOCITY_WINDOW": crop_path}
+
+
+def write_dump(path, dump):
+    """Write a dump atomically. frame_data may be a LazyList (long-form)."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        segments.write_json(f, {"version": DUMP_VERSION, **dump})
+    os.replace(tmp, path)
+
+
+def load_dump(path):
+    with open(path) as f:
+        dump = json.load(f)
+    if dump.get("version") != DUMP_VERSION:
+        raise ValueError(f"unsupported dump version {dump.get('version')!r} (expected {DUMP_VERSION})")
+    return dump
+
+
+def apply_overrides(geom, overrides):
+    for name, value in overrides.items():
+        if name in GEOMETRY_PARAMS:
+            setattr(geom, name, type(getattr(geom, name))(value))
+        elif name in MODULE_PARAMS:
+            module = MODULE_PARAMS[name]
+            setattr(module, name, type(getattr(module, name))(value))
+        else:
+            raise ValueError(f"unknown parameter {name!r}")
+        log(f"Override: {name}={value}")
+
+
+def replay(dump, overrides=None, engine=None):
+    """Run the downstream stages over a dump. Returns the coords JSON payload
+    (coords may be LazyLists - write with segments.write_json). engine
+    overrides the recorded --path-engine. Every aspect the run asked for
+    (--aspects) is produced."""
+    src_w, src_h, fps = dump["src_w"], dump["src_h"], dump["fps"]
+    options      = dump.get("options", {})
+    aspect_list  = aspects.parse(",".join(options.get("aspects") or [aspects.name(aspects.DEFAULT)]))
+    sample_faces = dump["sample_faces"]
+    post_passes  = PRESETS[options.get("preset", "balanced")]["post_passes"]
+    geoms = [aspects.geometry(src_w, src_h, fps, aspect, post_passes) for aspect in aspect_list]
+    for geom in geoms:
+        apply_overrides(geom, overrides or {})
+
+    video_type = classify_video(sample_faces, dump["n_type_samples"], src_w, src_h)
+    found = [b for b in dump.get("webcam_boxes", []) if b["box"]]
+    webcam_box = max(found, key=lambda b: b["end"] - b["start"])["box"] if found else None
+    static = [aspects.static_payload(video_type, sample_faces, dump["n_type_samples"], dump.get("sample_times"),
+                                     dump.get("static_shot"), webcam_box, geom)[0] for geom in geoms]
+    if all(p is not None for p in static):
+        return aspects.attach(static[0], aspect_list, static[1:])
+
+    frame_data = dump.get("frame_data")
+    if frame_data is None:
+        raise ValueError("dump has no tracking detections - the recorded run ended in a static layout")
+
+    log(f"Smoothing thresholds (scaled to {src_w}px): DEAD={geoms[0].dead_zone}, MOVE={geoms[0].move_zone}, SNAP={geoms[0].snap_zone}")
+
+    global_pip_region = (webcam_box or detect_pip_region(sample_faces, src_w, src_h)
+                         or default_pip_region(src_w, src_h))
+    engine = engine or options.get("path_engine", "chain")
+    # Aspects with a static layout keep it; the others are tracked
+    payloads = [layout if layout is not None else
+                aspects.tracked_payload(geom, frame_data, dump["diarization"], dump["speaker_seed"],
+                                        dump["duration"], global_pip_region, engine)
+                for geom, layout in zip(geoms, static)]
+    return aspects.attach(payloads[0], aspect_list, payloads[1:])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m smartcrop.replay",
+                                     description="Replay a --dump-detections file through the crop pipeline.")
+    parser.add_argument("dump")
+    parser.add_argument("out", nargs="?", help="coords JSON output (default: summary only)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a threshold, e.g. --set dead_zone=80")
+    parser.add_argument("--path-engine", choices=("chain", "global"),
+                        help="crop path engine (default: the one the dump was recorded with)")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.set:
+        name, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--set expects NAME=VALUE, got {item!r}")
+        overrides[name] = value
+
+    started = time.time()
+    payload = replay(load_dump(args.dump), overrides, args.path_engine)
+    if args.out:
+        with open(args.out, "w") as f:
+            segments.write_json(f, payload)
+    log(f"Replay done in {(time.time() - started) * 1000:.0f}ms: mode={payload['mode']}"
+        + (f", {len(payload['segments'])} segments" if payload["mode"] == "mixed" else ""))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+"""
+Segment building for per-frame tracking output.
+
+Finished per-frame coords are grouped into typed segments (split, face,
+podcast_dual, group, no_face); segments shorter than MIN_SEG_DURATION are
+merged into their predecessor. SegmentBuilder does this as a stream: a run of
+frames is only buffered until it is known to stand on its own (MIN_SEG_DURATION
+long), so memory stays bounded. Frames go to a sink - a list for normal clips,
+a spool file for long-form runs - and the coords JSON is streamed from it.
+
+snap_to_keyframes() moves the boundaries of a finished mixed payload onto
+source keyframes (--keyframe-snap) and adds a "render" hint per segment.
+"""
+
+import bisect
+import json
+
+from smartcrop import log
+from smartcrop.layout import build_split_info, dual_crops
+
+MIN_SEG_DURATION = 1.5
+MIN_SNAPPED_SEC  = 0.5   # a snapped boundary never leaves a segment shorter than this
+STATIC_MOVE_PX   = 3     # crop moves below this are dropped by Node (MIN_MOVE_PX)
+
+
+def get_seg_type(fc):
+    """Classify a frame into a segment type: split, face, podcast_dual, group, no_face"""
+    ft = fc.get("frame_type", "face" if fc.get("face") else "no_face")
+    if ft == "split":
+        return "split"
+    elif ft == "podcast_dual":
+        return "podcast_dual"
+    elif ft == "group":
+        return "group"
+    elif fc.get("face"):
+        return "face"
+    else:
+        return "no_face"
+
+
+def clean_coord(fc):
+    """Strip internal fields - Node only reads t/x/y/w/h."""
+    return {k: v for k, v in fc.items() if k not in ("face", "frame_type", "pip")}
+
+
+class MemorySink:
+    """Frame coords held in a list (normal clips)."""
+
+    def __init__(self):
+        self.frames = []
+
+    def mark(self):
+        return len(self.frames)
+
+    def append(self, coord):
+        self.frames.append(coord)
+
+    def read(self, mark, count):
+        return self.frames[mark:mark + count]
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class SpoolSink:
+    """Frame coords appended to a JSON-lines spool file (long-form runs).
+    Marks are byte offsets, so reading a segment back never scans the file."""
+
+    def __init__(self, path, resume_size=None):
+        self.path = path
+        if resume_size is None:
+            open(path, "w").close()
+        else:
+            # Drop anything written after the checkpoint we resume from
+            with open(path, "r+") as f:
+                f.truncate(resume_size)
+        self._f = open(path, "a")
+        self.count = 0
+
+    def mark(self):
+        return self._f.tell()
+
+    def append(self, coord):
+        self._f.write(json.dumps(coord) + "\n")
+        self.count += 1
+
+    def size(self):
+        self._f.flush()
+        return self._f.tell()
+
+    def read(self, mark, count):
+        self._f.flush()
+        with open(self.path) as f:
+            f.seek(mark)
+            for _ in range(count):
+                yield json.loads(f.readline())
+
+    def close(self):
+        self._f.close()
+
+    def __len__(self):
+        return self.count
+
+
+class SegmentBuilder:
+    """Streams finished frames into merged segments.
+
+    faces_at(t) returns the detections sampled at t (or []) - used to average
+    the speaker positions of podcast_dual segments."""
+
+    def __init__(self, sink, faces_at):
+        self.sink     = sink
+        self.faces_at = faces_at
+        self.segments = []    # merged segments: metadata + sink mark, no frames
+        self.run      = None  # current run of same-type frames
+        self.frames   = 0     # frames pushed so far
+        self.last_t   = None  # time of the latest frame pushed
+
+    def horizon(self):
+        """Earliest time faces_at can still be asked for (None before the
+        first frame): the oldest frame held back in a short run, else the
+        latest frame pushed."""
+        if self.run is not None and self.run["pending"]:
+            return self.run["pending"][0]["t"]
+        return self.last_t
+
+    def push(self, fc):
+        self.frames += 1
+        self.last_t  = fc["t"]
+        seg_type = get_seg_type(fc)
+        run = self.run
+        if run is not None and seg_type != run["type"]:
+            self._close_run(fc["t"])
+            run = None
+        if run is None:
+            run = self.run = {"type": seg_type, "start": fc["t"], "pending": [], "committed": False}
+        if run["committed"]:
+            self._add_frame(fc)
+        else:
+            run["pending"].append(fc)
+            # A run that already spans MIN_SEG_DURATION can never be merged away,
+            # and the first run always opens a segment - stop buffering it.
+            if not self.segments or fc["t"] - run["start"] >= MIN_SEG_DURATION:
+                self._open_segment(run["type"], run["start"], fc["t"])
+                for pending in run["pending"]:
+                    self._add_frame(pending)
+                run["pending"]   = []
+                run["committed"] = True
+
+    def finish(self, duration):
+        if self.run is not None:
+            self._close_run(round(duration, 4))
+            self.run = None
+        return self.segments
+
+    def _close_run(self, end):
+        run = self.run
+        if run["committed"]:
+            self.segments[-1]["end"] = end
+        elif self.segments and end - run["start"] < MIN_SEG_DURATION:
+            # Merge short segments into their neighbors
+            self.segments[-1]["end"] = end
+            for pending in run["pending"]:
+                self._add_frame(pending)
+        else:
+            self._open_segment(run["type"], run["start"], end)
+            for pending in run["pending"]:
+                self._add_frame(pending)
+
+    def _open_segment(self, seg_type, start, end):
+        self.segments.append({"type": seg_type, "start": start, "end": end,
+                              "mark": self.sink.mark(), "count": 0,
+                              "pip": None, "dual": [0, 0, 0, 0, 0]})
+
+    def _add_frame(self, fc):
+        seg = self.segments[-1]
+        seg["count"] += 1
+        if seg["pip"] is None and fc.get("pip"):
+            seg["pip"] = fc["pip"]
+        if seg["type"] == "podcast_dual":
+            faces_at_t = self.faces_at(fc["t"])
+            if len(faces_at_t) >= 2:
+                sf = sorted(faces_at_t, key=lambda f: f["cx"])
+                dual = seg["dual"]
+                dual[0] += sf[0]["cx"]
+                dual[1] += sf[0]["cy"]
+                dual[2] += sf[1]["cx"]
+                dual[3] += sf[1]["cy"]
+                dual[4] += 1
+        self.sink.append(clean_coord(fc))
+
+    def state(self):
+        return {"segments": self.segments, "run": self.run, "frames": self.frames, "last_t": self.last_t}
+
+    def load_state(self, state):
+        self.segments = state["segments"]
+        self.run      = state["run"]
+        self.frames   = state["frames"]
+        self.last_t   = state.get("last_t")
+
+
+class LazyList:
+    """A JSON array whose items are produced while writing (see write_json)."""
+
+    def __init__(self, produce):
+        self.produce = produce
+
+    def __iter__(self):
+        return iter(self.produce())
+
+
+def write_json(f, obj):
+    """json.dump-compatible writer that streams LazyList items instead of
+    materializing them. Output is byte-identical to json.dump()."""
+    if isinstance(obj, dict):
+        f.write("{")
+        for i, (k, v) in enumerate(obj.items()):
+            if i:
+                f.write(", ")
+            f.write(json.dumps(str(k)) + ": ")
+            write_json(f, v)
+        f.write("}")
+    elif isinstance(obj, (list, LazyList)):
+        f.write("[")
+        for i, item in enumerate(obj):
+            if i:
+                f.write(", ")
+            write_json(f, item)
+        f.write("]")
+    else:
+        f.write(json.dumps(obj))
+
+
+def build_payload(segments, sink, geom, global_pip_region):
+    """Decide the output mode from the segment types and build the coords JSON
+    payload. Coords are LazyLists reading from the sink."""
+    src_w, src_h, crop_w, crop_h = geom.src_w, geom.src_h, geom.crop_w, geom.crop_h
+    log(f"Segments after merge: {len(segments)} (min_dur={MIN_SEG_DURATION}s)")
+
+    for seg in segments:
+        log(f"  segment: type={seg['type']}, start={seg['start']:.2f}, end={seg['end']:.2f}, frames={seg['count']}")
+
+    # Determine output mode based on segment types present
+    seg_types = set(s["type"] for s in segments)
+    has_face         = "face" in seg_types
+    has_no_face      = "no_face" in seg_types
+    has_split        = "split" in seg_types
+    has_podcast_dual = "podcast_dual" in seg_types
+    is_mixed         = len(seg_types) > 1 or has_split or has_podcast_dual
+
+    # Build split info for split segments
+    split_info = build_split_info(global_pip_region, src_w, src_h, crop_w)
+
+    for seg in segments:
+        if seg["type"] == "split":
+            # Use the first specific PiP detection in this segment, if any
+            if seg["pip"]:
+                seg["split_info"] = build_split_info(seg["pip"], src_w, src_h, crop_w)
+            else:
+                seg["split_info"] = split_info
+        elif seg["type"] == "podcast_dual":
+            # Static left/right crops from the faces detected in the segment's frames
+            n = seg["dual"][4]
+            if n:
+                avg = [int(v / n) for v in seg["dual"][:4]]
+                seg["dual_crop"] = dual_crops(avg[0], avg[1], avg[2], avg[3], src_w, src_h, geom.aspect)
+            else:
+                # No valid dual faces found in this segment — downgrade to face
+                seg["type"] = "face"
+
+    def seg_coords(seg):
+        return LazyList(lambda: sink.read(seg["mark"], seg["count"]))
+
+    if is_mixed or (has_face and has_no_face):
+        # Mixed mode: multiple segment types — TS side will render each segment
+        # separately and concat them
+        clean_segments = []
+        for seg in segments:
+            clean_seg = {
+                "type": seg["type"],
+                "start": seg["start"],
+                "end": seg["end"],
+            }
+            if seg["type"] == "split":
+                clean_seg["split_info"] = seg.get("split_info", split_info)
+            if seg["type"] == "podcast_dual":
+                clean_seg["dual_crop"] = seg.get("dual_crop")
+            if seg["type"] in ("face", "no_face"):
+                clean_seg["coords"] = seg_coords(seg)
+            clean_segments.append(clean_seg)
+        return {
+            "mode": "mixed",
+            "segments": clean_segments,
+            "crop_w": crop_w,
+            "crop_h": crop_h,
+            "src_w": src_w,
+            "src_h": src_h,
+            "split_info": split_info,
+        }
+    elif has_face:
+        return {"mode": "crop", "coords": all_coords(sink, segments)}
+    elif has_split:
+        # All split — use static split mode
+        return {"mode": "split", **split_info}
+    else:
+        return {"mode": "skip"}
+
+
+def all_coords(sink, segments):
+    """Every frame coord in timeline order (segments are contiguous in the sink)."""
+    if not segments:
+        return []
+    total = sum(s["count"] for s in segments)
+    return LazyList(lambda: sink.read(segments[0]["mark"], total))
+
+
+def nearest_keyframe(keyframes, t, tolerance):
+    """The keyframe closest to t within tolerance, or None."""
+    i = bisect.bisect_left(keyframes, t)
+    near = [k for k in keyframes[max(0, i - 1):i + 1] if abs(k - t) <= tolerance]
+    return min(near, key=lambda k: abs(k - t)) if near else None
+
+
+def coords_between(sources, start, end):
+    """The coords of sources in [start, end) - a segment whose start moved
+    onto a keyframe also takes its neighbour's coords up to the new boundary.
+    The first one is held from start when the segment begins without coords."""
+    def produce():
+        first = True
+        for coords in sources:
+            for c in coords:
+                if not start <= c["t"] < end:
+                    continue
+                if first and c["t"] > start:
+                    yield {**c, "t": start}
+                first = False
+                yield c
+    return LazyList(produce)
+
+
+def is_static(seg):
+    """Whether the segment renders with one fixed crop or layout (no
+    per-frame crop commands)."""
+    if seg["type"] in ("split", "podcast_dual", "group"):
+        return True
+    first = None
+    for c in seg.get("coords") or []:
+        if first is None:
+            first = c
+        elif (abs(c["x"] - first["x"]) >= STATIC_MOVE_PX or abs(c["y"] - first["y"]) >= STATIC_MOVE_PX
+              or c["w"] != first["w"] or c["h"] != first["h"]):
+            return False
+    return True
+
+
+def snap_to_keyframes(payload, keyframes, tolerance, fps):
+    """Move the boundaries of a mixed payload onto keyframes (sorted times)
+    within tolerance seconds and add per segment
+
+      "render": {"keyframe_start": bool, "static": bool}
+
+    keyframe_start: the segment starts on a keyframe (or at 0), so a fast
+    input seek lands exactly on it. static: one crop or layout for the whole
+    segment. Returns the number of boundaries moved."""
+    segs   = payload["segments"]
+    spans  = [(seg["start"], seg["end"]) for seg in segs]
+    coords = [seg.get("coords") for seg in segs]
+    moved  = 0
+    for prev, seg in zip(segs, segs[1:]):
+        k = nearest_keyframe(keyframes, seg["start"], tolerance)
+        if k is None or k == seg["start"]:
+            continue
+        if k - prev["start"] < MIN_SNAPPED_SEC or seg["end"] - k < MIN_SNAPPED_SEC:
+            continue
+        prev["end"] = seg["start"] = round(k, 4)
+        moved += 1
+
+    half_frame = 0.5 / fps if fps > 0 else 0.001
+    for i, seg in enumerate(segs):
+        if coords[i] is not None and (seg["start"], seg["end"]) != spans[i]:
+            sources = [coords[i]]
+            if i > 0 and seg["start"] < spans[i][0] and coords[i - 1] is not None:
+                sources.insert(0, coords[i - 1])
+            if i + 1 < len(segs) and seg["end"] > spans[i][1] and coords[i + 1] is not None:
+                sources.append(coords[i + 1])
+            seg["coords"] = coords_between(sources, seg["start"], seg["end"])
+        k = nearest_keyframe(keyframes, seg["start"], half_frame)
+        seg["render"] = {"keyframe_start": seg["start"] == 0 or k is not None, "static": is_static(seg)}
+    return moved
@@ -0,0 +1,176 @@
+"""
+Shard-and-merge for sources too long for one machine.
+
+Each shard analyses one time range of the full source and writes a shard
+artifact instead of coords:
+
+  python3 smart_crop.py SOURCE ep42-s0 /tmp --analyze-range 0 1800      → /tmp/ep42-s0_shard.json
+  python3 smart_crop.py SOURCE ep42-s1 /tmp --analyze-range 1800 3600   → /tmp/ep42-s1_shard.json
+
+A shard is a detection dump (smartcrop/replay.py) of the type and tracking
+samples inside its range - taken on the same sample grid a single run of the
+whole source uses - plus the diarization of its audio, the range and the
+tracker state at its edges. Nothing range-local is decided in a shard: the
+merge sees the whole source.
+
+  python3 -m smartcrop.shards merge OUT.json SHARD.json [SHARD.json ...] [--set NAME=VALUE ...]
+
+orders the shards, checks that they tile the source, concatenates their
+samples, re-runs face identity matching across each boundary, namespaces
+speaker labels per shard (SPEAKER_00 of two pyannote runs are not the same
+person - "S1:SPEAKER_00") and replays the result through classification, the
+static layouts and one continuous crop pipeline. EMA, interpolation and
+post-smoothing run straight across shard boundaries, so the coords are the
+ones a single run over the same detections produces. Shards decode the
+original rather than each encoding a proxy of the whole source, so against a
+single run that used a proxy, detections agree to detector noise.
+
+A shard whose run fell back (or found the source already portrait) records
+that payload instead of detections, and the merge returns it.
+
+  python3 -m smartcrop.shards plan DURATION N
+
+prints N contiguous [start, end] ranges to hand out to the fleet.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from smartcrop import log
+from smartcrop import replay
+from smartcrop import segments
+from smartcrop.layout import match_faces_across_frames
+
+RANGE_TOLERANCE = 1e-3   # seconds - adjacent ranges must meet this closely
+SHARED_KEYS     = ("src_w", "src_h", "fps", "duration", "sample_interval", "options")
+
+
+def write_payload(path, time_range, payload):
+    """Shard artifact carrying a final answer (fallback, portrait source)."""
+    replay.write_dump(path, {"range": list(time_range), "payload": payload})
+
+
+def plan(duration, n):
+    """n contiguous ranges covering [0, duration], cut at whole seconds."""
+    bounds = [0.0] + [float(round(duration * i / n)) for i in range(1, n)] + [float(duration)]
+    return [[a, b] for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def check_tiling(shards):
+    """Log gaps and overlaps between consecutive (sorted) shards."""
+    duration = shards[0]["duration"]
+    if shards[0]["range"][0] > RANGE_TOLERANCE:
+        log(f"WARNING: shards start at {shards[0]['range'][0]:.2f}s - nothing analysed before it")
+    for a, b in zip(shards, shards[1:]):
+        gap = b["range"][0] - a["range"][1]
+        if abs(gap) > RANGE_TOLERANCE:
+            kind = "gap" if gap > 0 else "overlap"
+            log(f"WARNING: {kind} of {abs(gap):.2f}s between shards at {a['range'][1]:.2f}s")
+        # The next sample the previous shard would have taken is the first one of the next
+        next_t, first_t = a["edges"]["end"]["next_t"], b["edges"]["start"]["t"]
+        if abs(next_t - first_t) > a["sample_interval"] / 2:
+            log(f"WARNING: sample grids don't line up at {a['range'][1]:.2f}s "
+                f"(next sample {next_t:.2f}s, shard starts at {first_t:.2f}s)")
+    if shards[-1]["range"][1] < duration - RANGE_TOLERANCE:
+        log(f"WARNING: shards end at {shards[-1]['range'][1]:.2f}s of {duration:.2f}s")
+
+
+def merge_dumps(shards):
+    """One dump of the whole source from shard dumps (any order). Returns
+    (dump, None), or (None, payload) when a shard carries a final payload."""
+    if not shards:
+        raise ValueError("no shards to merge")
+    shards = sorted(shards, key=lambda d: d["range"][0])
+    for d in shards:
+        if "payload" in d:
+            log(f"Shard {d['range'][0]:.1f}s-{d['range'][1]:.1f}s ended with mode={d['payload'].get('mode')} - using it")
+            return None, d["payload"]
+    for key in SHARED_KEYS:
+        values = {json.dumps(d.get(key), sort_keys=True) for d in shards}
+        if len(values) > 1:
+            raise ValueError(f"shards disagree on {key}: {sorted(values)}")
+    check_tiling(shards)
+
+    merged = {key: shards[0][key] for key in SHARED_KEYS}
+    merged.update({"n_type_samples": 0, "sample_faces": [], "sample_times": [], "webcam_boxes": [],
+                   "frame_data": [], "diarization": [], "speaker_seed": {}})
+    static = all(d.get("static_shot") is not None for d in shards)
+    merged["static_shot"] = {"diffs": [], "cuts": []} if static else None
+
+    prev_faces = []
+    last_t     = float("-inf")
+    for k, d in enumerate(shards):
+        ns = f"S{k}:"
+        merged["n_type_samples"] += d["n_type_samples"]
+        merged["sample_faces"].extend(d["sample_faces"])
+        merged["sample_times"].extend(d["sample_times"])
+        merged["webcam_boxes"].extend(d.get("webcam_boxes", []))
+        if static:
+            # A shard's diffs[0] (and any cut there) compares it with the
+            # previous shard's last sample; only the first shard's is None
+            merged["static_shot"]["diffs"].extend(d["static_shot"]["diffs"])
+            merged["static_shot"]["cuts"].extend(d["static_shot"]["cuts"])
+        for fd in d["frame_data"] or []:
+            if fd["t"] <= last_t:
+                continue   # overlapping ranges: the earlier shard's sample wins
+            fd["faces"] = match_faces_across_frames(prev_faces, fd["faces"])
+            merged["frame_data"].append(fd)
+            prev_faces = fd["faces"]
+            last_t     = fd["t"]
+        merged["diarization"].extend({**seg, "speaker": ns + seg["speaker"]} for seg in d["diarization"])
+        merged["speaker_seed"].update({ns + spk: pos for spk, pos in (d.get("speaker_seed") or {}).items()})
+
+    log(f"Merged {len(shards)} shards: {len(merged['sample_faces'])} type samples, "
+        f"{len(merged['frame_data'])} tracking samples, {len(merged['diarization'])} speaker turns")
+    return merged, None
+
+
+def merge(paths, overrides=None):
+    """Coords JSON payload for the whole source from shard artifact paths."""
+    dump, payload = merge_dumps([replay.load_dump(p) for p in paths])
+    if payload is not None:
+        return payload
+    return replay.replay(dump, overrides)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m smartcrop.shards",
+                                     description="Merge smart_crop.py --analyze-range shards.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    merge_parser = sub.add_parser("merge", help="stitch shards into one coords JSON")
+    merge_parser.add_argument("out")
+    merge_parser.add_argument("shards", nargs="+")
+    merge_parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                              help="override a threshold, as in smartcrop.replay")
+    plan_parser = sub.add_parser("plan", help="print N contiguous ranges for a source")
+    plan_parser.add_argument("duration", type=float)
+    plan_parser.add_argument("n", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        print(json.dumps(plan(args.duration, max(1, args.n))))
+        return 0
+
+    overrides = {}
+    for item in args.set:
+        name, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--set expects NAME=VALUE, got {item!r}")
+        overrides[name] = value
+
+    started = time.time()
+    payload = merge(args.shards, overrides)
+    tmp = args.out + ".tmp"
+    with open(tmp, "w") as f:
+        segments.write_json(f, payload)
+    os.replace(tmp, args.out)
+    log(f"Merge done in {time.time() - started:.1f}s: mode={payload['mode']}"
+        + (f", {len(payload['segments'])} segments" if payload["mode"] == "mixed" else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Static-camera fast path for locked-off shots.
+
+A single-camera podcast shot never needs the crop to move, yet tracking
+samples it 5-10 times a second, smooths, interpolates every frame and
+post-smooths twice to arrive at a constant. Type detection already has one
+frame per second; a 64px grayscale thumbnail of each is enough to tell:
+
+  - cuts: a jump in mean thumbnail difference between consecutive samples
+    (CUT_LEVEL), located to the frame by bisecting the gap with a few decodes
+  - a still camera: within each shot the typical difference stays low
+    (STILL_LEVEL) - pans, zooms and handheld footage fail this
+  - a still subject: one face in most samples of the shot, all within the
+    tracker's dead zone of its median position
+
+When every shot passes, each gets one crop window placed exactly as the
+tracker would for that face. One window (or identical windows) gives
+
+  {"mode": "static_crop", "x": 656, "y": 0, "w": 607, "h": 1080, "src_w": ..., "src_h": ...}
+
+which Node renders with a plain crop filter; windows that differ per shot
+give a "crop" payload with one keyframe per shot start, so sendcmd switches
+exactly at the cuts. Otherwise the clip goes through normal tracking.
+
+The decision itself (static_shot_layout) is pure Python over the recorded
+differences, so replay reproduces it from a dump.
+"""
+
+from smartcrop import log
+from smartcrop.path import get_crop_y
+
+THUMB_W          = 64
+CUT_LEVEL        = 30.0   # mean gray difference between samples that marks a cut
+STILL_LEVEL      = 6.0    # median difference within a shot above which the camera moves
+ONE_FACE_SHARE   = 0.8    # samples of a shot that must show exactly one face
+STEADY_SHARE     = 0.9    # ... of which this share within the dead zone of the median
+MIN_SHOT_SAMPLES = 2
+
+
+def thumbnail(frame):
+    """THUMB_W-wide grayscale float thumbnail for frame differences."""
+    import cv2
+    import numpy as np
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    h, w = gray.shape
+    small = cv2.resize(gray, (THUMB_W, max(1, round(h * THUMB_W / w))), interpolation=cv2.INTER_AREA)
+    return small.astype(np.float32)
+
+
+def thumb_diff(a, b):
+    """Mean absolute gray-level difference of two thumbnails."""
+    import numpy as np
+    return round(float(np.mean(np.abs(a - b))), 2)
+
+
+def refine_cut(t0, t1, thumb0, thumb1, decode_thumb, frame_sec):
+    """First time of the new shot between samples t0 and t1, by bisection:
+    each probe joins whichever side it looks like. decode_thumb(t) returns a
+    thumbnail or None (then the midpoint is kept)."""
+    while t1 - t0 > frame_sec:
+        mid = (t0 + t1) / 2
+        thumb = decode_thumb(mid)
+        if thumb is None:
+            return round(mid, 3)
+        if thumb_diff(thumb, thumb0) <= thumb_diff(thumb, thumb1):
+            t0, thumb0 = mid, thumb
+        else:
+            t1, thumb1 = mid, thumb
+    return round(t1, 3)
+
+
+def cut_indices(diffs):
+    """Sample indices i whose difference to sample i-1 marks a cut (diffs[0]
+    is None - the first sample has no predecessor)."""
+    return [i for i, d in enumerate(diffs) if d is not None and d > CUT_LEVEL]
+
+
+def _shot_window(faces_list, diffs, geom):
+    """Crop window for one shot, or None when the shot needs tracking."""
+    if len(faces_list) < MIN_SHOT_SAMPLES:
+        return None
+    still = sorted(d for d in diffs if d is not None)
+    if still and still[len(still) // 2] > STILL_LEVEL:
+        return None
+    single = [faces[0] for faces in faces_list if len(faces) == 1]
+    if len(single) < len(faces_list) * ONE_FACE_SHARE:
+        return None
+    cx = sorted(f["cx"] for f in single)[len(single) // 2]
+    top = sorted(f["y"] for f in single)[len(single) // 2]
+    steady = sum(1 for f in single
+                 if abs(f["cx"] - cx) <= geom.dead_zone and abs(f["y"] - top) <= geom.y_dead_zone)
+    if steady < len(single) * STEADY_SHARE:
+        return None
+    x = max(0, min(cx - geom.crop_w // 2, geom.src_w - geom.crop_w))
+    y = get_crop_y([{"y": top}], geom.src_h, geom.crop_h)
+    return {"x": x, "y": y, "w": geom.crop_w, "h": geom.crop_h}
+
+
+def static_shot_layout(sample_faces, sample_times, diffs, cuts, geom):
+    """Payload for a clip of locked-off shots, or None when it needs tracking.
+    diffs[i] is the thumbnail difference between samples i-1 and i (None when
+    unknown), cuts the refined start times of every shot after the first."""
+    if len(sample_faces) != len(sample_times) or len(diffs) != len(sample_times):
+        return None
+    bounds = [0.0] + list(cuts) + [float("inf")]
+    windows = []
+    for start, end in zip(bounds, bounds[1:]):
+        idx = [i for i, t in enumerate(sample_times) if start <= t < end]
+        # The difference across the cut belongs to neither shot
+        shot_diffs = [diffs[i] for i in idx if i - 1 in idx]
+        window = _shot_window([sample_faces[i] for i in idx], shot_diffs, geom)
+        if window is None:
+            log(f"Static shot: {start:.2f}s+ needs tracking")
+            return None
+        windows.append((start, window))
+
+    first = windows[0][1]
+    if all(abs(w["x"] - first["x"]) <= geom.dead_zone and abs(w["y"] - first["y"]) <= geom.y_dead_zone
+           for _, w in windows):
+        log(f"Static shot: locked-off camera over {len(windows)} shot(s) - one crop window {first}")
+        return {"mode": "static_crop", **first, "src_w": geom.src_w, "src_h": geom.src_h}
+    log(f"Static shot: {len(windows)} locked-off shots - one crop window each")
+    return {"mode": "crop", "coords": [{"t": round(start, 3), **w} for start, w in windows]}
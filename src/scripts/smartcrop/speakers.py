@@ -0,0 +1,107 @@
+"""
+Speaker turns (pyannote diarization or active-speaker estimation) and the
+speaker → face position mapping used to pick which face the crop follows.
+"""
+
+import bisect
+
+
+class SpeakerTimeline:
+    """Answers "who is speaking at t" from [{"start", "end", "speaker"}] turns.
+    Returns the earliest-starting turn containing t, in O(log n) - a linear scan
+    per sample is too slow for full-episode diarizations."""
+
+    def __init__(self, segments):
+        self.segments = sorted(segments, key=lambda s: s["start"])
+        self._starts = [s["start"] for s in self.segments]
+        # Running max of turn ends: the first index where it reaches t is the
+        # first turn (in start order) that ends at or after t.
+        self._max_ends = []
+        max_end = float("-inf")
+        for s in self.segments:
+            max_end = max(max_end, s["end"])
+            self._max_ends.append(max_end)
+
+    def __bool__(self):
+        return bool(self.segments)
+
+    def speaker_at(self, t):
+        i = bisect.bisect_left(self._max_ends, t)
+        if i < len(self.segments) and self._starts[i] <= t:
+            return self.segments[i]["speaker"]
+        return None
+
+    def speakers_by_first_turn(self):
+        first = {}
+        for s in self.segments:
+            first.setdefault(s["speaker"], s["start"])
+        return sorted(first, key=lambda sp: first[sp])
+
+
+class SpeakerMapper:
+    """Builds speaker_id → face cx by correlating turns with face detections.
+
+    For each frame with 2+ faces where someone is speaking, record which face is
+    closest to where that speaker has been seen before (or assign by elimination).
+    Positions are running averages, so frames can be fed in chunks."""
+
+    def __init__(self, timeline, src_w):
+        self.timeline = timeline
+        self.src_w    = src_w
+        self.learned  = {}   # speaker_id → average face cx
+        self._sums    = {}   # speaker_id → [sum of cx, count]
+        # Fallback if no mapping is ever learned (e.g., never 2+ faces while
+        # speaking): speakers evenly spaced across the frame by first turn.
+        speakers = timeline.speakers_by_first_turn()
+        self.fallback = {spk: int(src_w * (i + 1) / (len(speakers) + 1))
+                         for i, spk in enumerate(speakers)}
+
+    def speaker_at(self, t):
+        return self.timeline.speaker_at(t)
+
+    def seed(self, positions):
+        """Known positions up front (active-speaker tracks)."""
+        self.learned.update(positions)
+
+    def observe(self, t, faces):
+        if len(faces) < 2:
+            return
+        spk = self.timeline.speaker_at(t)
+        if not spk:
+            return
+
+        sorted_faces = sorted(faces, key=lambda f: f["cx"])
+
+        if spk in self.learned:
+            # Already have a position estimate - pick the closest face
+            best_face = min(sorted_faces, key=lambda f: abs(f["cx"] - self.learned[spk]))
+        else:
+            # First time seeing this speaker - pick the face NOT claimed by other speakers
+            unclaimed_faces = sorted_faces[:]
+            # Remove faces that are closest to already-mapped speakers
+            for mapped_cx in self.learned.values():
+                if unclaimed_faces:
+                    closest = min(unclaimed_faces, key=lambda f: abs(f["cx"] - mapped_cx))
+                    unclaimed_faces.remove(closest)
+            if unclaimed_faces:
+                # Assign the first unclaimed face (leftmost remaining)
+                best_face = unclaimed_faces[0]
+            else:
+                # All faces claimed - just pick the closest to center as fallback
+                best_face = min(sorted_faces, key=lambda f: abs(f["cx"] - self.src_w // 2))
+
+        acc = self._sums.setdefault(spk, [0, 0])
+        acc[0] += best_face["cx"]
+        acc[1] += 1
+        # Update running average position for this speaker
+        self.learned[spk] = int(acc[0] / acc[1])
+
+    def positions(self):
+        return self.learned if self.learned else self.fallback
+
+    def state(self):
+        return {"learned": self.learned, "sums": self._sums}
+
+    def load_state(self, state):
+        self.learned = dict(state["learned"])
+        self._sums   = {k: list(v) for k, v in state["sums"].items()}
@@ -0,0 +1,230 @@
+"""
+Managed local store for the artifacts runs keep for each other.
+
+Workers used to leave a proxy_{hash}_720p.mp4 per source in the temp dir
+"for potential reuse" and never remove it, so long-running hosts slowly
+filled their disks. Everything smart_crop.py keeps between runs now lives
+under one root, one directory per kind:
+
+  {root}/proxies/     detection proxies of large sources (smart_crop.py)
+  {root}/results/     coords JSON by cache key (smartcrop/cache.py)
+  {root}/detections/  per-source face detections (smartcrop/detections.py)
+  {root}/frames/      shared frame cache (smartcrop/frames.py - memory-mapped
+                      files it caps and evicts itself; only reported here)
+
+The root is SMART_CROP_STORE_DIR, else SMART_CROP_CACHE_DIR, else
+{tmp}/smart_crop_cache. A tmpfs root (e.g. /dev/shm/smart_crop) makes proxy
+decodes and cache lookups memory-speed - the cap then bounds the RAM used.
+
+SMART_CROP_STORE_MAX_MB (default 4096) caps proxies, results and detections
+together. Beyond it the least recently used artifacts go first: reads touch
+the mtime, so eviction is oldest-mtime-first. Per-kind caps
+(SMART_CROP_CACHE_MAX_MB, SMART_CROP_DETECTIONS_MAX_MB) still apply within
+their kind.
+
+Writes go to a hidden temp file in the kind's directory and are renamed into
+place, so a concurrent job sees no artifact or a complete one, never half of
+one. Two jobs producing the same artifact both finish and the last rename
+wins. Temp files of crashed writers are removed after STALE_TMP_SEC. An
+artifact's {name}.lock (the writers' flock, e.g. DetectionStore.save) is
+never removed: eviction can run while one writer holds it, and a new lock
+file would let the next writer lock a different inode and run concurrently.
+
+Hits, misses, stores and evictions per kind are counted in {root}/stats.json
+under an flock.
+
+  python3 -m smartcrop.store [stats|clear]
+"""
+
+import contextlib
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import time
+
+DEFAULT_MAX_MB = 4096
+MANAGED_KINDS  = ("proxies", "results", "detections")   # evicted under the shared cap
+REPORTED_KINDS = MANAGED_KINDS + ("frames",)
+STALE_TMP_SEC  = 3600
+
+
+def default_root():
+    return (os.environ.get("SMART_CROP_STORE_DIR") or os.environ.get("SMART_CROP_CACHE_DIR")
+            or os.path.join(tempfile.gettempdir(), "smart_crop_cache"))
+
+
+def env_bytes(name, default_mb):
+    """Size cap in bytes from an environment variable in MB."""
+    try:
+        max_mb = float(os.environ.get(name, default_mb))
+    except ValueError:
+        max_mb = default_mb
+    return int(max_mb * 1024 * 1024)
+
+
+def kind_entries(root, kind):
+    """[(mtime, size, path)] of the finished artifacts of one kind, oldest first."""
+    directory = os.path.join(root, kind)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    out = []
+    for name in names:
+        if name.startswith(".") or name.endswith(".lock"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        out.append((st.st_mtime, st.st_size, path))
+    out.sort()
+    return out
+
+
+class ArtifactStore:
+    """Artifacts of one kind. max_bytes caps the kind on its own (None: only
+    the shared cap applies)."""
+
+    def __init__(self, kind, root=None, max_bytes=None, total_bytes=None):
+        self.root        = root or default_root()
+        self.kind        = kind
+        self.dir         = os.path.join(self.root, kind)
+        self.max_bytes   = max_bytes
+        self.total_bytes = env_bytes("SMART_CROP_STORE_MAX_MB", DEFAULT_MAX_MB) if total_bytes is None else total_bytes
+        os.makedirs(self.dir, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def get(self, name):
+        """Path of a stored artifact, or None. Touches its mtime (LRU) and
+        counts a hit or a miss."""
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except OSError:
+            self.count("misses")
+            return None
+        self.count("hits")
+        return path
+
+    def touch(self, name):
+        """Mark an artifact in use without counting a lookup."""
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            pass
+
+    @contextlib.contextmanager
+    def write(self, name):
+        """Yields a temp path next to the artifact to write it to. It becomes
+        name when the block exits cleanly and is deleted when it raises."""
+        stem, ext = os.path.splitext(name)
+        # The extension stays last - ffmpeg picks the muxer from it
+        fd, tmp = tempfile.mkstemp(dir=self.dir, prefix=f".{stem}.", suffix=f".tmp{ext}")
+        os.close(fd)
+        try:
+            yield tmp
+            os.replace(tmp, self.path(name))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+        self.count("stores")
+        self.evict(keep=self.path(name))
+
+    def evict(self, keep=None):
+        """Drop this kind's oldest artifacts beyond its own cap, then the
+        oldest of all managed kinds beyond the shared cap. keep stays."""
+        evicted = {}
+        if self.max_bytes is not None:
+            self._evict(kind_entries(self.root, self.kind), self.max_bytes, keep, evicted)
+        everything = sorted(e for kind in MANAGED_KINDS for e in kind_entries(self.root, kind))
+        self._evict(everything, self.total_bytes, keep, evicted)
+        for kind, n in evicted.items():
+            self.count("evictions", n, kind)
+        self._remove_stale_temps()
+
+    @staticmethod
+    def _evict(entries, max_bytes, keep, evicted):
+        total = sum(e[1] for e in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            if path == keep or not os.path.exists(path):
+                continue
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            total -= size
+            kind = os.path.basename(os.path.dirname(path))
+            evicted[kind] = evicted.get(kind, 0) + 1
+
+    def _remove_stale_temps(self):
+        cutoff = time.time() - STALE_TMP_SEC
+        for name in os.listdir(self.dir):
+            if name.startswith("."):
+                path = os.path.join(self.dir, name)
+                with contextlib.suppress(OSError):
+                    if os.stat(path).st_mtime < cutoff:
+                        os.unlink(path)
+
+    def count(self, field, n=1, kind=None):
+        try:
+            with open(os.path.join(self.root, "stats.lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                counters = read_counters(self.root)
+                per_kind = counters.setdefault(kind or self.kind, {})
+                per_kind[field] = per_kind.get(field, 0) + n
+                with open(os.path.join(self.root, "stats.json"), "w") as f:
+                    json.dump(counters, f)
+        except OSError:
+            pass   # counters are best-effort - never fail a run over them
+
+
+def read_counters(root):
+    try:
+        with open(os.path.join(root, "stats.json")) as f:
+            counters = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {kind: c for kind, c in counters.items() if isinstance(c, dict)}
+
+
+def stats(root=None):
+    """Entries, bytes and counters per kind, plus the shared total and cap."""
+    root     = root or default_root()
+    counters = read_counters(root)
+    out = {"root": root, "bytes": 0, "max_bytes": env_bytes("SMART_CROP_STORE_MAX_MB", DEFAULT_MAX_MB), "kinds": {}}
+    for kind in REPORTED_KINDS:
+        entries = kind_entries(root, kind)
+        c = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, **counters.get(kind, {})}
+        lookups = c["hits"] + c["misses"]
+        c.update({"entries": len(entries), "bytes": sum(e[1] for e in entries),
+                  "hit_rate": round(c["hits"] / lookups, 4) if lookups else None})
+        out["kinds"][kind] = c
+        if kind in MANAGED_KINDS:
+            out["bytes"] += c["bytes"]
+    return out
+
+
+def clear(root=None):
+    """Remove every artifact (frame cache files included - mappings other
+    jobs hold stay valid)."""
+    root = root or default_root()
+    for kind in REPORTED_KINDS:
+        for _, _, path in kind_entries(root, kind):
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] not in ("stats", "clear"):
+        print("usage: python3 -m smartcrop.store [stats|clear]", file=sys.stderr)
+        sys.exit(2)
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        clear()
+    print(json.dumps(stats(), indent=2))
@@ -0,0 +1,283 @@
+"""
+Global camera-path optimizer (--path-engine global).
+
+The default chain (CropSmoother → Interpolator → PostSmoother) decides the
+path one sample at a time: an EMA with dead/move/snap zones, eased
+interpolation and two triangular post-smoothing passes, each a Python loop
+over frames. This engine instead solves for the whole trajectory of each axis
+at once, at the output frame rate, by L1 trend filtering:
+
+  minimize  ½ Σ (x[k] - raw[k])²  +  λ1 Σ |x[i+1] - x[i]|  +  λ2 Σ |x[i+2] - 2x[i+1] + x[i]|
+            (samples k)              (hold)                   (pan)
+
+The first-difference term makes the camera hold until a shift is both large
+and lasting (HOLD_SEC of samples a dead zone away); the second-difference
+term makes every move a constant-velocity pan with few slope changes. The
+optimum is piecewise constant/linear by construction - no micro-steps for a
+post pass to remove. Cuts are not smoothed at all: the timeline is split
+wherever the raw target jumps beyond the snap zone (speaker switch, scene
+cut) and each run is solved on its own, so the crop switches in one frame
+exactly as the chain's hard cuts do.
+
+Each run is solved by ADMM. The x-update is a pentadiagonal symmetric
+positive-definite system whose matrix never changes, so it is factored once
+(banded Cholesky) and every iteration is O(frames); the rest is vectorized
+NumPy, and the iteration count is capped, so a run costs linear time. Raw targets come from the same RawCropTracker (speaker-aware x, drift
+to center without a face) and get_crop_y the chain uses, and output frames
+sit on the same grid with the same per-frame fields, so segments and the
+coords JSON are built exactly as before.
+
+The banded solver is scipy.linalg's. scipy is optional: without it the
+pipeline logs a warning and uses the chain. The engine needs the whole
+timeline, so long-form runs keep the chain too.
+
+  python3 -m smartcrop.trend bench DUMP.json [DUMP.json ...]
+
+replays --dump-detections files through both engines and prints time and
+jitter for each.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from smartcrop import log
+from smartcrop.path import get_crop_y
+
+HOLD_SEC   = 1.5     # a shift of one dead zone must last this long to move the camera
+PAN_FRAMES = 12      # slope changes cost like a step spread over this many frames
+MAX_ITERS  = 400
+TOLERANCE  = 1e-3    # px/frame - ADMM stops once the frame-to-frame differences settle
+
+
+def available():
+    """True when the banded solver (scipy) can be imported."""
+    try:
+        import scipy.linalg  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _normal_bands(w, rho1, rho2):
+    """Upper banded form of diag(w) + rho1·D1ᵀD1 + rho2·D2ᵀD2 (n ≥ 3)."""
+    import numpy as np
+    n = len(w)
+    ab = np.zeros((3, n))
+    ab[2] = w + rho1 * np.convolve(np.ones(n - 1), [1, 1]) + rho2 * np.convolve(np.ones(n - 2), [1, 4, 1])
+    ab[1, 1:] = -rho1 + rho2 * np.convolve(np.ones(n - 2), [-2, -2])
+    ab[0, 2:] = rho2
+    return ab
+
+
+def _soft(v, k):
+    import numpy as np
+    return np.sign(v) * np.maximum(np.abs(v) - k, 0.0)
+
+
+def l1_trend(target, weight, lam1, lam2):
+    """Minimize ½Σw(x-target)² + λ1‖D1x‖₁ + λ2‖D2x‖₁ over one run of frames.
+    weight is 0 where no sample fell (those frames are filled by the penalties);
+    at least one weight must be positive. Returns a float array."""
+    import numpy as np
+    from scipy.linalg import cholesky_banded, cho_solve_banded
+
+    target = np.asarray(target, dtype=float)
+    weight = np.asarray(weight, dtype=float)
+    n = len(target)
+    known = weight > 0
+    idx = np.flatnonzero(known)
+    if n < 3 or len(idx) < 2:
+        return np.full(n, np.average(target[known], weights=weight[known]))
+
+    # ADMM over z1 = D1x, z2 = D2x (scaled duals u1, u2). The penalty
+    # parameters only affect convergence speed; the thresholds themselves
+    # are the right scale. Iterates are within a pixel or so of the optimum
+    # long before MAX_ITERS - far below what rounding to pixels shows.
+    rho1, rho2 = max(lam1, 1e-6), max(lam2, 1e-6)
+    factor = cholesky_banded(_normal_bands(weight, rho1, rho2))
+    wy = weight * target
+
+    x  = np.interp(np.arange(n), idx, target[idx])
+    z1 = np.diff(x)
+    z2 = np.diff(x, 2)
+    u1 = np.zeros(n - 1)
+    u2 = np.zeros(n - 2)
+    for _ in range(MAX_ITERS):
+        rhs = wy + rho1 * np.convolve(z1 - u1, [-1, 1]) + rho2 * np.convolve(z2 - u2, [1, -2, 1])
+        x = cho_solve_banded((factor, False), rhs)
+        d1, d2 = np.diff(x), np.diff(x, 2)
+        z1_new = _soft(d1 + u1, lam1 / rho1)
+        z2_new = _soft(d2 + u2, lam2 / rho2)
+        u1 += d1 - z1_new
+        u2 += d2 - z2_new
+        # Primal (x's differences vs z) and dual (z still moving) residuals
+        primal = max(np.max(np.abs(d1 - z1_new)), np.max(np.abs(d2 - z2_new)))
+        dual   = max(np.max(np.abs(z1_new - z1)), np.max(np.abs(z2_new - z2)))
+        z1, z2 = z1_new, z2_new
+        if primal < TOLERANCE and dual < TOLERANCE:
+            break
+    return x
+
+
+class GlobalPath:
+    """Drop-in for CropSmoother → Interpolator → PostSmoother when the whole
+    timeline is available: push() collects raw samples, flush() solves and
+    returns every frame."""
+
+    def __init__(self, geom):
+        self.geom    = geom
+        self.samples = []
+
+    def push(self, rc, faces):
+        """rc: RawCropTracker output; faces: the detections at rc["t"] (for Y)."""
+        g = self.geom
+        self.samples.append({**rc, "y": get_crop_y(faces, g.src_h, g.crop_h), "w": g.crop_w, "h": g.crop_h})
+
+    def frames(self):
+        """The chain's frame grid: every frame from one sample up to the next
+        carries the earlier sample's fields; the last sample closes it.
+        Returns (frames, frame index of each sample)."""
+        frame_interval = 1.0 / self.geom.fps
+        frames, at = [], []
+        for a, b in zip(self.samples, self.samples[1:]):
+            at.append(len(frames))
+            steps = max(1, round((b["t"] - a["t"]) / frame_interval))
+            for step in range(steps):
+                frames.append({**a, "t": round(a["t"] + step * frame_interval, 4)})
+        if self.samples:
+            at.append(len(frames))
+            frames.append(dict(self.samples[-1]))
+        return frames, at
+
+    def weights(self):
+        """(λ1, λ2) for x and y from the dead zones and the sampling rate."""
+        g = self.geom
+        span = self.samples[-1]["t"] - self.samples[0]["t"]
+        per_sec = (len(self.samples) - 1) / span if span > 0 else 1.0
+        hold = HOLD_SEC * per_sec / 2
+        return ((hold * g.dead_zone, hold * g.dead_zone * PAN_FRAMES),
+                (hold * g.y_dead_zone, hold * g.y_dead_zone * PAN_FRAMES))
+
+    def solve_axis(self, key, n_frames, at, snap, lams):
+        """Optimized values of one axis on the frame grid, solved per run
+        between cuts."""
+        import numpy as np
+        raw = np.array([s[key] for s in self.samples], dtype=float)
+        at  = np.asarray(at)
+        cuts = np.flatnonzero(np.abs(np.diff(raw)) > snap) + 1
+        out = np.empty(n_frames)
+        for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(raw)]):
+            first, last = at[lo], at[hi - 1]
+            target = np.zeros(last - first + 1)
+            weight = np.zeros(last - first + 1)
+            np.add.at(target, at[lo:hi] - first, raw[lo:hi])
+            np.add.at(weight, at[lo:hi] - first, 1.0)
+            target[weight > 0] /= weight[weight > 0]
+            out[first:last + 1] = l1_trend(target, weight, *lams)
+            # Frames after a run's last sample hold it until the cut (the chain's hard cut)
+            nxt = at[hi] if hi < len(raw) else n_frames
+            out[last + 1:nxt] = out[last]
+        return out, len(cuts)
+
+    def flush(self):
+        import numpy as np
+        g = self.geom
+        if not self.samples:
+            return []
+        frames, at = self.frames()
+        lam_x, lam_y = self.weights()
+        xs, x_cuts = self.solve_axis("x", len(frames), at, g.snap_zone, lam_x)
+        ys, _      = self.solve_axis("y", len(frames), at, g.y_snap_zone, lam_y)
+        xs = np.clip(np.rint(xs), 0, g.src_w - g.crop_w).astype(int)
+        ys = np.clip(np.rint(ys), 0, g.src_h - g.crop_h).astype(int)
+        for frame, x, y in zip(frames, xs.tolist(), ys.tolist()):
+            frame["x"], frame["y"] = x, y
+        log(f"Global path: {len(self.samples)} samples → {len(frames)} frames, {x_cuts} cuts "
+            f"(λ1={lam_x[0]:.0f}, λ2={lam_x[1]:.0f})")
+        return frames
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def face_coords(payload):
+    """Runs of tracked frame coords in a coords JSON payload."""
+    if payload["mode"] == "crop":
+        return [list(payload["coords"])]
+    if payload["mode"] == "mixed":
+        return [list(seg["coords"]) for seg in payload["segments"] if seg["type"] == "face"]
+    return []
+
+
+def jitter(runs, snap):
+    """Path statistics over runs of frame coords, ignoring hard cuts:
+    accel   mean |Δ²x| + |Δ²y| per frame (px/frame²)
+    moving  share of frames where the crop moves
+    turns   direction reversals of x per minute
+    """
+    import numpy as np
+    accel, moving, frames, turns, seconds = 0.0, 0, 0, 0, 0.0
+    for coords in runs:
+        if len(coords) < 3:
+            continue
+        xs = np.array([c["x"] for c in coords], dtype=float)
+        ys = np.array([c["y"] for c in coords], dtype=float)
+        dx, dy = np.diff(xs), np.diff(ys)
+        keep = np.abs(dx) <= snap
+        ax = np.abs(np.diff(dx))[keep[1:] & keep[:-1]]
+        ay = np.abs(np.diff(dy))[keep[1:] & keep[:-1]]
+        accel   += float(ax.sum() + ay.sum())
+        moving  += int(np.count_nonzero((dx != 0) | (dy != 0)))
+        frames  += len(dx)
+        steps = np.sign(dx[keep & (dx != 0)])
+        turns   += int(np.count_nonzero(np.diff(steps)))
+        seconds += coords[-1]["t"] - coords[0]["t"]
+    if not frames:
+        return {"accel": 0.0, "moving": 0.0, "turns_per_min": 0.0}
+    return {"accel": round(accel / frames, 3), "moving": round(moving / frames, 3),
+            "turns_per_min": round(turns * 60 / seconds, 1) if seconds else 0.0}
+
+
+def off_center(runs, dump, crop_w):
+    """Mean distance (px) from the crop center to the nearest face, at samples with faces."""
+    faces_at = {f"{fd['t']:.2f}": fd["faces"] for fd in dump.get("frame_data") or [] if fd["faces"]}
+    dist = [min(abs(c["x"] + crop_w / 2 - f["cx"]) for f in faces_at[f"{c['t']:.2f}"])
+            for coords in runs for c in coords if f"{c['t']:.2f}" in faces_at]
+    return round(sum(dist) / len(dist), 1) if dist else None
+
+
+def bench(path):
+    from smartcrop import replay
+    from smartcrop.path import crop_size, CropGeometry
+    dump = replay.load_dump(path)
+    geom = CropGeometry(dump["src_w"], dump["src_h"], dump["fps"], *crop_size(dump["src_w"], dump["src_h"]))
+    rows = {}
+    for engine in ("chain", "global"):
+        started = time.perf_counter()
+        payload = replay.replay(dump, engine=engine)
+        runs = face_coords(payload)   # materializes the coords
+        elapsed = time.perf_counter() - started
+        rows[engine] = {"ms": round(elapsed * 1000), "frames": sum(len(r) for r in runs),
+                        **jitter(runs, geom.snap_zone), "off_center": off_center(runs, dump, geom.crop_w)}
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m smartcrop.trend",
+                                     description="Compare the global path optimizer with the default chain.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_parser = sub.add_parser("bench", help="replay dumps through both engines, print time and jitter")
+    bench_parser.add_argument("dumps", nargs="+")
+    args = parser.parse_args(argv)
+
+    if not available():
+        log("ERROR: the global path engine needs scipy")
+        return 1
+    for path in args.dumps:
+        print(json.dumps({"dump": path, **bench(path)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -92,6 +92,17 @@ async function main() {
       "-c:a", "aac", "-b:a", "128k",
       outputVideo,
     ]);
+  } else if (result.mode === "static_crop") {
+    // Locked-off camera → one fixed crop window
+    const { x, y, w, h } = result;
+    console.log(`[STATIC CROP] ${w}x${h} at ${x},${y}`);
+    await run("ffmpeg", [
+      "-y", "-i", trimmedVideo,
+      "-vf", `crop=${w}:${h}:${x}:${y}`,
+      "-c:v", "libx264", "-preset", "fast", "-crf", "23",
+      "-c:a", "aac", "-b:a", "128k",
+      outputVideo,
+    ]);
   } else if (result.mode === "mixed") {
     // Mixed: face sections → 9:16 crop, no-face sections → letterbox, then concat
     const { segments, crop_w, crop_h } = result;
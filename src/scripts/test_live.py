@@ -0,0 +1,55 @@
+"""
+Lookahead budgets and the constant delay of live reframing.
+
+Run from src/scripts: python3 -m pytest test_live.py
+"""
+
+import pytest
+
+from smartcrop import aspects
+from smartcrop.live import LiveReframer, fit_lookahead
+
+FACE = {"x": 800, "y": 300, "w": 200, "h": 220, "cx": 900, "cy": 410, "area": 44000}
+
+
+def geometry(fps=30.0):
+    return aspects.geometry(1920, 1080, fps, aspects.DEFAULT, 2)
+
+
+@pytest.mark.parametrize("interval,lookahead,radii,passes", [
+    (0.1, 0.5, (7, 5), 2),     # the module docstring's example
+    (0.1, 0.2, (1, 2), 2),
+    (0.1, 0.15, (1, 1), 1),    # one frame of smoothing left
+    (0.1, 0.1, (1, 1), 0),     # interpolation only
+])
+def test_fit_lookahead_shrinks_the_radii(interval, lookahead, radii, passes):
+    geom = fit_lookahead(geometry(), interval, lookahead)
+    assert (geom.post_radius_1, geom.post_radius_2) == radii
+    assert geom.post_passes == passes
+
+
+def test_fit_lookahead_keeps_radii_that_fit():
+    before = geometry()
+    geom = fit_lookahead(geometry(), 0.1, 10.0)
+    assert (geom.post_radius_1, geom.post_radius_2, geom.post_passes) == \
+           (before.post_radius_1, before.post_radius_2, before.post_passes)
+
+
+def test_fit_lookahead_rejects_lookahead_shorter_than_the_interval():
+    with pytest.raises(ValueError):
+        fit_lookahead(geometry(), 0.2, 0.1)
+
+
+def test_delay_stays_within_the_lookahead():
+    reframer = LiveReframer(geometry(), 0.1, 0.5)
+    assert reframer.delay <= 0.5 + 1e-9
+    latest = 0.0
+    emitted = []
+    for i in range(100):
+        latest = i * 0.1
+        for frame in reframer.push(latest, [FACE]):
+            assert latest - frame["t"] <= reframer.delay + 1e-6
+            emitted.append(frame["t"])
+    emitted.extend(f["t"] for f in reframer.flush())
+    assert emitted == sorted(emitted)
+    assert len(emitted) == reframer.frames == round(latest * 30) + 1
@@ -0,0 +1,85 @@
+"""
+Streaming crop path stages against the whole-clip computation they replaced.
+
+Run from src/scripts: python3 -m pytest test_path.py
+"""
+
+import json
+import random
+
+import pytest
+
+from smartcrop import aspects
+from smartcrop.path import Interpolator, PostSmoother, smooth_window
+
+FPS = 30.0
+
+
+@pytest.fixture
+def geom():
+    return aspects.geometry(1920, 1080, FPS, aspects.DEFAULT, 2)
+
+
+def frames(n=400, seed=1):
+    """Per-frame coords with jitter and one hard cut."""
+    rng = random.Random(seed)
+    return [{"t": round(i / FPS, 4), "x": (300 if i < n // 2 else 900) + rng.uniform(-4, 4),
+             "y": 10 + rng.uniform(-2, 2), "w": 608, "h": 1080}
+            for i in range(n)]
+
+
+def smooth_all(values, radius, snap):
+    """One post-smoothing pass over the whole clip at once."""
+    out = []
+    for i in range(len(values)):
+        lo, hi = max(0, i - radius), min(len(values), i + radius + 1)
+        out.append(smooth_window(values[lo:hi], i - lo, radius, snap))
+    return out
+
+
+def stream(geom, items, restart_at=None):
+    """Push items through a PostSmoother - restarting it from its JSON
+    state after restart_at items, as a resumed long-form run does."""
+    smoother = PostSmoother(geom)
+    out = []
+    for i, frame in enumerate(items):
+        if i == restart_at:
+            state = json.loads(json.dumps(smoother.state()))
+            smoother = PostSmoother(geom)
+            smoother.load_state(state)
+        out.extend(smoother.push(dict(frame)))
+    return out + smoother.flush()
+
+
+def test_post_smoother_matches_whole_clip_passes(geom):
+    items = frames()
+    xs = [f["x"] for f in items]
+    for radius in (geom.post_radius_1, geom.post_radius_2):
+        xs = smooth_all(xs, radius, geom.snap_zone)
+    out = stream(geom, items)
+    assert [f["t"] for f in out] == [f["t"] for f in items]
+    assert [f["x"] for f in out] == [max(0, min(int(round(x)), geom.src_w - geom.crop_w)) for x in xs]
+
+
+@pytest.mark.parametrize("restart_at", [1, 37, 250])
+def test_post_smoother_resumes_from_its_state(geom, restart_at):
+    assert stream(geom, frames(), restart_at) == stream(geom, frames())
+
+
+def test_interpolator_fills_every_frame(geom):
+    interp  = Interpolator(geom)
+    samples = [{"t": i * 0.2, "x": 300.0 + i * 10, "y": 0.0, "face": True} for i in range(6)]
+    out = []
+    for s in samples:
+        out.extend(interp.push(s))
+    out.extend(interp.flush())
+    assert len(out) == 5 * round(0.2 * FPS) + 1
+    assert out[0]["x"] == 300.0 and out[-1]["x"] == 350.0
+    assert all(a["x"] <= b["x"] for a, b in zip(out, out[1:]))
+
+
+def test_interpolator_cuts_on_large_jumps(geom):
+    interp = Interpolator(geom)
+    interp.push({"t": 0.0, "x": 0.0, "y": 0.0, "face": True})
+    out = interp.push({"t": 0.2, "x": geom.snap_zone + 1.0, "y": 0.0, "face": True})
+    assert [f["x"] for f in out] == [0.0] + [geom.snap_zone + 1.0] * (len(out) - 1)
@@ -0,0 +1,56 @@
+"""
+Webcam box detection on synthetic screen recordings.
+
+Run from src/scripts: python3 -m pytest test_pip.py
+"""
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from smartcrop import pip
+
+W, H = 1920, 1080
+BOX  = (1500, 760, 360, 270)     # x, y, w, h of the webcam overlay
+FACE = {"cx": 1680, "cy": 890, "w": 120, "h": 160}
+
+
+def screen_frame(rng, t, noise, block, webcam=True):
+    """A static slide of text lines with ±noise gray levels in block x block
+    patches (re-encoding noise), and a webcam overlay with stronger noise and
+    a swaying face."""
+    frame = np.full((H, W, 3), 235, np.int16)
+    for i in range(20):
+        frame[80 + i * 45:100 + i * 45, 100:300 + (i * 97) % 1200] = 40
+    patches = rng.integers(-noise, noise + 1, (H // block + 1, W // block + 1, 1), dtype=np.int16)
+    frame += np.kron(patches, np.ones((block, block, 1), np.int16))[:H, :W]
+    if webcam:
+        x, y, w, h = BOX
+        cam = np.full((h, w, 3), 90, np.int16)
+        patches = rng.integers(-3, 4, (h // block + 1, w // block + 1, 1), dtype=np.int16)
+        cam += np.kron(patches, np.ones((block, block, 1), np.int16))[:h, :w]
+        cv2.ellipse(cam, (180 + int(20 * np.sin(t * 3)), 130), (60, 80), 0, 0, 360, (150, 170, 200), -1)
+        frame[y:y + h, x:x + w] = cam
+        cv2.rectangle(frame, (x - 3, y - 3), (x + w + 2, y + h + 2), (20, 20, 20), 3)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def shot_pairs(noise, block, webcam=True):
+    rng = np.random.default_rng(7)
+    return [(screen_frame(rng, t, noise, block, webcam),
+             screen_frame(rng, t + pip.PAIR_GAP, noise, block, webcam))
+            for t in np.linspace(0, 5, pip.PAIRS)]
+
+
+@pytest.mark.parametrize("noise,block", [(0, 1), (1, 1), (1, 2), (1, 8), (2, 8)])
+def test_finds_webcam_box_on_noisy_screen(noise, block):
+    box = pip.find_webcam_box(shot_pairs(noise, block), [[FACE]], W, H)
+    assert box is not None
+    x, y, w, h = BOX
+    assert abs(box["x"] - x) <= 12 and abs(box["y"] - y) <= 12
+    assert abs(box["x"] + box["w"] - x - w) <= 12 and abs(box["y"] + box["h"] - y - h) <= 12
+
+
+def test_noisy_screen_without_webcam_has_no_box():
+    assert pip.find_webcam_box(shot_pairs(1, 8, webcam=False), [[]], W, H) is None
@@ -0,0 +1,112 @@
+"""
+Per-segment ffmpeg arguments against the ones clip-generator.service.ts
+builds for a mixed clip.
+
+Run from src/scripts: python3 -m pytest test_render.py
+"""
+
+import pytest
+
+from smartcrop import render
+
+ENCODE  = ["-c:v", "libx264", "-preset", "fast", "-crf", "18", "-c:a", "aac", "-b:a", "192k", "-y", "seg.mp4"]
+PAYLOAD = {"mode": "mixed", "crop_w": 608, "crop_h": 1080}
+
+
+def job(seg, payload=PAYLOAD):
+    return render.segment_job(payload, seg, "src.mp4", "seg.mp4", "cmds.txt")
+
+
+@pytest.mark.parametrize("value,text", [(3.0, "3"), (3, "3"), (0.5, "0.5"), (12.34, "12.34"),
+                                        (3.3 - 1.2, "2.0999999999999996"), (-0.0, "0")])
+def test_js_num_prints_like_javascript(value, text):
+    assert render.js_num(value) == text
+
+
+def test_js_round_rounds_halves_up():
+    assert [render.js_round(v) for v in (0.5, 1.5, 2.5, -0.5, 2.4)] == [1, 2, 3, 0, 2]
+
+
+def test_face_segment_sends_crop_commands():
+    coords = [{"t": 10.0, "x": 100, "y": 0, "w": 608, "h": 1080},
+              {"t": 10.5, "x": 101, "y": 0, "w": 608, "h": 1080},    # under MIN_MOVE_PX
+              {"t": 11.0, "x": 110, "y": 0, "w": 608, "h": 1080},
+              {"t": 11.5, "x": 111, "y": 0, "w": 608, "h": 1080}]    # last - always sent
+    out = job({"type": "face", "start": 10.0, "end": 12.0, "coords": coords})
+    assert out["args"] == ["-ss", "10", "-t", "2", "-i", "src.mp4",
+                           "-vf", "sendcmd=f=cmds.txt,crop=608:1080,scale=1080:1920:flags=lanczos", *ENCODE]
+    assert out["commands"] == [
+        "0 crop x 100; 0 crop y 0; 0 crop w 608; 0 crop h 1080;",
+        "1 crop x 110; 1 crop y 0; 1 crop w 608; 1 crop h 1080;",
+        "1.5 crop x 111; 1.5 crop y 0; 1.5 crop w 608; 1.5 crop h 1080;",
+    ]
+
+
+def test_crop_commands_clamp_times_before_the_segment():
+    lines, first = render.crop_commands([{"t": 4.99, "x": 5, "y": 0, "w": 608, "h": 1080}], 5.0)
+    assert lines == ["0 crop x 5; 0 crop y 0; 0 crop w 608; 0 crop h 1080;"]
+    assert first["t"] == 0
+
+
+def test_split_segment_stacks_screen_over_face():
+    info = {"pip": {"x": 1500, "y": 760, "w": 360, "h": 270},
+            "screen": {"x": 0, "y": 0, "w": 1500, "h": 1080}, "face_h": 700}
+    out = job({"type": "split", "start": 0.0, "end": 4.5, "split_info": info})
+    assert out["commands"] is None
+    assert out["args"] == ["-ss", "0", "-t", "4.5", "-i", "src.mp4", "-filter_complex",
+                           "[0:v]crop=360:270:1500:760,scale=1080:700:flags=lanczos[face];"
+                           "[0:v]crop=1200:864:150:0,scale=1080:1220:flags=lanczos[screen];"
+                           "[screen][face]vstack=inputs=2,format=yuv420p[out]",
+                           "-map", "[out]", "-map", "0:a?", *ENCODE]
+
+
+def test_split_segment_without_info_center_crops():
+    out = job({"type": "split", "start": 1.0, "end": 2.0})
+    assert out["args"] == ["-ss", "1", "-t", "1", "-i", "src.mp4", "-vf",
+                           "crop=608:1080:(in_w-608)/2:(in_h-1080)/2,scale=1080:1920:flags=lanczos,format=yuv420p",
+                           *ENCODE]
+
+
+def test_podcast_dual_segment_stacks_both_speakers():
+    dual = {"left_crop": {"x": 200, "y": 100, "w": 600, "h": 533},
+            "right_crop": {"x": 1100, "y": 100, "w": 600, "h": 533}}
+    out = job({"type": "podcast_dual", "start": 2.0, "end": 3.0, "dual_crop": dual})
+    assert out["args"] == ["-ss", "2", "-t", "1", "-i", "src.mp4", "-filter_complex",
+                           "[0:v]crop=600:533:200:100,scale=1080:960:flags=lanczos[top];"
+                           "[0:v]crop=600:533:1100:100,scale=1080:960:flags=lanczos[bot];"
+                           "[top][bot]vstack=inputs=2,format=yuv420p[out]",
+                           "-map", "[out]", "-map", "0:a?", *ENCODE]
+
+
+def test_group_segment_letterboxes():
+    out = job({"type": "group", "start": 0.0, "end": 1.0})
+    assert out["args"] == ["-ss", "0", "-t", "1", "-i", "src.mp4", "-vf",
+                           "scale=1080:-2:flags=lanczos,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black,setsar=1,format=yuv420p",
+                           *ENCODE]
+
+
+def test_face_segment_without_coords_zooms():
+    out = job({"type": "no_face", "start": 0.0, "end": 1.0, "coords": []})
+    assert out["args"] == ["-ss", "0", "-t", "1", "-i", "src.mp4", "-vf",
+                           "crop=in_w/1.25:in_h/1.25:(in_w-in_w/1.25)/2:(in_h-in_h/1.25)/2,"
+                           "scale=1080:1920:flags=lanczos,format=yuv420p", *ENCODE]
+
+
+def test_empty_segment_is_skipped():
+    assert job({"type": "face", "start": 3.0, "end": 3.0, "coords": []}) is None
+
+
+def test_with_threads_limits_every_stage():
+    args = job({"type": "group", "start": 0.0, "end": 1.0})["args"]
+    limited = render.with_threads(args, 2)
+    assert limited == ["-ss", "0", "-t", "1", "-threads", "2", "-filter_threads", "2", "-i", "src.mp4",
+                       *args[6:8], "-threads", "2", *ENCODE]
+
+
+def test_pool_size_never_exceeds_the_jobs(monkeypatch):
+    monkeypatch.delenv("SMART_CROP_RENDER_WORKERS", raising=False)
+    monkeypatch.delenv("SMART_CROP_RENDER_THREADS", raising=False)
+    assert render.pool_size(2, workers=8, threads=3) == (2, 3)
+    assert render.pool_size(10, workers=4) == (4, render.THREADS_PER_JOB)
+    monkeypatch.setenv("SMART_CROP_RENDER_WORKERS", "3")
+    assert render.pool_size(10, threads=1) == (3, 1)
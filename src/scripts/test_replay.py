@@ -0,0 +1,153 @@
+"""
+Replay, shard merging and chunked tracking on a synthetic detection dump.
+
+Run from src/scripts: python3 -m pytest test_replay.py
+"""
+
+import copy
+import io
+import json
+import random
+
+import pytest
+
+from smartcrop import aspects
+from smartcrop import replay
+from smartcrop import segments
+from smartcrop import shards
+from smartcrop.layout import classify_frame, default_pip_region, match_faces_across_frames
+from smartcrop.pipeline import CropPipeline
+
+W, H     = 1920, 1080
+INTERVAL = 0.2
+DURATION = 60.0
+
+
+def frame_data(seed=3):
+    """One speaker, two side by side from 20s to 40s, then one again -
+    faces ordered across samples like smart_crop.py's tracking loop does."""
+    rng  = random.Random(seed)
+    out  = []
+    prev = []
+    for i in range(int(DURATION / INTERVAL)):
+        t = round(i * INTERVAL, 2)
+        if 20 <= t < 40:
+            faces = [dict(x=c - 90, y=320, w=180, h=200, cx=c + rng.randint(-15, 15), cy=420, area=36000)
+                     for c in (500, 1400)]
+        else:
+            c = 900 + rng.randint(-30, 30)
+            faces = [dict(x=c - 100, y=300, w=200, h=220, cx=c, cy=410, area=44000)]
+        faces = match_faces_across_frames(prev, faces)
+        out.append({"t": t, "faces": faces, "frame_type": classify_frame(faces, W, H), "pip": None})
+        prev = faces
+    return out
+
+
+@pytest.fixture
+def dump():
+    fd = frame_data()
+    return {"src_w": W, "src_h": H, "fps": 30.0, "duration": DURATION,
+            "n_type_samples": 10, "sample_faces": [f["faces"] for f in fd[::30]],
+            "sample_times": [f["t"] for f in fd[::30]], "sample_interval": INTERVAL,
+            "frame_data": fd, "diarization": [], "speaker_seed": {}, "options": {}}
+
+
+def coords_json(payload):
+    out = io.StringIO()
+    segments.write_json(out, payload)
+    return out.getvalue()
+
+
+def split(dump, at):
+    """Two shard dumps of dump cut at `at` seconds, as --analyze-range writes them."""
+    out = []
+    for start, end in ((0.0, at), (at, dump["duration"])):
+        fd     = [f for f in dump["frame_data"] if start <= f["t"] < end]
+        rest   = [f for f in dump["frame_data"] if f["t"] >= end]
+        typed  = [i for i, t in enumerate(dump["sample_times"]) if start <= t < end]
+        shard  = copy.deepcopy({**dump, "frame_data": fd,
+                                "n_type_samples": len(typed),
+                                "sample_faces": [dump["sample_faces"][i] for i in typed],
+                                "sample_times": [dump["sample_times"][i] for i in typed]})
+        shard["range"] = [start, end]
+        shard["edges"] = {"start": {"t": fd[0]["t"], "detect_h": 720},
+                          "end":   {"next_t": rest[0]["t"] if rest else end, "prev_faces": fd[-1]["faces"],
+                                    "detect_h": 720, "interval": INTERVAL}}
+        out.append(shard)
+    return out
+
+
+def test_dump_round_trip(dump, tmp_path):
+    path = str(tmp_path / "dump.json")
+    replay.write_dump(path, dump)
+    loaded = replay.load_dump(path)
+    assert loaded.pop("version") == replay.DUMP_VERSION
+    assert loaded == json.loads(json.dumps(dump))
+
+
+def test_load_dump_rejects_other_versions(tmp_path):
+    path = tmp_path / "dump.json"
+    path.write_text(json.dumps({"version": replay.DUMP_VERSION + 1}))
+    with pytest.raises(ValueError):
+        replay.load_dump(str(path))
+
+
+def test_replay_is_deterministic(dump):
+    payload = replay.replay(copy.deepcopy(dump))
+    assert payload["mode"] == "mixed"
+    assert [(s["type"], s["start"], s["end"]) for s in payload["segments"]] == [
+        ("face", 0.0, 20.0), ("podcast_dual", 20.0, 40.0), ("face", 40.0, 60.0)]
+    assert coords_json(payload) == coords_json(replay.replay(copy.deepcopy(dump)))
+
+
+def test_overrides_change_the_result(dump):
+    before = coords_json(replay.replay(copy.deepcopy(dump)))
+    after  = coords_json(replay.replay(copy.deepcopy(dump), {"dead_zone": "0", "move_zone": "1"}))
+    assert before != after
+
+
+def test_unknown_override_is_rejected(dump):
+    with pytest.raises(ValueError):
+        replay.replay(dump, {"no_such_param": "1"})
+
+
+@pytest.mark.parametrize("at", [30.0, 25.0])
+def test_merged_shards_replay_like_one_run(dump, at):
+    merged, payload = shards.merge_dumps(list(reversed(split(dump, at))))
+    assert payload is None
+    assert len(merged["frame_data"]) == len(dump["frame_data"])
+    assert coords_json(replay.replay(merged)) == coords_json(replay.replay(copy.deepcopy(dump)))
+
+
+def test_shard_payload_is_returned_as_is(dump):
+    first, second = split(dump, 30.0)
+    fallback = {"mode": "zoom_full", "zoom": 1.25, "src_w": W, "src_h": H}
+    second = {"range": second["range"], "payload": fallback}
+    assert shards.merge_dumps([first, second]) == (None, fallback)
+
+
+def test_shards_must_agree_on_the_source(dump):
+    first, second = split(dump, 30.0)
+    second["fps"] = 25.0
+    with pytest.raises(ValueError):
+        shards.merge_dumps([first, second])
+
+
+def test_plan_tiles_the_duration():
+    assert shards.plan(100.0, 3) == [[0.0, 33.0], [33.0, 67.0], [67.0, 100.0]]
+
+
+@pytest.mark.parametrize("chunk", [7, 50, 150])
+def test_bounded_pipeline_matches_one_batch(dump, chunk):
+    """Long-form runs feed the pipeline in chunks and keep only a bounded
+    window of it - the coords must not change."""
+    def run(bounded, size):
+        geom     = aspects.geometry(W, H, 30.0, aspects.DEFAULT, 2)
+        pipeline = CropPipeline(geom, [], segments.MemorySink(), bounded=bounded)
+        fd = dump["frame_data"]
+        for i in range(0, len(fd), size):
+            pipeline.run(fd[i:i + size])
+        pipeline.flush()
+        return coords_json(pipeline.finish(DURATION, default_pip_region(W, H)))
+
+    assert run(True, chunk) == run(False, len(dump["frame_data"]))
@@ -0,0 +1,63 @@
+"""
+Snapping mixed segment boundaries onto source keyframes.
+
+Run from src/scripts: python3 -m pytest test_segments.py
+"""
+
+import pytest
+
+from smartcrop.segments import MIN_SNAPPED_SEC, nearest_keyframe, snap_to_keyframes
+
+FPS = 10.0
+
+
+def coords(start, end, x, step=0):
+    return [{"t": round(start + i / FPS, 4), "x": x + i * step, "y": 0, "w": 608, "h": 1080}
+            for i in range(round((end - start) * FPS))]
+
+
+def payload():
+    return {"mode": "mixed", "segments": [
+        {"type": "face", "start": 0.0, "end": 4.0, "coords": coords(0.0, 4.0, 100)},
+        {"type": "podcast_dual", "start": 4.0, "end": 8.0, "dual_crop": {}},
+        {"type": "face", "start": 8.0, "end": 12.0, "coords": coords(8.0, 12.0, 500, step=5)},
+    ]}
+
+
+@pytest.mark.parametrize("t,expected", [(4.1, 4.0), (4.4, None), (0.0, 0.0), (9.95, 10.0), (20.0, None)])
+def test_nearest_keyframe(t, expected):
+    assert nearest_keyframe([0.0, 4.0, 7.9, 10.0], t, 0.3) == expected
+
+
+def test_boundaries_move_onto_keyframes():
+    p = payload()
+    assert snap_to_keyframes(p, [0.0, 3.8, 8.2], 0.3, FPS) == 2
+    segs = p["segments"]
+    assert [(s["start"], s["end"]) for s in segs] == [(0.0, 3.8), (3.8, 8.2), (8.2, 12.0)]
+    assert [s["render"] for s in segs] == [{"keyframe_start": True, "static": True},
+                                           {"keyframe_start": True, "static": True},
+                                           {"keyframe_start": True, "static": False}]
+    first, last = list(segs[0]["coords"]), list(segs[2]["coords"])
+    assert first[-1]["t"] < 3.8
+    assert last[0]["t"] == 8.2 and all(8.2 <= c["t"] < 12.0 for c in last)
+
+
+def test_segment_extended_backwards_takes_its_neighbours_coords():
+    p = payload()
+    p["segments"][1] = {"type": "face", "start": 4.0, "end": 8.0, "coords": coords(4.0, 8.0, 300)}
+    snap_to_keyframes(p, [7.8], 0.3, FPS)
+    grown = list(p["segments"][2]["coords"])
+    assert grown[0]["t"] == 7.8 and grown[0]["x"] == 300
+    assert grown[2]["t"] == 8.0 and grown[2]["x"] == 500
+
+
+def test_far_keyframes_and_short_segments_are_left_alone():
+    p = payload()
+    assert snap_to_keyframes(p, [4.5, 7.6], 0.3, FPS) == 0
+    p = {"mode": "mixed", "segments": [
+        {"type": "group", "start": 0.0, "end": 1.0},
+        {"type": "group", "start": 1.0, "end": 1.0 + MIN_SNAPPED_SEC + 0.1},
+    ]}
+    assert snap_to_keyframes(p, [1.2], 0.3, FPS) == 0   # would leave the second one too short
+    assert p["segments"][1]["start"] == 1.0
+    assert p["segments"][1]["render"]["keyframe_start"] is False
@@ -0,0 +1,177 @@
+"""
+Result cache keys, the artifact store and the detection store.
+
+Run from src/scripts: python3 -m pytest test_store.py
+"""
+
+import json
+import os
+
+import pytest
+
+from smartcrop import cache
+from smartcrop import store
+from smartcrop.detections import BUCKET_SEC, DetectionStore, MemoryDetectionStore
+
+FACE = {"x": 800, "y": 300, "w": 200, "h": 220, "cx": 900, "cy": 410, "area": 44000}
+
+
+def put(artifacts, name, size, mtime):
+    with artifacts.write(name) as tmp:
+        with open(tmp, "wb") as f:
+            f.write(b"x" * size)
+    os.utime(artifacts.path(name), (mtime, mtime))
+
+
+# ── Result cache keys ───────────────────────────────────────────────
+
+def test_cache_key_is_stable():
+    params = {"preset": "balanced", "aspects": ["9:16"]}
+    assert cache.cache_key("fp", 0.0, None, params) == cache.cache_key("fp", 0.0, None, dict(reversed(params.items())))
+    assert cache.cache_key("fp", 1.0, 2.0, params) == cache.cache_key("fp", 1.0001, 2.0004, params)
+
+
+@pytest.mark.parametrize("change", [
+    {"source_fp": "other"},
+    {"start": 1.0},
+    {"end": 30.0},
+    {"params": {"preset": "quality"}},
+])
+def test_cache_key_changes_with_its_inputs(change):
+    base = {"source_fp": "fp", "start": 0.0, "end": None, "params": {"preset": "balanced"}}
+    assert cache.cache_key(**{**base, **change}) != cache.cache_key(**base)
+
+
+def test_cache_key_changes_with_the_engine(monkeypatch):
+    before = cache.cache_key("fp", 0.0, None, {})
+    monkeypatch.setattr(cache, "ENGINE_VERSION", cache.ENGINE_VERSION + "-next")
+    assert cache.cache_key("fp", 0.0, None, {}) != before
+
+
+def test_fingerprint_ignores_the_path(tmp_path):
+    a, b = tmp_path / "a.mp4", tmp_path / "b.mp4"
+    data = os.urandom(cache.BLOCK_SIZE * cache.FINGERPRINT_BLOCKS * 2)
+    a.write_bytes(data)
+    b.write_bytes(data)
+    assert cache.fingerprint(str(a)) == cache.fingerprint(str(b))
+    b.write_bytes(data[:-1] + b"!")
+    assert cache.fingerprint(str(a)) != cache.fingerprint(str(b))
+
+
+def test_result_cache_round_trip(tmp_path):
+    results = cache.ResultCache(str(tmp_path), max_bytes=1 << 20)
+    src = tmp_path / "coords.json"
+    src.write_text('{"mode": "skip"}')
+    assert results.get("k") is None
+    results.put("k", str(src))
+    assert results.get("k") == '{"mode": "skip"}'
+    assert store.stats(str(tmp_path))["kinds"]["results"]["hits"] == 1
+
+
+# ── Artifact store ──────────────────────────────────────────────────
+
+def test_evicts_least_recently_used_first(tmp_path):
+    artifacts = store.ArtifactStore("proxies", str(tmp_path), max_bytes=250, total_bytes=1 << 20)
+    put(artifacts, "a.mp4", 100, 1000)
+    put(artifacts, "b.mp4", 100, 2000)
+    os.utime(artifacts.path("a.mp4"), (3000, 3000))   # a read since
+    put(artifacts, "c.mp4", 100, 4000)
+    assert sorted(os.listdir(artifacts.dir)) == ["a.mp4", "c.mp4"]
+    assert store.read_counters(str(tmp_path))["proxies"]["evictions"] == 1
+
+
+def test_new_artifact_is_kept_beyond_the_cap(tmp_path):
+    artifacts = store.ArtifactStore("proxies", str(tmp_path), max_bytes=50, total_bytes=1 << 20)
+    put(artifacts, "a.mp4", 100, 1000)
+    put(artifacts, "big.mp4", 100, 2000)
+    assert os.listdir(artifacts.dir) == ["big.mp4"]
+
+
+def test_shared_cap_spans_kinds(tmp_path):
+    proxies = store.ArtifactStore("proxies", str(tmp_path), total_bytes=150)
+    results = store.ArtifactStore("results", str(tmp_path), total_bytes=150)
+    put(proxies, "a.mp4", 100, 1000)
+    put(results, "k.json", 100, 2000)
+    assert os.listdir(proxies.dir) == []
+    assert os.listdir(results.dir) == ["k.json"]
+
+
+def test_eviction_and_clear_keep_lock_files(tmp_path):
+    artifacts = store.ArtifactStore("detections", str(tmp_path), max_bytes=150, total_bytes=1 << 20)
+    put(artifacts, "a.json", 100, 1000)
+    open(artifacts.path("a.json") + ".lock", "w").close()
+    put(artifacts, "b.json", 100, 2000)
+    assert sorted(os.listdir(artifacts.dir)) == ["a.json.lock", "b.json"]
+    store.clear(str(tmp_path))
+    assert os.listdir(artifacts.dir) == ["a.json.lock"]
+
+
+def test_failed_write_leaves_nothing(tmp_path):
+    artifacts = store.ArtifactStore("results", str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with artifacts.write("k.json") as tmp:
+            open(tmp, "w").write("half")
+            raise RuntimeError
+    assert os.listdir(artifacts.dir) == []
+    assert artifacts.get("k.json") is None
+
+
+# ── Detection store ─────────────────────────────────────────────────
+
+def detection_store(tmp_path):
+    return DetectionStore("video-1", 1920, 1080, "mediapipe", root=str(tmp_path), max_bytes=1 << 20)
+
+
+def test_detections_survive_a_new_run(tmp_path):
+    first = detection_store(tmp_path)
+    first.put("track", 12.3, [FACE], 720)
+    first.save()
+    second = detection_store(tmp_path)
+    assert second.get("track", 12.3, 720) == [FACE]
+    assert second.get("type", 12.3, 720) is None
+    assert second.coverage("track", [12.3, 12.5], 720) == 0.5
+
+
+def test_lower_resolution_and_roi_detections_are_rejected(tmp_path):
+    detections = detection_store(tmp_path)
+    detections.put("track", 1.0, [FACE], 480)
+    detections.put("track", 2.0, [FACE], 720, roi=True)
+    assert detections.get("track", 1.0, 720) is None
+    assert detections.get("track", 1.0, 360) == [FACE]
+    assert detections.get("track", 2.0, 720) is None
+    assert detections.get("track", 2.0, 720, roi=True) == [FACE]
+
+
+def test_save_keeps_the_better_entry(tmp_path):
+    better = detection_store(tmp_path)
+    better.put("track", 1.0, [FACE], 1080)
+    better.save()
+    worse = detection_store(tmp_path)
+    worse.put("track", 1.0, [], 480)
+    worse.save()
+    assert detection_store(tmp_path).get("track", 1.0, 1080) == [FACE]
+
+
+def test_buckets_are_released_once_passed(tmp_path):
+    detections = detection_store(tmp_path)
+    for t in (10.0, BUCKET_SEC + 10.0, 2 * BUCKET_SEC + 10.0):
+        detections.put("track", t, [FACE], 720)
+    assert len(os.listdir(detections.store.dir)) == 0   # nothing written before a save
+    detections.release("track", before=2 * BUCKET_SEC)
+    assert sorted(b for _, b in detections.data) == [2]
+    files = [n for n in os.listdir(detections.store.dir) if n.endswith(".json")]
+    assert sorted(n.split(".")[-2] for n in files) == ["0", "1"]
+    detections.release("track")
+    assert detections.data == {}
+    assert detection_store(tmp_path).get("track", 2 * BUCKET_SEC + 10.0, 720) == [FACE]
+    with open(detections.store.path(files[0])) as f:
+        assert list(json.load(f).values())[0] == {"h": 720, "faces": [FACE]}
+
+
+def test_memory_store_never_touches_disk():
+    detections = MemoryDetectionStore()
+    detections.put("track", 1.0, [FACE], 360, roi=True)
+    assert detections.get("track", 1.0, 1080) == [FACE]
+    detections.save()
+    detections.release("track")
+    assert detections.get("track", 1.0, 1080) == [FACE]
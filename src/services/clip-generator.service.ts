@@ -357,7 +357,12 @@ export class ClipGeneratorService {
     try {
       // ── STEP 1: Download/extract source segment ONCE ──
       onProgress?.(10);
+      // Whether rawSourcePath starts exactly at options.startTime. Only then can the
+      // smart crop sidecar key its detections by source time (--source-offset).
+      let frameExactCut = true;
       if (options.sharedSourceKey) {
+        // The spanning segment's own cut may have snapped to a keyframe
+        frameExactCut = false;
         // Shared source: pre-downloaded spanning segment in R2 - slice locally with ffmpeg
         // This avoids a per-clip yt-dlp round trip to YouTube
         const offsetStart = options.startTime - (options.sharedSourceSpanStart ?? options.startTime);
@@ -382,7 +387,7 @@ export class ClipGeneratorService {
             fallback: "direct YouTube download",
           });
           if (options.sourceType === "youtube" && options.sourceUrl) {
-            await this.downloadYouTubeSegmentToFile(
+            frameExactCut = await this.downloadYouTubeSegmentToFile(
               options.sourceUrl, options.startTime, options.endTime, rawSourcePath, options.quality
             );
           } else {
@@ -391,7 +396,7 @@ export class ClipGeneratorService {
         }
       } else if (options.sourceType === "youtube" && options.sourceUrl) {
         // Fallback: direct YouTube download (single-clip re-exports, editing, etc.)
-        await this.downloadYouTubeSegmentToFile(
+        frameExactCut = await this.downloadYouTubeSegmentToFile(
           options.sourceUrl, options.startTime, options.endTime, rawSourcePath, options.quality
         );
       } else if (options.sourceType === "upload" && options.storageKey) {
@@ -468,7 +473,16 @@ export class ClipGeneratorService {
 
           // Run Python face detection sidecar on the ORIGINAL SOURCE file (landscape)
           await new Promise<void>((resolve, reject) => {
-            const proc = spawn(PYTHON_PATH, [SMART_CROP_SCRIPT, rawSourcePath, options.clipId, TMP_DIR]);
+            // --source-id/--source-offset let the sidecar reuse detections from earlier
+            // cuts of the same video (e.g. after the clip's boundaries are nudged).
+            // A cut that snapped to an earlier keyframe would store them at the wrong times.
+            const sourceArgs = frameExactCut
+              ? ["--source-id", options.videoId, "--source-offset", String(options.startTime)]
+              : [];
+            const proc = spawn(PYTHON_PATH, [
+              SMART_CROP_SCRIPT, rawSourcePath, options.clipId, TMP_DIR,
+              ...sourceArgs,
+            ]);
             proc.stdout?.on("data", (d) => process.stdout.write(`[SMART CROP PY] ${d}`));
             proc.stderr?.on("data", (d) => process.stderr.write(`[SMART CROP PY] ${d}`));
             proc.on("error", (err) => reject(new Error(`Python spawn failed: ${err.message}`)));
@@ -746,6 +760,17 @@ export class ClipGeneratorService {
                   "-c:a", "aac", "-b:a", "192k",
                   "-y", reframedPath,
                 ];
+              } else if (result.mode === "static_crop") {
+                // Locked-off camera — one crop window for the whole clip, no sendcmd needed
+                const { x, y, w, h } = result as { x: number; y: number; w: number; h: number };
+                this.logOperation("SMART_CROP_STATIC", { clipId: options.clipId, x, y, w, h });
+                args = [
+                  "-i", rawSourcePath,
+                  "-vf", `crop=${w}:${h}:${x}:${y},scale=${width}:${height}:flags=lanczos,format=yuv420p`,
+                  "-c:v", "libx264", "-preset", "fast", "-crf", "18",
+                  "-c:a", "aac", "-b:a", "192k",
+                  "-y", reframedPath,
+                ];
               } else if (result.mode === "crop" && result.coords?.length) {
                 const coords: Array<{ t: number; x: number; y: number; w: number; h: number }> = result.coords;
                 const first = coords[0];
@@ -2409,13 +2434,15 @@ print(f"OK:{total_canvas_w}x{total_canvas_h}")
     outputPath: string,
     quality: VideoQuality = "1080p"
   ): Promise<void> {
-    return this.downloadYouTubeSegmentToFile(url, startTime, endTime, outputPath, quality);
+    await this.downloadYouTubeSegmentToFile(url, startTime, endTime, outputPath, quality);
   }
 
   /**
    * Download YouTube segment to a file using yt-dlp --download-sections
    * Includes retry logic to handle FFmpeg exit code 202 errors that can occur
    * due to resource contention when multiple downloads run concurrently.
+   * Resolves true when the file starts exactly at startTime (re-encoded trim or
+   * --force-keyframes-at-cuts), false when the cut may have snapped to an earlier keyframe.
    * Validates: Requirements 7.1, 7.2
    */
   private static async downloadYouTubeSegmentToFile(
@@ -2425,7 +2452,7 @@ print(f"OK:{total_canvas_w}x{total_canvas_h}")
     outputPath: string,
     quality: VideoQuality,
     maxRetries: number = 3
-  ): Promise<void> {
+  ): Promise<boolean> {
     let lastError: Error | null = null;
     let forceKeyframes = true;
     const expectedDuration = endTime - startTime;
@@ -2490,7 +2517,7 @@ print(f"OK:{total_canvas_w}x{total_canvas_h}")
       } finally {
         this.releaseFullDownload(url);
       }
-      return;
+      return true;
     }
 
     for (let attempt = 1; attempt <= maxRetries; attempt++) {
@@ -2529,7 +2556,7 @@ print(f"OK:{total_canvas_w}x{total_canvas_h}")
               else reject(new Error(`FFmpeg local trim failed (code ${code}): ${stderr.slice(-500)}`));
             });
           });
-          return; // Success
+          return true; // Success
         }
 
         await this.executeYtDlpDownload(url, startTime, endTime, outputPath, forceKeyframes, useCookies);
@@ -2568,7 +2595,7 @@ print(f"OK:{total_canvas_w}x{total_canvas_h}")
           }
         }
 
-        return; // Success
+        return forceKeyframes; // Success
       } catch (error) {
         lastError = error instanceof Error ? error : new Error(String(error));
         const isCode222 = lastError.message.includes("ffmpeg exited with code 222");